@@ -1,9 +1,35 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional
 
+import numpy as np
 from langchain_core.vectorstores.base import VectorStoreRetriever
+from pydantic import BaseModel
 
-from agents.graph_elements import GraphElements
+from agents.graph_elements import MAX_RETRIES_MESSAGE, GraphElements
+from caches.semantic_cache import SemanticCache
 from langgraph.graph.state import CompiledStateGraph
+from retrievers.embeddings import get_model_settings
+from retrievers.vector_retriever import MANIFEST_FILE, file_sha256
+from utils.deadline import bind_context
+from utils.load_config import load_yaml_config
+from utils.rate_limiter import RateLimiter, rate_limit_scope
+
+# the nodes which give the answer, graded or once a budget is spent
+ANSWER_NODES = ("grade_generation", "return_best_answer")
+
+
+class BatchResult(BaseModel):
+    """
+    The outcome of one question of a batch: either its answer or the error
+    that prevented answering it.
+    """
+
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
 
 
 class RunAgent:
@@ -11,6 +37,12 @@ class RunAgent:
     This class is responsible for running the agent graph.
     It takes a retriever and a configuration path as input,
     builds the agent graph, and provides a method to run the agent with a question.
+    The graph is built both with synchronous and asynchronous node functions,
+    so that it can be run with `run_agent`, awaited with `arun_agent` or
+    streamed with `stream_answer`, and many questions can be answered
+    concurrently with `run_batch` or `arun_batch`.
+    When the semantic cache is enabled, answers to the same or near-duplicate
+    questions are returned from the cache without running the graph.
 
     Parameters
     ----------
@@ -23,13 +55,90 @@ class RunAgent:
     def __init__(
         self, retriever: VectorStoreRetriever, config_path: Path
     ) -> None:
-        self.compiled_graph = self.build_agent_graph(
-            retriever=retriever, config_path=config_path
+        self.config_path = config_path
+        self.config = load_yaml_config(config_path)
+        self.semantic_cache = self.build_semantic_cache(retriever)
+        graph_elements = GraphElements(
+            retriever=retriever,
+            config_path=config_path,
+        )
+        # both graphs share the agents, clients and caches
+        self.compiled_graph = graph_elements.build_graph()
+        self.compiled_async_graph = graph_elements.build_graph(
+            asynchronous=True
+        )
+
+    def build_semantic_cache(
+        self, retriever: VectorStoreRetriever
+    ) -> Optional[SemanticCache]:
+        """
+        Build the semantic answer cache, reusing the retriever's embedding
+        model to encode the questions. The cached answers are tied to the
+        current version of the index manifest, so that they are dropped
+        once the indexed documents change.
+
+        Parameters
+        ----------
+        retriever : VectorStoreRetriever
+            The retriever used by the agent graph.
+
+        Returns
+        -------
+        Optional[SemanticCache]
+            The semantic cache, or None if it is disabled.
+        """
+        cache_config = self.config["cache"]["semantic"]
+        if not cache_config["enabled"]:
+            return None
+
+        manifest_path = (
+            Path(self.config["retriever"]["index_path"]) / MANIFEST_FILE
+        )
+        return SemanticCache(
+            embeddings=retriever.vectorstore.embeddings,
+            model_settings=get_model_settings(self.config["retriever"]),
+            path=cache_config["path"],
+            similarity_threshold=cache_config["similarity_threshold"],
+            ttl_seconds=cache_config["ttl_seconds"],
+            index_version=(
+                file_sha256(manifest_path) if manifest_path.exists() else None
+            ),
         )
 
+    def cache_answer(
+        self,
+        question: str,
+        embedding: Optional[np.ndarray],
+        answer: Optional[str],
+        source: str,
+    ) -> None:
+        """
+        Store the agent's answer in the semantic cache, skipping the runs
+        that did not produce a usable answer.
+
+        Parameters
+        ----------
+        question : str
+            The question asked to the agent.
+        embedding : Optional[np.ndarray]
+            The normalized embedding of the question.
+        answer : Optional[str]
+            The answer generated by the agent.
+        source : str
+            Where the answer came from, "vector_store" or "web_search".
+        """
+        if self.semantic_cache is None or embedding is None:
+            return
+        if not answer or answer == MAX_RETRIES_MESSAGE:
+            return
+
+        self.semantic_cache.store(question, embedding, answer, source)
+
     @staticmethod
     def build_agent_graph(
-        retriever: VectorStoreRetriever, config_path: Path
+        retriever: VectorStoreRetriever,
+        config_path: Path,
+        asynchronous: bool = False,
     ) -> CompiledStateGraph:
         """
         Build the agent graph using the provided retriever and configuration path.
@@ -40,6 +149,9 @@ class RunAgent:
             The retriever to use for the agent graph.
         config_path : Path
             The path to the configuration file for the agent graph.
+        asynchronous : bool, optional
+            Whether to build the graph with the asynchronous node functions,
+            by default False.
 
         Returns
         -------
@@ -50,7 +162,7 @@ class RunAgent:
             retriever=retriever,
             config_path=config_path,
         )
-        agent_graph = graph_elements.build_graph()
+        agent_graph = graph_elements.build_graph(asynchronous=asynchronous)
         return agent_graph
 
     def run_agent(self, question: str) -> str:
@@ -67,9 +179,256 @@ class RunAgent:
         answer : str
             The answer generated by the agent.
         """
+        embedding = None
+        if self.semantic_cache is not None:
+            embedding = self.semantic_cache.embed(question)
+            cached_answer = self.semantic_cache.lookup(embedding)
+            if cached_answer is not None:
+                return cached_answer
+
         inputs = {"question": question}
+        source = "vector_store"
+        answer, grade = None, None
         for output in self.compiled_graph.stream(inputs):
-            output = output.get("generate", None)
-            if output is not None:
-                output = output.get("generation", None)
-        return output
+            if "search_in_web" in output:
+                source = "web_search"
+            update = next(
+                (output[node] for node in ANSWER_NODES if node in output), None
+            )
+            if update is not None:
+                answer = update["generation"]
+                grade = update["generation_grade"]
+
+        # best-effort answers returned once a budget ran out are not cached
+        if grade == "useful":
+            self.cache_answer(question, embedding, answer, source)
+        return answer
+
+    async def arun_agent(self, question: str) -> str:
+        """
+        Asynchronously run the agent with the provided question. Several
+        questions can be awaited concurrently on the same event loop.
+
+        Parameters
+        ----------
+        question : str
+            The question to ask the agent.
+
+        Returns
+        -------
+        answer : str
+            The answer generated by the agent.
+        """
+        embedding = None
+        if self.semantic_cache is not None:
+            embedding = await asyncio.to_thread(
+                self.semantic_cache.embed, question
+            )
+            # the cache reads its database, off the event loop
+            cached_answer = await asyncio.to_thread(
+                self.semantic_cache.lookup, embedding
+            )
+            if cached_answer is not None:
+                return cached_answer
+
+        inputs = {"question": question}
+        source = "vector_store"
+        answer, grade = None, None
+        async for output in self.compiled_async_graph.astream(inputs):
+            if "search_in_web" in output:
+                source = "web_search"
+            update = next(
+                (output[node] for node in ANSWER_NODES if node in output), None
+            )
+            if update is not None:
+                answer = update["generation"]
+                grade = update["generation_grade"]
+
+        # best-effort answers returned once a budget ran out are not cached
+        if grade == "useful":
+            await asyncio.to_thread(
+                self.cache_answer, question, embedding, answer, source
+            )
+        return answer
+
+    def stream_answer(self, question: str) -> Iterator[Dict]:
+        """
+        Run the agent with the provided question, streaming the answer tokens
+        as they are generated along with the progress of the graph.
+
+        The following events are yielded, as dictionaries with a "type" key:
+            - "node": a node of the graph finished, with its name in "node".
+            - "grade": a grading verdict, with the "stage" ("retrieval" or
+              "generation") and the "verdict", or a reranking score, with
+              the "rerank" stage and the "score".
+            - "token": the next piece of the answer, in "content".
+            - "retract": the answer streamed so far was rejected by the
+              graders and will be replaced by the next generation, with the
+              "reason" of the rejection. If a budget of the request is
+              exhausted, the best answer so far follows as a single
+              "token" instead.
+            - "final": the final answer, in "answer".
+
+        Parameters
+        ----------
+        question : str
+            The question to ask the agent.
+
+        Yields
+        ------
+        Dict
+            The next streaming event.
+        """
+        embedding = None
+        if self.semantic_cache is not None:
+            embedding = self.semantic_cache.embed(question)
+            cached_answer = self.semantic_cache.lookup(embedding)
+            if cached_answer is not None:
+                yield {"type": "token", "content": cached_answer}
+                yield {"type": "final", "answer": cached_answer}
+                return
+
+        inputs = {"question": question, "stream": True}
+        source = "vector_store"
+        answer, grade = None, None
+        for mode, chunk in self.compiled_graph.stream(
+            inputs, stream_mode=["updates", "custom"]
+        ):
+            if mode == "custom":
+                yield chunk
+                continue
+
+            for node, update in chunk.items():
+                yield {"type": "node", "node": node}
+                if node == "search_in_web":
+                    source = "web_search"
+                elif node in ANSWER_NODES and update is not None:
+                    answer = update["generation"]
+                    grade = update["generation_grade"]
+
+        if grade == "useful":
+            self.cache_answer(question, embedding, answer, source)
+        yield {"type": "final", "answer": answer}
+
+    def build_batch_rate_limiters(
+        self, rate_limit: Optional[Dict[str, Dict[str, int]]]
+    ) -> Dict[str, RateLimiter]:
+        """
+        Build the rate limiters of a batch, its own for each service whose
+        limits it overrides, leaving the process-wide ones untouched.
+
+        Parameters
+        ----------
+        rate_limit : Optional[Dict[str, Dict[str, int]]]
+            The limits of the batch for each service ("groq" or "serpapi"),
+            as dictionaries with "requests_per_minute" and/or
+            "tokens_per_minute". The limits that are not given are the
+            configured ones. If None, the configured limits are kept.
+
+        Returns
+        -------
+        Dict[str, RateLimiter]
+            The rate limiter of the batch for each service.
+
+        Raises
+        ------
+        ValueError
+            If a service is unknown or a limit is not positive.
+        """
+        rate_limiters = {}
+        for service, limits in (rate_limit or {}).items():
+            if service not in self.config["rate_limits"]:
+                raise ValueError(f"Unknown rate limited service: {service}")
+            rate_limiters[service] = RateLimiter(
+                **{**self.config["rate_limits"][service], **limits}
+            )
+        return rate_limiters
+
+    def run_batch(
+        self,
+        questions: List[str],
+        max_concurrency: int = 8,
+        rate_limit: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> List[BatchResult]:
+        """
+        Run the agent on many questions concurrently, sharing the compiled
+        graph, the clients and their rate limits.
+
+        Parameters
+        ----------
+        questions : List[str]
+            The questions to ask the agent.
+        max_concurrency : int, optional
+            Maximum number of questions answered at the same time, by
+            default 8.
+        rate_limit : Optional[Dict[str, Dict[str, int]]], optional
+            The requests and tokens per minute budgets of "groq" and
+            "serpapi" for the batch, enforced by limiters of its own. If
+            None, the process-wide limiters are used, by default None.
+
+        Returns
+        -------
+        List[BatchResult]
+            The answer or error of each question, in the same order as the
+            questions.
+        """
+
+        def answer(question: str) -> BatchResult:
+            try:
+                return BatchResult(
+                    question=question, answer=self.run_agent(question)
+                )
+            except Exception as e:
+                logging.error(f"Failed to answer {question!r}: {e}")
+                return BatchResult(question=question, error=repr(e))
+
+        with rate_limit_scope(self.build_batch_rate_limiters(rate_limit)):
+            with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                return list(executor.map(bind_context(answer), questions))
+
+    async def arun_batch(
+        self,
+        questions: List[str],
+        max_concurrency: int = 64,
+        rate_limit: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> List[BatchResult]:
+        """
+        Asynchronously run the agent on many questions concurrently, sharing
+        the compiled graph, the clients and their rate limits.
+
+        Parameters
+        ----------
+        questions : List[str]
+            The questions to ask the agent.
+        max_concurrency : int, optional
+            Maximum number of questions answered at the same time, by
+            default 64.
+        rate_limit : Optional[Dict[str, Dict[str, int]]], optional
+            The requests and tokens per minute budgets of "groq" and
+            "serpapi" for the batch, enforced by limiters of its own. If
+            None, the process-wide limiters are used, by default None.
+
+        Returns
+        -------
+        List[BatchResult]
+            The answer or error of each question, in the same order as the
+            questions.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(question: str) -> BatchResult:
+            async with semaphore:
+                try:
+                    return BatchResult(
+                        question=question,
+                        answer=await self.arun_agent(question),
+                    )
+                except Exception as e:
+                    logging.error(f"Failed to answer {question!r}: {e}")
+                    return BatchResult(question=question, error=repr(e))
+
+        # the tasks of the questions copy the context of the scope
+        with rate_limit_scope(self.build_batch_rate_limiters(rate_limit)):
+            return await asyncio.gather(
+                *(answer(question) for question in questions)
+            )
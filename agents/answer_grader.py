@@ -41,7 +41,10 @@ class AnswerGrader(BaseAgent):
         }
 
     def generate_response(
-        self, generation: str, question: str
+        self,
+        generation: str,
+        question: str,
+        use_cache: bool = True,
     ) -> AnswerGraderResponse:
         system_message = self.get_system_message()
         user_message = self.get_user_message(
@@ -52,6 +55,27 @@ class AnswerGrader(BaseAgent):
             system_message=system_message,
             user_message=user_message,
             response_model=AnswerGraderResponse,
+            use_cache=use_cache,
+        )
+
+        return response
+
+    async def agenerate_response(
+        self,
+        generation: str,
+        question: str,
+        use_cache: bool = True,
+    ) -> AnswerGraderResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(
+            generation=generation, question=question
+        )
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=AnswerGraderResponse,
+            use_cache=use_cache,
         )
 
         return response
@@ -1,10 +1,17 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Dict, TypeVar, Union
+from typing import Dict, List, Optional, TypeVar, Union
 
+from langchain.schema import Document
 from pydantic import BaseModel
 
-from api_clients.groq_chat_client import GroqChatClient
+from api_clients.client_registry import (
+    get_async_chat_client,
+    get_chat_client,
+)
+from api_clients.groq_chat_client import AsyncGroqChatClient, GroqChatClient
+from utils.context_packing import pack_context
+from utils.load_config import load_yaml_config
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -21,12 +28,57 @@ class BaseAgent(ABC):
     ----------
     config_path : Path
         Path to the configuration file for the agent. This file is used to
-        initialize the GroqChatClient.
+        get the process-wide GroqChatClient and AsyncGroqChatClient.
+    chat_client : Optional[GroqChatClient], optional
+        The chat client to use instead of the process-wide one, by default
+        None.
+    async_chat_client : Optional[AsyncGroqChatClient], optional
+        The asynchronous chat client to use instead of the process-wide one,
+        by default None.
     """
 
-    def __init__(self, config_path: Path) -> None:
+    def __init__(
+        self,
+        config_path: Path,
+        chat_client: Optional[GroqChatClient] = None,
+        async_chat_client: Optional[AsyncGroqChatClient] = None,
+    ) -> None:
         self.config_path = config_path
-        self.chat_client = GroqChatClient(config_path=config_path)
+        self.chat_client = chat_client or get_chat_client(config_path)
+        self.async_chat_client = async_chat_client or get_async_chat_client(
+            config_path
+        )
+        self.context_config = load_yaml_config(config_path)["context"]
+
+    def pack_context(
+        self,
+        documents: Union[str, Document, List[Document]],
+        keep_all: bool = False,
+    ) -> str:
+        """
+        Render documents as compact text for the prompts, within the
+        configured token budget.
+
+        Parameters
+        ----------
+        documents : Union[str, Document, List[Document]]
+            The documents, the most relevant first.
+        keep_all : bool, optional
+            Whether to keep an entry for every document instead of dropping
+            the overlapping chunks and those over the budget, by default
+            False.
+
+        Returns
+        -------
+        str
+            The packed context.
+        """
+        return pack_context(
+            documents,
+            max_tokens=self.context_config["max_tokens"],
+            min_overlap=self.context_config["min_overlap"],
+            keep_all=keep_all,
+        )
 
     @abstractmethod
     def get_system_message(self) -> Dict[str, str]:
@@ -75,3 +127,21 @@ class BaseAgent(ABC):
             The generated response from the agent.
         """
         pass
+
+    @abstractmethod
+    async def agenerate_response(self, **kwargs) -> Union[str, T]:
+        """
+        Asynchronously generates a response from the agent based on the
+        provided input.
+
+        Parameters
+        ----------
+        kwargs : dict
+            Additional keyword arguments to customize the response generation.
+
+        Returns
+        -------
+        str
+            The generated response from the agent.
+        """
+        pass
@@ -0,0 +1,85 @@
+from typing import Dict
+
+from pydantic import BaseModel
+
+from agents.base_agent import BaseAgent
+from prompts.generation_grader_prompt import (
+    GENERATION_SYSTEM_PROMPT,
+    GENERATION_USER_PROMPT,
+)
+
+
+class GenerationGraderResponse(BaseModel):
+    """
+    The structure of the response from the generation grader agent.
+    """
+
+    grounded: str
+    addresses_question: str
+
+
+class GenerationGrader(BaseAgent):
+    """
+    The GenerationGrader class grades a generation on both criteria of the
+    HallucinationGrader and the AnswerGrader in a single request: whether
+    it is grounded in the provided documents and whether it addresses the
+    question.
+    """
+
+    def get_system_message(self) -> Dict[str, str]:
+        return {
+            "role": GENERATION_SYSTEM_PROMPT.role,
+            "content": GENERATION_SYSTEM_PROMPT.format(),
+        }
+
+    def get_user_message(
+        self, question: str, documents: str, generation: str
+    ) -> Dict[str, str]:
+        return {
+            "role": GENERATION_USER_PROMPT.role,
+            "content": GENERATION_USER_PROMPT.format(
+                {
+                    "question": question,
+                    "documents": self.pack_context(documents),
+                    "generation": generation,
+                }
+            ),
+        }
+
+    def generate_response(
+        self,
+        question: str,
+        documents: str,
+        generation: str,
+        use_cache: bool = True,
+    ) -> GenerationGraderResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(question, documents, generation)
+
+        response = self.chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=GenerationGraderResponse,
+            use_cache=use_cache,
+        )
+
+        return response
+
+    async def agenerate_response(
+        self,
+        question: str,
+        documents: str,
+        generation: str,
+        use_cache: bool = True,
+    ) -> GenerationGraderResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(question, documents, generation)
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=GenerationGraderResponse,
+            use_cache=use_cache,
+        )
+
+        return response
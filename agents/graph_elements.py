@@ -1,20 +1,31 @@
+import asyncio
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import wraps
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from langchain.schema import Document
 from langchain_core.vectorstores.base import VectorStoreRetriever
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
 from typing_extensions import TypedDict
 
 from agents.answer_grader import AnswerGrader
+from agents.generation_grader import GenerationGrader
 from agents.hallucination_grader import HallucinationGrader
+from agents.local_router import LocalRouter
 from agents.rag_chain import RetrievalAugmentedGenerator
-from agents.retrieval_grader import RetrievalGrader
-from agents.router import Router
+from agents.retrieval_grader import GraderResponse, RetrievalGrader
+from agents.router import Router, RouterResponse
 from agents.search_parser import SearchParser
 from agents.summarizer import Summarizer
+from api_clients.client_registry import get_rate_limiter
 from api_clients.serp_api_client import SerpAPIClient
+from retrievers.cross_encoder_reranker import CrossEncoderReranker
+from utils.deadline import DeadlineExceeded, bind_context, deadline_scope
+from utils.load_config import load_yaml_config
 from utils.log_agent import log_agent_step
 
 logging.basicConfig(
@@ -31,16 +42,50 @@ class GraphState(TypedDict):
     Attributes:
         question: question
         generation: LLM generation
+        generation_key: response cache key of the generation, None if it
+            was not generated by the RAG pipeline
         web_search: whether to add search
         documents: list of documents
+        rerank_scores: cross-encoder relevance scores of the documents
+        route: datasource chosen by the entry node
+        generation_grade: grade of the generation, or "exhausted" when a
+            budget ran out
+        best_generation: best graded generation so far
+        best_grade: grade of the best generation
+        regeneration_count: number of regenerations of unsupported answers
+        llm_calls: number of LLM requests made so far
+        deadline: monotonic time by which the agent must answer
+        stream: whether to emit streaming events
+        web_prefetch: web search started while the documents were graded,
+            kept for the web search node if they were rejected
     """
 
     question: str
+    route: str
     generation: str
+    generation_key: Optional[str]
     web_search: str
     documents: List[str]
+    rerank_scores: List[float]
     web_result: str
     retry_count: int
+    generation_grade: str
+    best_generation: str
+    best_grade: str
+    regeneration_count: int
+    llm_calls: int
+    deadline: float
+    stream: bool
+    web_prefetch: Optional[Union[Future, asyncio.Task]]
+
+
+# preference between the grades of the generations, to keep the best one
+GRADE_RANKS = {"useful": 2, "not useful": 1, "not supported": 0}
+# web searches per question, and the web result once they ran out
+MAX_WEB_SEARCHES = 2
+MAX_RETRIES_MESSAGE = "Reached max retries."
+# answer of a request whose budgets ran out before any generation
+NO_ANSWER_MESSAGE = "Ran out of budget before finding an answer."
 
 
 class GraphElements:
@@ -59,6 +104,7 @@ class GraphElements:
     def __init__(
         self, retriever: VectorStoreRetriever, config_path: Path
     ) -> None:
+        self.config = load_yaml_config(config_path)
         self.retriever = retriever
         self.retrieval_grader = RetrievalGrader(config_path=config_path)
         self.rag_pipeline = RetrievalAugmentedGenerator(
@@ -66,13 +112,48 @@ class GraphElements:
         )
         self.search_parser = SearchParser(config_path=config_path)
         self.router = Router(config_path=config_path)
+        routing_config = self.config["graph"]["routing"]
+        self.local_router = (
+            LocalRouter(retriever.vectorstore, routing_config)
+            if routing_config["mode"] == "local"
+            else None
+        )
         self.summarizer = Summarizer(config_path=config_path)
         self.hallucination_grader = HallucinationGrader(
             config_path=config_path
         )
         self.answer_grader = AnswerGrader(config_path=config_path)
+        self.generation_grader = GenerationGrader(config_path=config_path)
+        self.serp_api_client = SerpAPIClient(
+            config_path=config_path,
+            rate_limiter=get_rate_limiter(config_path, "serpapi"),
+        )
+        # runs the SerpAPI searches prefetched by the synchronous graph
+        self.web_prefetch_executor = ThreadPoolExecutor(max_workers=4)
+        reranking_config = self.config["graph"]["reranking"]
+        self.reranker = (
+            CrossEncoderReranker(reranking_config)
+            if reranking_config["enabled"]
+            else None
+        )
+
+    @staticmethod
+    def emit(state: GraphState, event: Dict) -> None:
+        """
+        Emit a streaming event to the caller of the graph, when the graph is
+        run in streaming mode.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        event : Dict
+            The event to emit, with its "type" and payload.
+        """
+        if state.get("stream", False):
+            get_stream_writer()(event)
 
-    def route_question(self, state: GraphState) -> str:
+    def route_question(self, state: GraphState) -> GraphState:
         """
         Route the user's question to the appropriate datasource.
 
@@ -83,14 +164,192 @@ class GraphElements:
 
         Returns
         -------
-        str
-            The name of the next node to execute.
+        GraphState
+            The state of the graph with the name of the next node to
+            execute.
+        """
+        log_agent_step("Route user's question")
+        question = state["question"]
+
+        router_response = None
+        n_calls = 0
+        if self.local_router is not None:
+            router_response = self.local_router.route(question)
+        if router_response is None:
+            router_response = self.router.generate_response(
+                question=question
+            )
+            n_calls = 1
+        return {
+            "route": self.select_route(router_response),
+            "llm_calls": self.count_llm_calls(state, n_calls),
+        }
+
+    async def aroute_question(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously route the user's question to the appropriate
+        datasource.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the name of the next node to
+            execute.
         """
         log_agent_step("Route user's question")
         question = state["question"]
 
-        router_response = self.router.generate_response(question=question)
+        router_response = None
+        n_calls = 0
+        if self.local_router is not None:
+            router_response = await asyncio.to_thread(
+                self.local_router.route, question
+            )
+        if router_response is None:
+            router_response = await self.router.agenerate_response(
+                question=question
+            )
+            n_calls = 1
+        return {
+            "route": self.select_route(router_response),
+            "llm_calls": self.count_llm_calls(state, n_calls),
+        }
+
+    def run_within_budgets(
+        self, node: Callable, asynchronous: bool = False
+    ) -> Callable:
+        """
+        Wrap a node so that the deadline of the request is started by the
+        first node, and that the LLM and web search requests of every node
+        time out by it. A node failing because the deadline passed returns
+        the best answer so far instead.
+
+        Parameters
+        ----------
+        node : Callable
+            The node function.
+        asynchronous : bool, optional
+            Whether the node function is asynchronous, by default False.
+
+        Returns
+        -------
+        Callable
+            The wrapped node function.
+        """
+        if asynchronous:
+
+            @wraps(node)
+            async def arun_node(state: GraphState) -> GraphState:
+                budget_state = self.start_budgets(state)
+                deadline = budget_state.get("deadline", state.get("deadline"))
+                try:
+                    with deadline_scope(deadline):
+                        return {**budget_state, **await node(state)}
+                except Exception as e:
+                    if not self.is_deadline_error(e, deadline):
+                        raise
+                    return {**budget_state, **self.return_best_answer(state)}
+
+            return arun_node
+
+        @wraps(node)
+        def run_node(state: GraphState) -> GraphState:
+            budget_state = self.start_budgets(state)
+            deadline = budget_state.get("deadline", state.get("deadline"))
+            try:
+                with deadline_scope(deadline):
+                    return {**budget_state, **node(state)}
+            except Exception as e:
+                if not self.is_deadline_error(e, deadline):
+                    raise
+                return {**budget_state, **self.return_best_answer(state)}
+
+        return run_node
+
+    @staticmethod
+    def is_deadline_error(error: Exception, deadline: Optional[float]) -> bool:
+        """
+        Whether a node failed because of the deadline of the request: it was
+        refused a request or a wait, or its requests failed after it passed.
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the node.
+        deadline : Optional[float]
+            The deadline of the request, if any.
+
+        Returns
+        -------
+        bool
+            Whether the error is due to the deadline.
+        """
+        deadline_passed = deadline is not None and time.monotonic() >= deadline
+        if isinstance(error, DeadlineExceeded) or deadline_passed:
+            logging.warning(
+                f"Deadline reached ({error}), returning the best answer"
+            )
+            return True
+        return False
+
+    def start_budgets(self, state: GraphState) -> GraphState:
+        """
+        Start the deadline of the request, unless it was already set.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the deadline, if any.
+        """
+        deadline_seconds = self.config["graph"]["budgets"]["deadline_seconds"]
+        if deadline_seconds is None or "deadline" in state:
+            return {}
+        return {"deadline": time.monotonic() + deadline_seconds}
+
+    @staticmethod
+    def count_llm_calls(state: GraphState, n_calls: int) -> int:
+        """
+        Add LLM requests to the number made so far.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        n_calls : int
+            The number of LLM requests made by the current node.
+
+        Returns
+        -------
+        int
+            The number of LLM requests made so far.
+        """
+        return state.get("llm_calls", 0) + n_calls
+
+    @staticmethod
+    def select_route(router_response: RouterResponse) -> str:
+        """
+        Map the router's datasource to the name of the next node to execute.
+
+        Parameters
+        ----------
+        router_response : RouterResponse
+            The response from the router agent.
 
+        Returns
+        -------
+        str
+            The name of the next node to execute.
+        """
         if router_response.datasource == "web_search":
             logging.info("Route question to web search")
             return "search_in_web"
@@ -99,29 +358,962 @@ class GraphElements:
             logging.info("Route question to rag")
             return "vector_store"
 
+    def route_and_retrieve(self, state: GraphState) -> GraphState:
+        """
+        Speculatively retrieve documents from the vector store while the
+        question is routed, so that the retrieval is already done when the
+        question goes to the vector store. Its result is dropped otherwise.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the route and, for the vector store
+            route, the retrieved documents.
+        """
+        log_agent_step("Route and retrieve")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            route = executor.submit(bind_context(self.route_question), state)
+            retrieved_state = self.retrieve(state)
+            route_state = route.result()
+
+        return self.build_speculative_state(
+            state, route_state, retrieved_state
+        )
+
+    async def aroute_and_retrieve(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously and speculatively retrieve documents from the vector
+        store while the question is routed.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the route and, for the vector store
+            route, the retrieved documents.
+        """
+        log_agent_step("Route and retrieve")
+        route_state, retrieved_state = await asyncio.gather(
+            self.aroute_question(state), self.aretrieve(state)
+        )
+        return self.build_speculative_state(
+            state, route_state, retrieved_state
+        )
+
+    @staticmethod
+    def build_speculative_state(
+        state: GraphState, route_state: GraphState, retrieved_state: GraphState
+    ) -> GraphState:
+        """
+        Build the state of the graph after the speculative entry node,
+        keeping the retrieved documents only for the vector store route.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        route_state : GraphState
+            The state of the graph after the routing.
+        retrieved_state : GraphState
+            The state of the graph after the retrieval.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the route.
+        """
+        if route_state["route"] == "search_in_web":
+            logging.info("Dropping the speculative retrieval")
+            return {"question": state["question"], **route_state}
+        return {**retrieved_state, **route_state}
+
+    def follow_route(self, state: GraphState) -> str:
+        """
+        Get the route chosen by the entry node, unless a budget is spent.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        str
+            The name of the next node to execute.
+        """
+        if self.check_budgets(state) == "exhausted":
+            return "exhausted"
+        return state["route"]
+
     def retrieve(self, state: GraphState) -> GraphState:
         """
-        Retrieve documents from the vector store.
+        Retrieve documents from the vector store.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the retrieved documents.
+        """
+        log_agent_step("Retrieve")
+        question = state["question"]
+
+        documents = self.rag_pipeline.retrieve_context(question)
+        return {"documents": documents, "question": question}
+
+    async def aretrieve(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously retrieve documents from the vector store.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the retrieved documents.
+        """
+        log_agent_step("Retrieve")
+        question = state["question"]
+
+        documents = await self.rag_pipeline.aretrieve_context(question)
+        return {"documents": documents, "question": question}
+
+    def rerank(self, state: GraphState) -> GraphState:
+        """
+        Rerank the retrieved documents with the local cross-encoder.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the reranked documents and their
+            scores.
+        """
+        log_agent_step("Rerank")
+        question = state["question"]
+        documents = state["documents"]
+
+        scores = self.reranker.score(question=question, documents=documents)
+        return self.select_reranked_documents(state, documents, scores)
+
+    async def arerank(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously rerank the retrieved documents with the local
+        cross-encoder, in a worker thread so that the event loop is not
+        blocked by the forward pass.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the reranked documents and their
+            scores.
+        """
+        log_agent_step("Rerank")
+        question = state["question"]
+        documents = state["documents"]
+
+        scores = await asyncio.to_thread(
+            self.reranker.score, question=question, documents=documents
+        )
+        return self.select_reranked_documents(state, documents, scores)
+
+    def select_reranked_documents(
+        self, state: GraphState, documents: List[Document], scores: List[float]
+    ) -> GraphState:
+        """
+        Keep the `top_n` best scored documents, dropping those scored below
+        the reject threshold.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        documents : List[Document]
+            The retrieved documents.
+        scores : List[float]
+            The cross-encoder scores, in the same order as the documents.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the kept documents, the best first,
+            and their scores.
+        """
+        reranking_config = self.config["graph"]["reranking"]
+        ranked = sorted(
+            zip(documents, scores), key=lambda pair: pair[1], reverse=True
+        )
+        kept = [
+            (document, score)
+            for document, score in ranked[: reranking_config["top_n"]]
+            if score >= reranking_config["reject_threshold"]
+        ]
+
+        for i, (_, score) in enumerate(ranked):
+            logging.info(f"Rerank score of document {i}: {score:.3f}")
+            self.emit(
+                state,
+                {
+                    "type": "grade",
+                    "stage": "rerank",
+                    "document": i,
+                    "score": score,
+                },
+            )
+        logging.info(f"Kept {len(kept)} of {len(documents)} documents")
+
+        return {
+            "documents": [document for document, _ in kept],
+            "rerank_scores": [score for _, score in kept],
+            "question": state["question"],
+        }
+
+    def split_reranked_documents(
+        self, state: GraphState
+    ) -> Tuple[List[bool], List[Document]]:
+        """
+        Split the documents between those the cross-encoder accepts, scored
+        at least the accept threshold, and the borderline ones, left to the
+        LLM grader. Without reranking, every document is borderline.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        Tuple[List[bool], List[Document]]
+            Whether each document is accepted, and the borderline documents.
+        """
+        documents = state["documents"]
+        if self.reranker is None or "rerank_scores" not in state:
+            return [False] * len(documents), documents
+
+        accept_threshold = self.config["graph"]["reranking"][
+            "accept_threshold"
+        ]
+        accepted = [
+            score >= accept_threshold for score in state["rerank_scores"]
+        ]
+        borderline = [
+            document
+            for document, is_accepted in zip(documents, accepted)
+            if not is_accepted
+        ]
+        return accepted, borderline
+
+    @staticmethod
+    def merge_grades(
+        accepted: List[bool], grader_responses: List[GraderResponse]
+    ) -> List[GraderResponse]:
+        """
+        Merge the cross-encoder acceptances with the LLM grades of the
+        borderline documents.
+
+        Parameters
+        ----------
+        accepted : List[bool]
+            Whether each document is accepted by the cross-encoder.
+        grader_responses : List[GraderResponse]
+            The LLM grades of the borderline documents, in order.
+
+        Returns
+        -------
+        List[GraderResponse]
+            The grade of each document.
+        """
+        llm_grades = iter(grader_responses)
+        return [
+            (
+                GraderResponse(
+                    score="yes", explanation="Accepted by the reranker."
+                )
+                if is_accepted
+                else next(llm_grades)
+            )
+            for is_accepted in accepted
+        ]
+
+    def grade_retrieved_documents(
+        self, question: str, documents: List[Document]
+    ) -> Tuple[List[GraderResponse], int]:
+        """
+        Grade the relevance of each retrieved document to the user's question.
+        In "concurrent" mode all the documents are graded at once, with at
+        most `max_concurrency` requests in flight. In "batch" mode they are
+        graded with a single request, falling back to concurrent grading if
+        the batched response is unusable.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        documents : List[Document]
+            The retrieved documents to be graded.
+
+        Returns
+        -------
+        Tuple[List[GraderResponse], int]
+            The grader responses, in the same order as the documents, and
+            the number of LLM requests made to grade them, including a
+            failed batched request.
+        """
+        grading_config = self.config["graph"]["retrieval_grading"]
+
+        def grade(document: Document) -> GraderResponse:
+            return self.retrieval_grader.generate_response(
+                question=question, document=document
+            )
+
+        n_calls = len(documents)
+        if grading_config["mode"] == "batch" and len(documents) > 1:
+            try:
+                grader_responses = (
+                    self.retrieval_grader.generate_batch_response(
+                        question=question, documents=documents
+                    )
+                )
+                return grader_responses, 1
+            except (RuntimeError, ValueError) as e:
+                logging.warning(
+                    f"Batched grading failed, grading each document: {e}"
+                )
+                n_calls += 1
+
+        if grading_config["mode"] != "serial" and len(documents) > 1:
+            max_workers = min(
+                grading_config["max_concurrency"], len(documents)
+            )
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                grader_responses = list(
+                    executor.map(bind_context(grade), documents)
+                )
+            return grader_responses, n_calls
+
+        return [grade(document) for document in documents], n_calls
+
+    async def agrade_retrieved_documents(
+        self, question: str, documents: List[Document]
+    ) -> Tuple[List[GraderResponse], int]:
+        """
+        Asynchronously grade the relevance of each retrieved document to the
+        user's question, following the same modes as
+        `grade_retrieved_documents`.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        documents : List[Document]
+            The retrieved documents to be graded.
+
+        Returns
+        -------
+        Tuple[List[GraderResponse], int]
+            The grader responses, in the same order as the documents, and
+            the number of LLM requests made to grade them, including a
+            failed batched request.
+        """
+        grading_config = self.config["graph"]["retrieval_grading"]
+
+        n_calls = len(documents)
+        if grading_config["mode"] == "batch" and len(documents) > 1:
+            try:
+                grader_responses = (
+                    await self.retrieval_grader.agenerate_batch_response(
+                        question=question, documents=documents
+                    )
+                )
+                return grader_responses, 1
+            except (RuntimeError, ValueError) as e:
+                logging.warning(
+                    f"Batched grading failed, grading each document: {e}"
+                )
+                n_calls += 1
+
+        if grading_config["mode"] == "serial":
+            grader_responses = [
+                await self.retrieval_grader.agenerate_response(
+                    question=question, document=document
+                )
+                for document in documents
+            ]
+            return grader_responses, n_calls
+
+        semaphore = asyncio.Semaphore(grading_config["max_concurrency"])
+
+        async def grade(document: Document) -> GraderResponse:
+            async with semaphore:
+                return await self.retrieval_grader.agenerate_response(
+                    question=question, document=document
+                )
+
+        grader_responses = await asyncio.gather(
+            *(grade(doc) for doc in documents)
+        )
+        return grader_responses, n_calls
+
+    def grade_documents(self, state: GraphState) -> GraphState:
+        """
+        Judge the relevance of the retrieved documents to the user's question.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the graded documents.
+        """
+        logging.info("Checking documents relevance to the question")
+        prefetch = self.prefetch_web_search(state, asynchronous=False)
+        graded_state: GraphState = {}
+        try:
+            accepted, borderline = self.split_reranked_documents(state)
+            grader_responses, n_calls = self.grade_retrieved_documents(
+                question=state["question"], documents=borderline
+            )
+            graded_state = self.finish_grading_documents(
+                state, accepted, grader_responses, n_calls, prefetch
+            )
+            return graded_state
+        finally:
+            if graded_state.get("web_prefetch") is None:
+                self.cancel_web_prefetch(prefetch)
+
+    async def agrade_documents(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously judge the relevance of the retrieved documents to the
+        user's question.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the graded documents.
+        """
+        logging.info("Checking documents relevance to the question")
+        prefetch = self.prefetch_web_search(state, asynchronous=True)
+        graded_state: GraphState = {}
+        try:
+            accepted, borderline = self.split_reranked_documents(state)
+            grader_responses, n_calls = await self.agrade_retrieved_documents(
+                question=state["question"], documents=borderline
+            )
+            graded_state = self.finish_grading_documents(
+                state, accepted, grader_responses, n_calls, prefetch
+            )
+            return graded_state
+        finally:
+            if graded_state.get("web_prefetch") is None:
+                self.cancel_web_prefetch(prefetch)
+
+    def finish_grading_documents(
+        self,
+        state: GraphState,
+        accepted: List[bool],
+        grader_responses: List[GraderResponse],
+        n_calls: int,
+        prefetch: Optional[Union[Future, asyncio.Task]],
+    ) -> GraphState:
+        """
+        Merge the LLM grades of the borderline documents with the reranker
+        acceptances, report them and keep the relevant documents, along with
+        the prefetched web search if they are not enough.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        accepted : List[bool]
+            Whether each document is accepted by the reranker.
+        grader_responses : List[GraderResponse]
+            The LLM grades of the borderline documents, in order.
+        n_calls : int
+            The number of LLM requests made to grade them.
+        prefetch : Optional[Union[Future, asyncio.Task]]
+            The web search started while grading, if any.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the graded documents.
+        """
+        grader_responses = self.merge_grades(accepted, grader_responses)
+        for i, grader_response in enumerate(grader_responses):
+            self.emit(
+                state,
+                {
+                    "type": "grade",
+                    "stage": "retrieval",
+                    "document": i,
+                    "verdict": grader_response.score.strip().lower(),
+                },
+            )
+        filtered_state = self.filter_documents(
+            state["question"], state["documents"], grader_responses
+        )
+        return {
+            **filtered_state,
+            "llm_calls": self.count_llm_calls(state, n_calls),
+            "web_prefetch": (
+                prefetch if filtered_state["web_search"] == "Yes" else None
+            ),
+        }
+
+    @staticmethod
+    def filter_documents(
+        question: str,
+        documents: List[Document],
+        grader_responses: List[GraderResponse],
+    ) -> GraphState:
+        """
+        Keep the documents graded as relevant and flag a web search when
+        none of them is.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        documents : List[Document]
+            The retrieved documents.
+        grader_responses : List[GraderResponse]
+            The grader responses, in the same order as the documents.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the graded documents.
+        """
+        filtered_docs = []
+        web_search = "No"
+
+        for document, grader_response in zip(documents, grader_responses):
+            grade = grader_response.score
+
+            if grade.strip().lower() == "yes":
+                logging.info("Grade: document relevant!")
+                filtered_docs.append(document)
+
+            else:
+                logging.info("Grade: document not relevant!")
+
+        if len(filtered_docs) == 0:
+            logging.info("No relevant documents found!")
+            web_search = "Yes"
+
+        return {
+            "documents": filtered_docs,
+            "question": question,
+            "web_search": web_search,
+        }
+
+    def prefetch_web_search(
+        self, state: GraphState, asynchronous: bool
+    ) -> Optional[Union[Future, asyncio.Task]]:
+        """
+        Start searching the web for the question in the background, if
+        configured, so that the results are ready if the documents are
+        rejected.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        asynchronous : bool
+            Whether the search runs as a task of the running event loop, in
+            the asynchronous graph, or in a worker thread.
+
+        Returns
+        -------
+        Optional[Union[Future, asyncio.Task]]
+            The background search, or None if prefetching is disabled.
+        """
+        if not self.config["graph"]["speculative"]["prefetch_web_search"]:
+            return None
+        elif asynchronous:
+            return asyncio.create_task(
+                self.serp_api_client.asearch_tool(query=state["question"])
+            )
+        return self.web_prefetch_executor.submit(
+            bind_context(self.serp_api_client.search_tool),
+            query=state["question"],
+        )
+
+    @staticmethod
+    def cancel_web_prefetch(
+        prefetch: Optional[Union[Future, asyncio.Task]],
+    ) -> None:
+        """
+        Cancel a background web search which is not needed. A search already
+        sent still ends in the search cache.
+
+        Parameters
+        ----------
+        prefetch : Optional[Union[Future, asyncio.Task]]
+            The background search, if any.
+        """
+        if prefetch is not None:
+            prefetch.cancel()
+
+    def web_search(self, state: GraphState) -> GraphState:
+        """
+        Perform a web search to find relevant information to answer the user's
+        question.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the web search results.
+        """
+        log_agent_step("Web search")
+        question = state["question"]
+        if state.get("retry_count", 0) >= MAX_WEB_SEARCHES:
+            return self.build_web_search_state(state, MAX_RETRIES_MESSAGE)
+
+        # web search, unless it was prefetched while grading
+        prefetch = state.get("web_prefetch")
+        if prefetch is not None:
+            response = prefetch.result()
+        else:
+            response = self.serp_api_client.search_tool(query=question)
+        search_parser_response = self.search_parser.generate_response(
+            question=question, context=response.keys()
+        )
+        summarizer_response = self.summarizer.generate_response(
+            question=question, context=response[search_parser_response.field]
+        )
+        return self.build_web_search_state(state, summarizer_response)
+
+    async def aweb_search(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously perform a web search to find relevant information to
+        answer the user's question.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the web search results.
+        """
+        log_agent_step("Web search")
+        question = state["question"]
+        if state.get("retry_count", 0) >= MAX_WEB_SEARCHES:
+            return self.build_web_search_state(state, MAX_RETRIES_MESSAGE)
+
+        # web search, unless it was prefetched while grading
+        prefetch = state.get("web_prefetch")
+        if prefetch is not None:
+            response = await prefetch
+        else:
+            response = await self.serp_api_client.asearch_tool(query=question)
+        search_parser_response = await self.search_parser.agenerate_response(
+            question=question, context=response.keys()
+        )
+        summarizer_response = await self.summarizer.agenerate_response(
+            question=question, context=response[search_parser_response.field]
+        )
+        return self.build_web_search_state(state, summarizer_response)
+
+    def build_web_search_state(
+        self, state: GraphState, summarizer_response: str
+    ) -> GraphState:
+        """
+        Build the state of the graph after a web search, counting the search
+        and its LLM requests unless the searches ran out.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        summarizer_response : str
+            The summary of the web search results, or the message telling
+            that the searches ran out.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the web search results.
+        """
+        retry_count = state.get("retry_count", 0)
+        n_calls = 0
+        if summarizer_response != MAX_RETRIES_MESSAGE:
+            retry_count += 1
+            # the search parser and the summarizer
+            n_calls = 2
+
+        web_results = Document(page_content=summarizer_response)
+        return {
+            "documents": [web_results],
+            "question": state["question"],
+            "web_result": summarizer_response,
+            "retry_count": retry_count,
+            "llm_calls": self.count_llm_calls(state, n_calls),
+            "web_prefetch": None,
+        }
+
+    def decide_to_generate(self, state: GraphState) -> str:
+        """
+        Decide whether to generate a response or perform a web search,
+        unless a budget is spent.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        str
+            The name of the next node to execute.
+        """
+        logging.info("Assessing graded documents")
+        web_search = state["web_search"]
+
+        if self.check_budgets(state) == "exhausted":
+            return "exhausted"
+        elif web_search == "Yes":
+            logging.info("Decision: web search")
+            return "search_in_web"
+        else:
+            logging.info("Decision: generate")
+            return "generate"
+
+    def grade_generation(self, state: GraphState) -> GraphState:
+        """
+        Grade the generated response, keeping track of the best one and of
+        the budgets, and, in streaming mode, report the verdict, retracting
+        the streamed draft if it is rejected.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the grade of the generation.
+        """
+        log_agent_step("Grade generation")
+        grade, n_calls = self.judge_generation(state)
+        self.discard_rejected_generation(state, grade)
+        return self.apply_generation_grade(state, grade, n_calls)
+
+    async def agrade_generation(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously grade the generated response, keeping track of the
+        best one and of the budgets, and, in streaming mode, report the
+        verdict, retracting the streamed draft if it is rejected.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the grade of the generation.
+        """
+        log_agent_step("Grade generation")
+        grade, n_calls = await self.ajudge_generation(state)
+        # the disk cache is written off the event loop
+        await asyncio.to_thread(self.discard_rejected_generation, state, grade)
+        return self.apply_generation_grade(state, grade, n_calls)
+
+    def discard_rejected_generation(
+        self, state: GraphState, grade: str
+    ) -> None:
+        """
+        Remove the generation graded as not supported from the response
+        cache, by the cache key recorded when it was generated, so that it
+        is not served again.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        grade : str
+            The grade of the generation.
+        """
+        generation_key = state.get("generation_key")
+        if grade == "not supported" and generation_key is not None:
+            self.rag_pipeline.discard_response(generation_key)
+
+    def apply_generation_grade(
+        self, state: GraphState, grade: str, n_calls: int
+    ) -> GraphState:
+        """
+        Record the grade of the generation and keep the best generation so
+        far. If the generation is rejected and a budget is exhausted, the
+        grade becomes "exhausted" and the best generation is returned.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        grade : str
+            The grade of the generation.
+        n_calls : int
+            The number of LLM requests made to grade the generation.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the grade of the generation.
+        """
+        generation = state["generation"]
+        best_generation = state.get("best_generation", None)
+        best_grade = state.get("best_grade", None)
+        regeneration_count = state.get("regeneration_count", 0)
+        llm_calls = self.count_llm_calls(state, n_calls)
+
+        # the web search retries ran out, there is no new answer to keep
+        out_of_retries = state.get("web_result") == MAX_RETRIES_MESSAGE
+        if not out_of_retries and (
+            best_grade is None or GRADE_RANKS[grade] >= GRADE_RANKS[best_grade]
+        ):
+            best_generation, best_grade = generation, grade
+
+        if grade == "not supported":
+            regeneration_count += 1
+
+        self.emit_generation_grade(state, grade)
+        exhausted_budget = (
+            "web search retries"
+            if out_of_retries
+            else self.find_exhausted_budget(
+                state, grade, regeneration_count, llm_calls
+            )
+        )
+        if grade != "useful" and exhausted_budget is not None:
+            logging.warning(
+                f"Budget exhausted ({exhausted_budget}), "
+                "returning the best answer"
+            )
+            grade = "exhausted"
+            if best_generation is not None:
+                generation = best_generation
+            self.emit(state, {"type": "token", "content": generation})
+
+        return {
+            "generation": generation,
+            "generation_grade": grade,
+            "best_generation": best_generation,
+            "best_grade": best_grade,
+            "regeneration_count": regeneration_count,
+            "llm_calls": llm_calls,
+        }
+
+    def find_exhausted_budget(
+        self,
+        state: GraphState,
+        grade: str,
+        regeneration_count: int,
+        llm_calls: int,
+    ) -> Optional[str]:
+        """
+        Find the budget, if any, that forbids trying another answer.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        grade : str
+            The grade of the generation.
+        regeneration_count : int
+            The number of regenerations, including the next one for an
+            unsupported generation.
+        llm_calls : int
+            The number of LLM requests made so far.
+
+        Returns
+        -------
+        Optional[str]
+            The exhausted budget, or None if the agent can go on.
+        """
+        budgets_config = self.config["graph"]["budgets"]
+
+        if (
+            grade == "not supported"
+            and regeneration_count > budgets_config["max_regenerations"]
+        ):
+            return "regenerations"
+        return self.find_spent_budget(state, llm_calls)
+
+    def find_spent_budget(
+        self, state: GraphState, llm_calls: int
+    ) -> Optional[str]:
+        """
+        Find the budget, if any, that forbids any further step: the LLM
+        requests or the deadline.
 
         Parameters
         ----------
         state : GraphState
             The state of the graph.
+        llm_calls : int
+            The number of LLM requests made so far.
 
         Returns
         -------
-        GraphState
-            The state of the graph with the retrieved documents.
+        Optional[str]
+            The spent budget, or None if the agent can go on.
         """
-        log_agent_step("Retrieve")
-        question = state["question"]
+        max_llm_calls = self.config["graph"]["budgets"]["max_llm_calls"]
 
-        documents = self.rag_pipeline.retrieve_context(question)
-        return {"documents": documents, "question": question}
+        if max_llm_calls is not None and llm_calls >= max_llm_calls:
+            return "LLM calls"
+        elif "deadline" in state and time.monotonic() >= state["deadline"]:
+            return "deadline"
+        return None
 
-    def grade_documents(self, state: GraphState) -> GraphState:
+    def check_budgets(self, state: GraphState) -> str:
         """
-        Judge the relevance of the retrieved documents to the user's question.
+        Check the budgets before a step that sends LLM or web search
+        requests.
 
         Parameters
         ----------
@@ -130,43 +1322,55 @@ class GraphElements:
 
         Returns
         -------
-        GraphState
-            The state of the graph with the graded documents.
+        str
+            "exhausted" if a budget is spent, "continue" otherwise.
         """
-        logging.info("Checking documents relevance to the question")
-        question = state["question"]
-        documents = state["documents"]
-
-        filtered_docs = []
-        web_search = "No"
-
-        for document in documents:
-            grader_response = self.retrieval_grader.generate_response(
-                question=question, document=document
+        spent_budget = self.find_spent_budget(
+            state, state.get("llm_calls", 0)
+        )
+        if spent_budget is not None:
+            logging.warning(
+                f"Budget exhausted ({spent_budget}), "
+                "returning the best answer"
             )
-            grade = grader_response.score
-
-            if grade.lower() == "yes":
-                logging.info("Grade: document relevant!")
-                filtered_docs.append(document)
+            return "exhausted"
+        return "continue"
 
-            else:
-                logging.info("Grade: document not relevant!")
+    def return_best_answer(self, state: GraphState) -> GraphState:
+        """
+        Return the best graded answer so far, or the last generation if none
+        was graded, once a budget is spent before the next step, dropping
+        the web search prefetched for it.
 
-        if len(filtered_docs) == 0:
-            logging.info("No relevant documents found!")
-            web_search = "Yes"
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
 
+        Returns
+        -------
+        GraphState
+            The state of the graph with the best answer as the generation.
+        """
+        log_agent_step("Return best answer")
+        self.cancel_web_prefetch(state.get("web_prefetch"))
+        # an answer not graded yet is better than none
+        generation = (
+            state.get("best_generation")
+            or state.get("generation")
+            or NO_ANSWER_MESSAGE
+        )
+        self.emit(state, {"type": "token", "content": generation})
         return {
-            "documents": filtered_docs,
-            "question": question,
-            "web_search": web_search,
+            "generation": generation,
+            "generation_grade": "exhausted",
+            "web_prefetch": None,
         }
 
-    def web_search(self, state: GraphState) -> GraphState:
+    async def areturn_best_answer(self, state: GraphState) -> GraphState:
         """
-        Perform a web search to find relevant information to answer the user's
-        question.
+        Return the best graded answer so far, from the event loop which runs
+        the prefetched web search tasks.
 
         Parameters
         ----------
@@ -176,48 +1380,82 @@ class GraphElements:
         Returns
         -------
         GraphState
-            The state of the graph with the web search results.
+            The state of the graph with the best answer as the generation.
         """
-        log_agent_step("Web search")
-        question = state["question"]
-        retry_count = state.get("retry_count", 0)
+        return self.return_best_answer(state)
 
-        try:
-            documents = state["documents"]
+    def get_generation_grading_mode(self, state: GraphState) -> str:
+        """
+        Get how the generation is graded: "out of retries" if the web search
+        retries ran out and there is no generation to grade, "answer" if it
+        is a web result, only checked against the question, or else the
+        configured mode.
 
-        except KeyError:
-            documents = None
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
 
-        if retry_count < 2:
-            # web search
-            response = SerpAPIClient().search_tool(query=question)
-            search_parser_response = self.search_parser.generate_response(
-                question=question, context=response.keys()
-            )
-            field = search_parser_response.field
+        Returns
+        -------
+        str
+            The grading mode of the generation.
+        """
+        web_result = state.get("web_result", None)
+        if web_result == MAX_RETRIES_MESSAGE:
+            return "out of retries"
+        elif web_result is not None:
+            # web results are not checked against the documents
+            return "answer"
+        return self.config["graph"]["generation_grading"]["mode"]
+
+    @staticmethod
+    def decide_after_grading(state: GraphState) -> str:
+        """
+        Get the grade of the generation, which decides the next node.
 
-            retry_count += 1
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
 
-            # # process output
-            summarizer_response = self.summarizer.generate_response(
-                question=question, context=response[field]
-            )
-        else:
-            summarizer_response = "Reached max retries."
+        Returns
+        -------
+        str
+            The grade of the generation.
+        """
+        return state["generation_grade"]
 
-        # Web search
-        web_results = Document(page_content=summarizer_response)
-        documents = [web_results]
-        return {
-            "documents": documents,
-            "question": question,
-            "web_result": summarizer_response,
-            "retry_count": retry_count,
-        }
+    def emit_generation_grade(self, state: GraphState, grade: str) -> None:
+        """
+        Emit the verdict on the generated response and, if it is rejected,
+        a retraction of the streamed draft, which will be replaced by the
+        next generation.
 
-    def decide_to_generate(self, state: GraphState) -> str:
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        grade : str
+            The grade of the generation.
         """
-        Decide whether to generate a response or perform a web search.
+        self.emit(
+            state, {"type": "grade", "stage": "generation", "verdict": grade}
+        )
+        if grade != "useful":
+            self.emit(state, {"type": "retract", "reason": grade})
+
+    def judge_generation(self, state: GraphState) -> Tuple[str, int]:
+        """
+        Judge the quality of the generated response: whether it is grounded
+        in the documents and whether it addresses the user's question. In
+        "sequential" mode the two grades are requested one after the other,
+        in "concurrent" mode at once, and in "combined" mode with a single
+        request, falling back to concurrent grading if it fails.
+
+        In "concurrent" mode the answer grade is dropped if the generation
+        is not grounded, but its request is already sent and still counts
+        as an LLM request.
 
         Parameters
         ----------
@@ -226,23 +1464,119 @@ class GraphElements:
 
         Returns
         -------
-        str
-            The name of the next node to execute.
+        Tuple[str, int]
+            The grade of the generation and the number of LLM requests made
+            to grade it.
         """
-        logging.info("Assessing graded documents")
-        web_search = state["web_search"]
+        logging.info("Grading generation")
 
-        if web_search == "Yes":
-            logging.info("Decision: web search")
-            return "search_in_web"
-        else:
-            logging.info("Decision: generate")
-            return "generate"
+        question = state["question"]
+        documents = state["documents"]
+        generation = state["generation"]
+        mode = self.get_generation_grading_mode(state)
+        # a regeneration and its grading must not reuse cached responses
+        use_cache = not self.is_regeneration(state)
+
+        if mode == "out of retries":
+            return "not supported", 0
+
+        elif mode == "answer":
+            logging.info("Checking generation with user's question")
+            answer_grader_response = self.answer_grader.generate_response(
+                generation=generation,
+                question=question,
+                use_cache=use_cache,
+            )
+            grade = self.select_generation_grade(
+                None, answer_grader_response.score
+            )
+            return grade, 1
+
+        n_calls = 0
+        if mode == "combined":
+            logging.info("Checking hallucination and user's question")
+            try:
+                generation_grader_response = (
+                    self.generation_grader.generate_response(
+                        question=question,
+                        documents=documents,
+                        generation=generation,
+                        use_cache=use_cache,
+                    )
+                )
+                grade = self.select_generation_grade(
+                    generation_grader_response.grounded,
+                    generation_grader_response.addresses_question,
+                )
+                return grade, 1
+            except RuntimeError as e:
+                logging.warning(
+                    f"Combined grading failed, grading concurrently: {e}"
+                )
+                n_calls += 1
+
+        if mode != "sequential":
+            # the answer grade is dropped, without waiting for it, if the
+            # generation is not grounded. Its request cannot be cancelled
+            # once running, so it counts either way.
+            n_calls += 2
+            executor = ThreadPoolExecutor(max_workers=2)
+            try:
+                answer_future = executor.submit(
+                    bind_context(self.answer_grader.generate_response),
+                    generation=generation,
+                    question=question,
+                    use_cache=use_cache,
+                )
+                hallucination_grader_response = (
+                    self.hallucination_grader.generate_response(
+                        documents=documents,
+                        generation=generation,
+                        use_cache=use_cache,
+                    )
+                )
+                if hallucination_grader_response.score != "yes":
+                    grade = self.select_generation_grade(
+                        hallucination_grader_response.score, None
+                    )
+                    return grade, n_calls
+                grade = self.select_generation_grade(
+                    hallucination_grader_response.score,
+                    answer_future.result().score,
+                )
+                return grade, n_calls
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        logging.info("Checking hallucination")
+        hallucination_grader_response = (
+            self.hallucination_grader.generate_response(
+                documents=documents,
+                generation=generation,
+                use_cache=use_cache,
+            )
+        )
+        if hallucination_grader_response.score != "yes":
+            grade = self.select_generation_grade(
+                hallucination_grader_response.score, None
+            )
+            return grade, 1
 
-    def grade_generation(self, state: GraphState) -> str:
+        logging.info("Checking generation with user's question")
+        answer_grader_response = self.answer_grader.generate_response(
+            generation=generation,
+            question=question,
+            use_cache=use_cache,
+        )
+        grade = self.select_generation_grade(
+            hallucination_grader_response.score, answer_grader_response.score
+        )
+        return grade, 2
+
+    async def ajudge_generation(self, state: GraphState) -> Tuple[str, int]:
         """
-        Judge the quality of the generated response based on the user's question
-        and determines if it is useful or not.
+        Asynchronously judge the quality of the generated response, following
+        the same modes as `judge_generation`.
 
         Parameters
         ----------
@@ -251,29 +1585,141 @@ class GraphElements:
 
         Returns
         -------
-        str
-            The grade of the generation.
+        Tuple[str, int]
+            The grade of the generation and the number of LLM requests made
+            to grade it.
         """
         logging.info("Grading generation")
 
         question = state["question"]
         documents = state["documents"]
         generation = state["generation"]
-        web_result = state.get("web_result", None)
-
-        if web_result == "Reached max retries.":
-            return "not supported"
-
-        elif web_result is None:
-            logging.info("Checking hallucination")
-            hallucination_grader_response = (
-                self.hallucination_grader.generate_response(
-                    documents=documents, generation=generation
+        mode = self.get_generation_grading_mode(state)
+        # a regeneration and its grading must not reuse cached responses
+        use_cache = not self.is_regeneration(state)
+
+        if mode == "out of retries":
+            return "not supported", 0
+
+        elif mode == "answer":
+            logging.info("Checking generation with user's question")
+            answer_grader_response = (
+                await self.answer_grader.agenerate_response(
+                    generation=generation,
+                    question=question,
+                    use_cache=use_cache,
+                )
+            )
+            grade = self.select_generation_grade(
+                None, answer_grader_response.score
+            )
+            return grade, 1
+
+        n_calls = 0
+        if mode == "combined":
+            logging.info("Checking hallucination and user's question")
+            try:
+                generation_grader_response = (
+                    await self.generation_grader.agenerate_response(
+                        question=question,
+                        documents=documents,
+                        generation=generation,
+                        use_cache=use_cache,
+                    )
+                )
+                grade = self.select_generation_grade(
+                    generation_grader_response.grounded,
+                    generation_grader_response.addresses_question,
+                )
+                return grade, 1
+            except RuntimeError as e:
+                logging.warning(
+                    f"Combined grading failed, grading concurrently: {e}"
+                )
+                n_calls += 1
+
+        if mode != "sequential":
+            # the answer grade is cancelled if the generation is not
+            # grounded, but its request may already be sent, so it counts
+            # either way
+            n_calls += 2
+            answer_task = asyncio.create_task(
+                self.answer_grader.agenerate_response(
+                    generation=generation,
+                    question=question,
+                    use_cache=use_cache,
                 )
             )
-            hallucination_grade = hallucination_grader_response.score
+            try:
+                hallucination_grader_response = (
+                    await self.hallucination_grader.agenerate_response(
+                        documents=documents,
+                        generation=generation,
+                        use_cache=use_cache,
+                    )
+                )
+                if hallucination_grader_response.score != "yes":
+                    grade = self.select_generation_grade(
+                        hallucination_grader_response.score, None
+                    )
+                    return grade, n_calls
+                answer_grader_response = await answer_task
+                grade = self.select_generation_grade(
+                    hallucination_grader_response.score,
+                    answer_grader_response.score,
+                )
+                return grade, n_calls
+            finally:
+                answer_task.cancel()
+
+        logging.info("Checking hallucination")
+        hallucination_grader_response = (
+            await self.hallucination_grader.agenerate_response(
+                documents=documents,
+                generation=generation,
+                use_cache=use_cache,
+            )
+        )
+        if hallucination_grader_response.score != "yes":
+            grade = self.select_generation_grade(
+                hallucination_grader_response.score, None
+            )
+            return grade, 1
+
+        logging.info("Checking generation with user's question")
+        answer_grader_response = await self.answer_grader.agenerate_response(
+            generation=generation,
+            question=question,
+            use_cache=use_cache,
+        )
+        grade = self.select_generation_grade(
+            hallucination_grader_response.score, answer_grader_response.score
+        )
+        return grade, 2
+
+    @staticmethod
+    def select_generation_grade(
+        grounded: Optional[str], addresses_question: Optional[str]
+    ) -> str:
+        """
+        Map the grader scores of a generation to its grade.
+
+        Parameters
+        ----------
+        grounded : Optional[str]
+            Whether the generation is based on the documents, "yes" or "no",
+            or None if it was not checked.
+        addresses_question : Optional[str]
+            Whether the generation addresses the user's question, "yes" or
+            "no", or None if it was not checked.
 
-            if hallucination_grade == "yes":
+        Returns
+        -------
+        str
+            The grade of the generation.
+        """
+        if grounded is not None:
+            if grounded == "yes":
                 logging.info("Decision: generation is based on the documents")
             else:
                 logging.info(
@@ -281,13 +1727,7 @@ class GraphElements:
                 )
                 return "not supported"
 
-        logging.info("Checking generation with user's question")
-        answer_grader_response = self.answer_grader.generate_response(
-            generation=generation, question=question
-        )
-        answer_grade = answer_grader_response.score
-
-        if answer_grade == "yes":
+        if addresses_question == "yes":
             logging.info("Decision: generation addresses user's question")
             return "useful"
         else:
@@ -312,31 +1752,148 @@ class GraphElements:
             The state of the graph with the generated response.
         """
         log_agent_step("Generate")
-        question = state["question"]
+        if state.get("web_result") is not None:
+            return self.use_web_result(state)
+
         documents = state["documents"]
-        web_result = state.get("web_result", None)
+        if self.config["graph"]["generation"]["re_retrieve"]:
+            documents = self.rag_pipeline.retrieve_context(state["question"])
+
+        if state.get("stream", False):
+            tokens = []
+            for token in self.rag_pipeline.stream_response(
+                question=state["question"],
+                context=documents,
+                use_cache=not self.is_regeneration(state),
+            ):
+                tokens.append(token)
+                self.emit(state, {"type": "token", "content": token})
+            return self.build_generation_state(
+                state, documents, "".join(tokens)
+            )
 
-        if web_result is not None:
-            return {
-                "documents": documents,
-                "question": question,
-                "generation": web_result,
-            }
+        rag_generation = self.rag_pipeline.generate_response(
+            question=state["question"],
+            context=documents,
+            use_cache=not self.is_regeneration(state),
+        )
+        return self.build_generation_state(state, documents, rag_generation)
 
-        else:
-            rag_generation = self.rag_pipeline.generate_response(
-                question=question, context=documents
+    async def agenerate(self, state: GraphState) -> GraphState:
+        """
+        Asynchronously generate a response based on the user's question and
+        the retrieved documents or web search results.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the generated response.
+        """
+        log_agent_step("Generate")
+        if state.get("web_result") is not None:
+            return self.use_web_result(state)
+
+        documents = state["documents"]
+        if self.config["graph"]["generation"]["re_retrieve"]:
+            documents = await self.rag_pipeline.aretrieve_context(
+                state["question"]
             )
-            return {
-                "documents": documents,
-                "question": question,
-                "generation": rag_generation,
-            }
 
-    def add_nodes(self) -> StateGraph:
+        rag_generation = await self.rag_pipeline.agenerate_response(
+            question=state["question"],
+            context=documents,
+            use_cache=not self.is_regeneration(state),
+        )
+        return self.build_generation_state(state, documents, rag_generation)
+
+    @staticmethod
+    def is_regeneration(state: GraphState) -> bool:
+        """
+        Whether the generation is, or is about to be, a regeneration of an
+        answer graded as not supported, which must not be served from the
+        response cache.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        bool
+            Whether the last generation was graded as not supported.
+        """
+        return state.get("generation_grade") == "not supported"
+
+    def use_web_result(self, state: GraphState) -> GraphState:
+        """
+        Use the web search result as the generation, without an LLM request.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the web result as the generation.
+        """
+        web_result = state["web_result"]
+        self.emit(state, {"type": "token", "content": web_result})
+        return {
+            "documents": state["documents"],
+            "question": state["question"],
+            "generation": web_result,
+            "generation_key": None,
+        }
+
+    def build_generation_state(
+        self, state: GraphState, documents: List[Document], generation: str
+    ) -> GraphState:
+        """
+        Build the state of the graph after generating a response with the
+        RAG pipeline, counting its LLM request and recording its response
+        cache key, to discard it if it is graded as not supported.
+
+        Parameters
+        ----------
+        state : GraphState
+            The state of the graph.
+        documents : List[Document]
+            The documents the response is grounded on.
+        generation : str
+            The generated response.
+
+        Returns
+        -------
+        GraphState
+            The state of the graph with the generated response.
+        """
+        return {
+            "documents": documents,
+            "question": state["question"],
+            "generation": generation,
+            "generation_key": self.rag_pipeline.get_cache_key(
+                state["question"], documents
+            ),
+            "llm_calls": self.count_llm_calls(state, 1),
+        }
+
+    def add_nodes(self, asynchronous: bool = False) -> StateGraph:
         """
         Add nodes to the agent graph.
 
+        Parameters
+        ----------
+        asynchronous : bool, optional
+            Whether to use the asynchronous node functions, by default False.
+
         Returns
         -------
         StateGraph
@@ -344,14 +1901,49 @@ class GraphElements:
         """
         agent_graph = StateGraph(GraphState)
 
-        agent_graph.add_node("search_in_web", self.web_search)
-        agent_graph.add_node("retrieve", self.retrieve)
-        agent_graph.add_node("judge_context", self.grade_documents)
-        agent_graph.add_node("generate", self.generate)
+        if asynchronous:
+            nodes = {
+                "search_in_web": self.aweb_search,
+                "retrieve": self.aretrieve,
+                "judge_context": self.agrade_documents,
+                "generate": self.agenerate,
+                "grade_generation": self.agrade_generation,
+                "return_best_answer": self.areturn_best_answer,
+            }
+        else:
+            nodes = {
+                "search_in_web": self.web_search,
+                "retrieve": self.retrieve,
+                "judge_context": self.grade_documents,
+                "generate": self.generate,
+                "grade_generation": self.grade_generation,
+                "return_best_answer": self.return_best_answer,
+            }
+
+        if self.reranker is not None:
+            nodes["rerank"] = self.arerank if asynchronous else self.rerank
+
+        if self.config["graph"]["speculative"]["enabled"]:
+            nodes["route_and_retrieve"] = (
+                self.aroute_and_retrieve
+                if asynchronous
+                else self.route_and_retrieve
+            )
+        else:
+            nodes["route_question"] = (
+                self.aroute_question if asynchronous else self.route_question
+            )
+
+        for name, node in nodes.items():
+            agent_graph.add_node(
+                name, self.run_within_budgets(node, asynchronous=asynchronous)
+            )
 
         return agent_graph
 
-    def add_edges(self, agent_graph: StateGraph) -> StateGraph:
+    def add_edges(
+        self, agent_graph: StateGraph, asynchronous: bool = False
+    ) -> StateGraph:
         """
         Add edges to the agent graph.
 
@@ -359,52 +1951,113 @@ class GraphElements:
         ----------
         agent_graph : StateGraph
             The agent graph to add edges to.
+        asynchronous : bool, optional
+            Whether to use the asynchronous routing functions, by default
+            False.
 
         Returns
         -------
         StateGraph
             The agent graph with the added edges.
         """
-        agent_graph.set_conditional_entry_point(
-            self.route_question,
+        first_grading_node = (
+            "rerank" if self.reranker is not None else "judge_context"
+        )
+        if self.config["graph"]["speculative"]["enabled"]:
+            # the documents are retrieved while the question is routed
+            agent_graph.set_entry_point("route_and_retrieve")
+            agent_graph.add_conditional_edges(
+                "route_and_retrieve",
+                self.follow_route,
+                {
+                    "search_in_web": "search_in_web",
+                    "vector_store": first_grading_node,
+                    "exhausted": "return_best_answer",
+                },
+            )
+        else:
+            agent_graph.set_entry_point("route_question")
+            agent_graph.add_conditional_edges(
+                "route_question",
+                self.follow_route,
+                {
+                    "search_in_web": "search_in_web",
+                    "vector_store": "retrieve",
+                    "exhausted": "return_best_answer",
+                },
+            )
+
+        # the budgets are checked before each step sending requests
+        agent_graph.add_conditional_edges(
+            "retrieve",
+            self.check_budgets,
             {
-                "search_in_web": "search_in_web",
-                "vector_store": "retrieve",
+                "continue": first_grading_node,
+                "exhausted": "return_best_answer",
             },
         )
-
-        agent_graph.add_edge("retrieve", "judge_context")
+        if self.reranker is not None:
+            agent_graph.add_conditional_edges(
+                "rerank",
+                self.check_budgets,
+                {
+                    "continue": "judge_context",
+                    "exhausted": "return_best_answer",
+                },
+            )
         agent_graph.add_conditional_edges(
             "judge_context",
             self.decide_to_generate,
             {
                 "search_in_web": "search_in_web",
                 "generate": "generate",
+                "exhausted": "return_best_answer",
             },
         )
-        agent_graph.add_edge("search_in_web", "generate")
+        agent_graph.add_conditional_edges(
+            "search_in_web",
+            self.check_budgets,
+            {"continue": "generate", "exhausted": "return_best_answer"},
+        )
         agent_graph.add_conditional_edges(
             "generate",
-            self.grade_generation,
+            self.check_budgets,
+            {
+                "continue": "grade_generation",
+                "exhausted": "return_best_answer",
+            },
+        )
+        agent_graph.add_conditional_edges(
+            "grade_generation",
+            self.decide_after_grading,
             {
                 "not supported": "generate",
                 "useful": END,
                 "not useful": "search_in_web",
+                "exhausted": END,
             },
         )
+        agent_graph.add_edge("return_best_answer", END)
 
         return agent_graph
 
-    def build_graph(self) -> StateGraph:
+    def build_graph(self, asynchronous: bool = False) -> StateGraph:
         """
         Build and compile the agent graph.
 
+        Parameters
+        ----------
+        asynchronous : bool, optional
+            Whether to build the graph with the asynchronous node functions,
+            which must then be run with `astream` or `ainvoke`, by default
+            False.
+
         Returns
         -------
         StateGraph
             The compiled agent graph.
         """
-        agent_graph = self.add_nodes()
-        agent_graph = self.add_edges(agent_graph)
+        agent_graph = self.add_nodes(asynchronous=asynchronous)
+        agent_graph = self.add_edges(agent_graph, asynchronous=asynchronous)
         compile_graph = agent_graph.compile()
         return compile_graph
@@ -36,12 +36,18 @@ class HallucinationGrader(BaseAgent):
         return {
             "role": HALLUCINATION_USER_PROMPT.role,
             "content": HALLUCINATION_USER_PROMPT.format(
-                {"documents": documents, "generation": generation}
+                {
+                    "documents": self.pack_context(documents),
+                    "generation": generation,
+                }
             ),
         }
 
     def generate_response(
-        self, documents: str, generation: str
+        self,
+        documents: str,
+        generation: str,
+        use_cache: bool = True,
     ) -> HallucinationGraderResponse:
         system_message = self.get_system_message()
         user_message = self.get_user_message(documents, generation)
@@ -50,6 +56,25 @@ class HallucinationGrader(BaseAgent):
             system_message=system_message,
             user_message=user_message,
             response_model=HallucinationGraderResponse,
+            use_cache=use_cache,
+        )
+
+        return response
+
+    async def agenerate_response(
+        self,
+        documents: str,
+        generation: str,
+        use_cache: bool = True,
+    ) -> HallucinationGraderResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(documents, generation)
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=HallucinationGraderResponse,
+            use_cache=use_cache,
         )
 
         return response
@@ -0,0 +1,61 @@
+import logging
+from typing import Dict, Optional
+
+from langchain.vectorstores import FAISS
+
+from agents.router import RouterResponse
+
+
+class LocalRouter:
+    """
+    The LocalRouter class routes the question without a language model, by
+    checking how close it is to the indexed documents: the relevance score
+    of the most similar chunk in the vector store. Questions close to the
+    corpus go to the vector store, questions far from it to the web search,
+    and the ones in between are left to the LLM router.
+
+    The question embedding is the one the retriever computes next, so with
+    the query embedding cache the check costs a single FAISS search.
+
+    Parameters
+    ----------
+    vectorstore : FAISS
+        The vector store of the retriever.
+    routing_config : Dict
+        The "graph.routing" configuration section, with the relevance
+        thresholds above which a question goes to the vector store and
+        below which it goes to the web search.
+    """
+
+    def __init__(self, vectorstore: FAISS, routing_config: Dict) -> None:
+        self.vectorstore = vectorstore
+        self.vector_store_threshold = routing_config["vector_store_threshold"]
+        self.web_search_threshold = routing_config["web_search_threshold"]
+
+    def route(self, question: str) -> Optional[RouterResponse]:
+        """
+        Route the question to a datasource, if the relevance of the most
+        similar chunk is conclusive.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+
+        Returns
+        -------
+        Optional[RouterResponse]
+            The datasource of the question, or None if the LLM router must
+            decide.
+        """
+        results = self.vectorstore.similarity_search_with_relevance_scores(
+            question, k=1
+        )
+        relevance = results[0][1] if results else 0.0
+        logging.info(f"Top chunk relevance: {relevance:.3f}")
+
+        if relevance >= self.vector_store_threshold:
+            return RouterResponse(datasource="vector_store")
+        elif relevance < self.web_search_threshold:
+            return RouterResponse(datasource="web_search")
+        return None
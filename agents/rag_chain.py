@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import Dict, Iterator, List, Tuple, Union
 
 from langchain.schema import Document
 
@@ -9,6 +9,9 @@ from prompts.question_answering_prompt import (
     QEA_USER_PROMPT,
 )
 
+# context of the prompt when no document was kept
+NO_CONTEXT_MESSAGE = "No relevant context found."
+
 
 class RetrievalAugmentedGenerator(BaseAgent):
     """
@@ -29,9 +32,25 @@ class RetrievalAugmentedGenerator(BaseAgent):
         super().__init__(config_path)
         self.retriever = retriever
 
-    def retrieve_context(self, question: str) -> str:
-        context = self.retriever.invoke(question)
-        return context if context else "No relevant context found."
+    def retrieve_context(self, question: str) -> List[Document]:
+        """
+        Retrieve the documents relevant to the question.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+
+        Returns
+        -------
+        List[Document]
+            The retrieved documents, empty if none passes the search
+            threshold or filters.
+        """
+        return self.retriever.invoke(question)
+
+    async def aretrieve_context(self, question: str) -> List[Document]:
+        return await self.retriever.ainvoke(question)
 
     def get_system_message(self) -> Dict[str, str]:
         return {
@@ -45,15 +64,161 @@ class RetrievalAugmentedGenerator(BaseAgent):
         return {
             "role": QEA_USER_PROMPT.role,
             "content": QEA_USER_PROMPT.format(
-                {"question": question, "context": context}
+                {"question": question, "context": self.pack_context(context)}
             ),
         }
 
+    def build_messages(
+        self,
+        question: str,
+        context: Union[Document, List],
+        re_retrieve: bool = False,
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        Build the system and user messages of the request answering the
+        question grounded on the given context.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        context : Union[Document, List]
+            The documents to ground the answer on.
+        re_retrieve : bool, optional
+            If True, ignore the given context and query the retriever again,
+            by default False.
+
+        Returns
+        -------
+        Tuple[Dict[str, str], Dict[str, str]]
+            The system message and the user message.
+        """
+        if re_retrieve:
+            context = self.retrieve_context(question)
+        if not context:
+            context = NO_CONTEXT_MESSAGE
+
+        return self.get_system_message(), self.get_user_message(
+            question, context
+        )
+
     def generate_response(
+        self,
+        question: str,
+        context: Union[Document, List],
+        re_retrieve: bool = False,
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Generate an answer to the question grounded on the given context.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        context : Union[Document, List]
+            The documents to ground the answer on, usually the ones kept by
+            the retrieval grader.
+        re_retrieve : bool, optional
+            If True, ignore the given context and query the retriever again,
+            by default False.
+        use_cache : bool, optional
+            Whether a cached answer may be returned, by default True.
+
+        Returns
+        -------
+        str
+            The generated answer.
+        """
+        system_message, user_message = self.build_messages(
+            question, context, re_retrieve
+        )
+
+        return self.chat_client.generate_response(
+            system_message, user_message, use_cache=use_cache
+        )
+
+    def stream_response(
+        self,
+        question: str,
+        context: Union[Document, List],
+        re_retrieve: bool = False,
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        """
+        Stream an answer to the question grounded on the given context,
+        yielding the tokens as they are generated.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        context : Union[Document, List]
+            The documents to ground the answer on, usually the ones kept by
+            the retrieval grader.
+        re_retrieve : bool, optional
+            If True, ignore the given context and query the retriever again,
+            by default False.
+        use_cache : bool, optional
+            Whether a cached answer may be returned, by default True.
+
+        Yields
+        ------
+        str
+            The next piece of the generated answer.
+        """
+        system_message, user_message = self.build_messages(
+            question, context, re_retrieve
+        )
+
+        yield from self.chat_client.stream_response(
+            system_message, user_message, use_cache=use_cache
+        )
+
+    async def agenerate_response(
+        self,
+        question: str,
+        context: Union[Document, List],
+        re_retrieve: bool = False,
+        use_cache: bool = True,
+    ) -> str:
+        if re_retrieve:
+            context = await self.aretrieve_context(question)
+        system_message, user_message = self.build_messages(question, context)
+
+        return await self.async_chat_client.generate_response(
+            system_message, user_message, use_cache=use_cache
+        )
+
+    def get_cache_key(
         self, question: str, context: Union[Document, List]
     ) -> str:
-        context = self.retrieve_context(question)
-        system_message = self.get_system_message()
-        user_message = self.get_user_message(question, context)
+        """
+        Get the response cache key of the answer to the question grounded on
+        the given context.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        context : Union[Document, List]
+            The documents the answer is grounded on.
+
+        Returns
+        -------
+        str
+            The cache key of the answer.
+        """
+        system_message, user_message = self.build_messages(question, context)
+        return self.chat_client.get_cache_key(system_message, user_message)
+
+    def discard_response(self, cache_key: str) -> None:
+        """
+        Remove a cached answer, so that it is generated again next time.
 
-        return self.chat_client.generate_response(system_message, user_message)
+        Parameters
+        ----------
+        cache_key : str
+            The cache key of the answer, from `get_cache_key`.
+        """
+        self.chat_client.discard_response(cache_key)
@@ -1,10 +1,12 @@
-from typing import Dict
+from typing import Dict, List
 
 from langchain_core.documents.base import Document
 from pydantic import BaseModel
 
 from agents.base_agent import BaseAgent
 from prompts.retrieval_grader_prompt import (
+    RETRIEVAL_BATCH_SYSTEM_PROMPT,
+    RETRIEVAL_BATCH_USER_PROMPT,
     RETRIEVAL_SYSTEM_PROMPT,
     RETRIEVAL_USER_PROMPT,
 )
@@ -19,6 +21,15 @@ class GraderResponse(BaseModel):
     explanation: str
 
 
+class BatchGraderResponse(BaseModel):
+    """
+    The structure of the response from the retrieval grader agent when
+    grading several documents in a single request.
+    """
+
+    scores: List[GraderResponse]
+
+
 class RetrievalGrader(BaseAgent):
     """
     The RetrievalGrader class is responsible for grading the
@@ -38,7 +49,29 @@ class RetrievalGrader(BaseAgent):
         return {
             "role": RETRIEVAL_USER_PROMPT.role,
             "content": RETRIEVAL_USER_PROMPT.format(
-                {"question": question, "document": document}
+                {"question": question, "document": self.pack_context(document)}
+            ),
+        }
+
+    def get_batch_system_message(self) -> Dict[str, str]:
+        return {
+            "role": RETRIEVAL_BATCH_SYSTEM_PROMPT.role,
+            "content": RETRIEVAL_BATCH_SYSTEM_PROMPT.format(),
+        }
+
+    def get_batch_user_message(
+        self, question: str, documents: List[Document]
+    ) -> Dict[str, str]:
+        # one numbered entry per document, matched to the scores by order
+        numbered_documents = self.pack_context(documents, keep_all=True)
+        return {
+            "role": RETRIEVAL_BATCH_USER_PROMPT.role,
+            "content": RETRIEVAL_BATCH_USER_PROMPT.format(
+                {
+                    "question": question,
+                    "documents": numbered_documents,
+                    "n_documents": len(documents),
+                }
             ),
         }
 
@@ -55,3 +88,104 @@ class RetrievalGrader(BaseAgent):
         )
 
         return response
+
+    def generate_batch_response(
+        self, question: str, documents: List[Document]
+    ) -> List[GraderResponse]:
+        """
+        Grade all the documents with a single request to the language model.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        documents : List[Document]
+            The documents to be graded.
+
+        Returns
+        -------
+        List[GraderResponse]
+            One grader response per document, in the same order as the
+            documents.
+
+        Raises
+        ------
+        ValueError
+            If the response does not hold exactly one valid score per document.
+        """
+        system_message = self.get_batch_system_message()
+        user_message = self.get_batch_user_message(question, documents)
+
+        response = self.chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=BatchGraderResponse,
+        )
+
+        return self.validate_batch_response(response, documents)
+
+    async def agenerate_response(
+        self, question: str, document: Document
+    ) -> GraderResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(question, document)
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=GraderResponse,
+        )
+
+        return response
+
+    async def agenerate_batch_response(
+        self, question: str, documents: List[Document]
+    ) -> List[GraderResponse]:
+        system_message = self.get_batch_system_message()
+        user_message = self.get_batch_user_message(question, documents)
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=BatchGraderResponse,
+        )
+
+        return self.validate_batch_response(response, documents)
+
+    @staticmethod
+    def validate_batch_response(
+        response: BatchGraderResponse, documents: List[Document]
+    ) -> List[GraderResponse]:
+        """
+        Check that a batched response holds exactly one valid score per
+        document.
+
+        Parameters
+        ----------
+        response : BatchGraderResponse
+            The batched response from the language model.
+        documents : List[Document]
+            The documents that were graded.
+
+        Returns
+        -------
+        List[GraderResponse]
+            One grader response per document.
+
+        Raises
+        ------
+        ValueError
+            If the response does not hold exactly one valid score per document.
+        """
+        if len(response.scores) != len(documents):
+            raise ValueError(
+                f"Expected {len(documents)} scores, "
+                f"got {len(response.scores)}."
+            )
+        if any(
+            grade.score.strip().lower() not in ("yes", "no")
+            for grade in response.scores
+        ):
+            raise ValueError("Batched response has an invalid score.")
+
+        return response.scores
@@ -44,3 +44,15 @@ class Router(BaseAgent):
         )
 
         return response
+
+    async def agenerate_response(self, question: str) -> RouterResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(question=question)
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=RouterResponse,
+        )
+
+        return response
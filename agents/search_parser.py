@@ -57,3 +57,20 @@ class SearchParser(BaseAgent):
         )
 
         return response
+
+    async def agenerate_response(
+        self, question: str, context: Union[KeysView[str], List[str]]
+    ) -> ParserResponse:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(
+            question=question,
+            context=context,
+        )
+
+        response = await self.async_chat_client.generate_structured_response(
+            system_message=system_message,
+            user_message=user_message,
+            response_model=ParserResponse,
+        )
+
+        return response
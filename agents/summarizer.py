@@ -44,3 +44,19 @@ class Summarizer(BaseAgent):
         )
 
         return response
+
+    async def agenerate_response(
+        self, question: str, context: Union[Dict, str, List[Dict]]
+    ) -> str:
+        system_message = self.get_system_message()
+        user_message = self.get_user_message(
+            question=question,
+            context=context,
+        )
+
+        response = await self.async_chat_client.generate_response(
+            system_message=system_message,
+            user_message=user_message,
+        )
+
+        return response
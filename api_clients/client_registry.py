@@ -0,0 +1,201 @@
+import importlib.util
+import threading
+from functools import partial
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import httpx
+
+from api_clients.groq_chat_client import AsyncGroqChatClient, GroqChatClient
+from caches.response_cache import ResponseCache, build_response_cache
+from utils.load_config import load_yaml_config
+from utils.rate_limiter import RateLimiter
+
+# process-wide clients, keyed on the resolved configuration path
+_registry: Dict[str, Dict] = {}
+_registry_lock = threading.Lock()
+
+
+def build_http_client(
+    http_config: Dict, asynchronous: bool = False
+) -> Union[httpx.Client, httpx.AsyncClient]:
+    """
+    Build an HTTP client with a keep-alive connection pool.
+
+    Parameters
+    ----------
+    http_config : Dict
+        The "http" configuration section, with the connection pool limits,
+        the keep-alive expiry, the timeout and whether to use HTTP/2.
+    asynchronous : bool, optional
+        Whether to build an asynchronous client, by default False.
+
+    Returns
+    -------
+    Union[httpx.Client, httpx.AsyncClient]
+        The HTTP client.
+    """
+    limits = httpx.Limits(
+        max_connections=http_config["max_connections"],
+        max_keepalive_connections=http_config["max_keepalive_connections"],
+        keepalive_expiry=http_config["keepalive_expiry"],
+    )
+    # HTTP/2 needs the optional `h2` package
+    http2 = http_config["http2"] and importlib.util.find_spec("h2") is not None
+    client_class = httpx.AsyncClient if asynchronous else httpx.Client
+
+    return client_class(
+        limits=limits,
+        timeout=http_config["timeout"],
+        http2=http2,
+    )
+
+
+def get_registry_entry(config_path: Path) -> Dict:
+    """
+    Get the registry entry of a configuration file, creating it with the
+    loaded configuration on first use.
+
+    Must be called while holding the registry lock.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file.
+
+    Returns
+    -------
+    Dict
+        The registry entry of the configuration file.
+    """
+    key = str(Path(config_path).resolve())
+    if key not in _registry:
+        _registry[key] = {"config": load_yaml_config(config_path)}
+    return _registry[key]
+
+
+def get_response_cache(entry: Dict) -> Optional[ResponseCache]:
+    """
+    Get the response cache shared by the chat clients of a registry entry.
+
+    Parameters
+    ----------
+    entry : Dict
+        The registry entry of a configuration file.
+
+    Returns
+    -------
+    Optional[ResponseCache]
+        The shared response cache, or None if it is disabled.
+    """
+    if "response_cache" not in entry:
+        entry["response_cache"] = build_response_cache(
+            entry["config"]["cache"]["responses"]
+        )
+    return entry["response_cache"]
+
+
+def get_service_rate_limiter(entry: Dict, service: str) -> RateLimiter:
+    """
+    Get the rate limiter shared by all the clients of a service.
+
+    Parameters
+    ----------
+    entry : Dict
+        The registry entry of a configuration file.
+    service : str
+        The rate limited service, "groq" or "serpapi".
+
+    Returns
+    -------
+    RateLimiter
+        The shared rate limiter.
+    """
+    rate_limiters = entry.setdefault("rate_limiters", {})
+    if service not in rate_limiters:
+        rate_limiters[service] = RateLimiter(
+            **entry["config"]["rate_limits"][service]
+        )
+    return rate_limiters[service]
+
+
+def get_rate_limiter(config_path: Path, service: str) -> RateLimiter:
+    """
+    Get the process-wide rate limiter of a service, shared by all its
+    synchronous and asynchronous clients.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file.
+    service : str
+        The rate limited service, "groq" or "serpapi".
+
+    Returns
+    -------
+    RateLimiter
+        The shared rate limiter.
+    """
+    with _registry_lock:
+        entry = get_registry_entry(config_path)
+        return get_service_rate_limiter(entry, service)
+
+
+def get_chat_client(config_path: Path) -> GroqChatClient:
+    """
+    Get the process-wide GroqChatClient of a configuration file. All the
+    agents share it, and with it a single HTTP connection pool, response
+    cache and rate limiter.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file.
+
+    Returns
+    -------
+    GroqChatClient
+        The shared chat client.
+    """
+    with _registry_lock:
+        entry = get_registry_entry(config_path)
+        if "chat_client" not in entry:
+            entry["chat_client"] = GroqChatClient(
+                config_path=config_path,
+                response_cache=get_response_cache(entry),
+                http_client=build_http_client(entry["config"]["http"]),
+                rate_limiter=get_service_rate_limiter(entry, "groq"),
+            )
+        return entry["chat_client"]
+
+
+def get_async_chat_client(config_path: Path) -> AsyncGroqChatClient:
+    """
+    Get the process-wide AsyncGroqChatClient of a configuration file. All
+    the agents share it, and with it a single HTTP connection pool per event
+    loop, response cache and rate limiter.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file.
+
+    Returns
+    -------
+    AsyncGroqChatClient
+        The shared asynchronous chat client.
+    """
+    with _registry_lock:
+        entry = get_registry_entry(config_path)
+        if "async_chat_client" not in entry:
+            entry["async_chat_client"] = AsyncGroqChatClient(
+                config_path=config_path,
+                response_cache=get_response_cache(entry),
+                http_client_factory=partial(
+                    build_http_client,
+                    entry["config"]["http"],
+                    asynchronous=True,
+                ),
+                rate_limiter=get_service_rate_limiter(entry, "groq"),
+            )
+        return entry["async_chat_client"]
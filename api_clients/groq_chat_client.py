@@ -1,14 +1,26 @@
 import os
 from pathlib import Path
-from typing import Type, TypeVar
+from typing import Callable, Dict, Iterator, Optional, Tuple, Type, TypeVar
 
 import groq
+import httpx
 import instructor
 from dotenv import load_dotenv
-from groq import Groq
 from pydantic import BaseModel
 
+from caches.response_cache import (
+    ResponseCache,
+    build_response_cache,
+    make_cache_key,
+)
+from utils.deadline import cap_timeout
 from utils.load_config import load_yaml_config
+from utils.loop_local import LoopLocal
+from utils.rate_limiter import (
+    RateLimiter,
+    estimate_tokens,
+    select_rate_limiter,
+)
 
 # take environment variables
 load_dotenv()
@@ -16,30 +28,131 @@ load_dotenv()
 T = TypeVar("T", bound=BaseModel)
 
 
+def build_request(
+    config: Dict, system_message: str, user_message: str
+) -> Dict:
+    """
+    Build the chat completions request from the LLM settings.
+
+    Parameters
+    ----------
+    config : Dict
+        The loaded configuration, with the "llm" section.
+    system_message : str
+        The system message to be sent to the API.
+    user_message : str
+        The user message to be sent to the API.
+
+    Returns
+    -------
+    Dict
+        The keyword arguments of the chat completions request.
+    """
+    return {
+        "model": config["llm"]["model"],
+        "messages": [system_message, user_message],
+        "temperature": config["llm"]["temperature"],
+        "top_p": config["llm"]["top_p"],
+        "max_tokens": config["llm"]["max_tokens"],
+    }
+
+
+def request_cache_key(
+    request: Dict, response_model: Optional[Type[BaseModel]] = None
+) -> str:
+    """
+    Build the response cache key of a chat completions request.
+
+    Parameters
+    ----------
+    request : Dict
+        The keyword arguments of the chat completions request.
+    response_model : Optional[Type[BaseModel]], optional
+        The expected structure of the response, for structured requests,
+        by default None.
+
+    Returns
+    -------
+    str
+        The cache key of the request.
+    """
+    response_schema = (
+        response_model.model_json_schema() if response_model else None
+    )
+    return make_cache_key({**request, "response_model": response_schema})
+
+
+def estimate_request_tokens(request: Dict) -> int:
+    """
+    Estimate the tokens used by a chat completions request, to charge it
+    against the tokens-per-minute budget.
+
+    Parameters
+    ----------
+    request : Dict
+        The keyword arguments of the chat completions request.
+
+    Returns
+    -------
+    int
+        The estimated number of prompt and completion tokens.
+    """
+    text = "".join(message["content"] for message in request["messages"])
+    return estimate_tokens(text, request["max_tokens"])
+
+
 class GroqChatClient:
     """
     GroqChatClient is a client for interacting with the Groq API.
     It uses the Groq Python client to send chat completions requests
-    and receive responses.
+    and receive responses. Responses to identical requests can be served
+    from a response cache. The requests time out by the deadline of the
+    current `deadline_scope`, if any.
 
     Parameters
     ----------
     config_path : Path
         Path to the YAML configuration file containing API settings.
+    response_cache : Optional[ResponseCache], optional
+        The cache for the API responses. If None, it is built from the
+        "cache.responses" configuration section, by default None.
+    http_client : Optional[httpx.Client], optional
+        The HTTP client, and connection pool, used to reach the API. If None,
+        the Groq client builds its own, by default None.
+    rate_limiter : Optional[RateLimiter], optional
+        The requests and tokens budget to respect, unless a
+        `rate_limit_scope` sets another one. If None, requests are not rate
+        limited, by default None.
     """
 
-    def __init__(self, config_path: Path) -> None:
+    def __init__(
+        self,
+        config_path: Path,
+        response_cache: Optional[ResponseCache] = None,
+        http_client: Optional[httpx.Client] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> None:
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY environment variable is missing.")
 
-        self.groq_client = groq.Client(api_key=api_key)
+        self.groq_client = groq.Client(
+            api_key=api_key, http_client=http_client
+        )
         self.groq_instructor = instructor.from_groq(
-            Groq(), mode=instructor.Mode.JSON
+            self.groq_client, mode=instructor.Mode.JSON
         )
         self.config = load_yaml_config(config_path)
+        # capped, per request, at the time left before its deadline
+        self.timeout = self.config["http"]["timeout"]
+        self.response_cache = response_cache or build_response_cache(
+            self.config["cache"]["responses"]
+        )
+        self.rate_limiter = rate_limiter
 
-    def generate_response(self, system_message: str, user_message: str) -> str:
+    def generate_response(
+        self, system_message: str, user_message: str, use_cache: bool = True
+    ) -> str:
         """
         Generate a response from the Groq API using the provided system
         and user messages.
@@ -50,27 +163,134 @@ class GroqChatClient:
             The system message to be sent to the API.
         user_message : str
             The user message to be sent to the API.
+        use_cache : bool, optional
+            Whether a cached response may be returned, by default True. The
+            new response is cached either way.
 
         Returns
         -------
         str
             The generated response from the API.
         """
+        request = build_request(self.config, system_message, user_message)
+
+        if self.response_cache is not None:
+            cache_key = request_cache_key(request)
+            cached_response = (
+                self.response_cache.get(cache_key) if use_cache else None
+            )
+            if cached_response is not None:
+                return cached_response
+
+        rate_limiter = select_rate_limiter("groq", self.rate_limiter)
+        if rate_limiter is not None:
+            rate_limiter.acquire(estimate_request_tokens(request))
+
+        timeout = cap_timeout(self.timeout)
         try:
             response = self.groq_client.chat.completions.create(
-                model=self.config["llm"]["model"],
-                messages=[system_message, user_message],
-                temperature=self.config["llm"]["temperature"],
-                top_p=self.config["llm"]["top_p"],
-                max_tokens=self.config["llm"]["max_tokens"],
+                **request, timeout=timeout
+            )
+            content = response.choices[0].message.content
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate response: {e}")
+
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, content)
+        return content
+
+    def get_cache_key(self, system_message: str, user_message: str) -> str:
+        """
+        Get the response cache key of the provided system and user messages.
+
+        Parameters
+        ----------
+        system_message : str
+            The system message sent to the API.
+        user_message : str
+            The user message sent to the API.
+
+        Returns
+        -------
+        str
+            The cache key of the response.
+        """
+        request = build_request(self.config, system_message, user_message)
+        return request_cache_key(request)
+
+    def discard_response(self, cache_key: str) -> None:
+        """
+        Remove a cached response, so that it is not returned again.
+
+        Parameters
+        ----------
+        cache_key : str
+            The cache key of the response, from `get_cache_key`.
+        """
+        if self.response_cache is not None:
+            self.response_cache.delete(cache_key)
+
+    def stream_response(
+        self, system_message: str, user_message: str, use_cache: bool = True
+    ) -> Iterator[str]:
+        """
+        Stream a response from the Groq API using the provided system and
+        user messages, yielding the tokens as they are generated.
+
+        Parameters
+        ----------
+        system_message : str
+            The system message to be sent to the API.
+        user_message : str
+            The user message to be sent to the API.
+        use_cache : bool, optional
+            Whether a cached response may be returned, by default True. The
+            new response is cached either way.
+
+        Yields
+        ------
+        str
+            The next piece of the generated response. A cached response is
+            yielded at once.
+        """
+        request = build_request(self.config, system_message, user_message)
+
+        if self.response_cache is not None:
+            cache_key = request_cache_key(request)
+            cached_response = (
+                self.response_cache.get(cache_key) if use_cache else None
             )
+            if cached_response is not None:
+                yield cached_response
+                return
+
+        rate_limiter = select_rate_limiter("groq", self.rate_limiter)
+        if rate_limiter is not None:
+            rate_limiter.acquire(estimate_request_tokens(request))
 
-            return response.choices[0].message.content
+        content = []
+        timeout = cap_timeout(self.timeout)
+        try:
+            stream = self.groq_client.chat.completions.create(
+                **request, stream=True, timeout=timeout
+            )
+            for chunk in stream:
+                token = chunk.choices[0].delta.content
+                if token:
+                    content.append(token)
+                    yield token
         except Exception as e:
             raise RuntimeError(f"Failed to generate response: {e}")
 
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, "".join(content))
+
     def generate_structured_response(
-        self, system_message: str, user_message: str, response_model: Type[T]
+        self,
+        system_message: str,
+        user_message: str,
+        response_model: Type[T],
+        use_cache: bool = True,
     ) -> T:
         """
         Generate a structured response from the Groq API using the provided
@@ -85,6 +305,9 @@ class GroqChatClient:
         response_model : Type[T]
             Describes the expected structure of the response. This should be a
             Pydantic model that defines the schema of the expected response.
+        use_cache : bool, optional
+            Whether a cached response may be returned, by default True. The
+            new response is cached either way.
 
         Returns
         -------
@@ -92,16 +315,254 @@ class GroqChatClient:
             The generated response from the API structured as the response
             model.
         """
+        request = build_request(self.config, system_message, user_message)
+
+        if self.response_cache is not None:
+            cache_key = request_cache_key(request, response_model)
+            cached_response = (
+                self.response_cache.get(cache_key) if use_cache else None
+            )
+            if cached_response is not None:
+                return response_model.model_validate_json(cached_response)
+
+        rate_limiter = select_rate_limiter("groq", self.rate_limiter)
+        if rate_limiter is not None:
+            rate_limiter.acquire(estimate_request_tokens(request))
+
+        timeout = cap_timeout(self.timeout)
         try:
             response = self.groq_instructor.chat.completions.create(
-                model=self.config["llm"]["model"],
-                messages=[system_message, user_message],
-                temperature=self.config["llm"]["temperature"],
-                top_p=self.config["llm"]["top_p"],
-                max_tokens=self.config["llm"]["max_tokens"],
+                **request,
                 response_model=response_model,
+                timeout=timeout,
             )
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate response: {e}")
+
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, response.model_dump_json())
+        return response
+
 
-            return response
+class AsyncGroqChatClient:
+    """
+    AsyncGroqChatClient is the asynchronous counterpart of GroqChatClient.
+    It uses the asynchronous Groq Python client, so that many chat
+    completions requests can be awaited concurrently from a single event
+    loop. The Groq client and its connection pool are bound to an event
+    loop, so one is built for each loop the client is used in, while the
+    response cache and the rate limiter are shared by all of them.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file containing API settings.
+    response_cache : Optional[ResponseCache], optional
+        The cache for the API responses. If None, it is built from the
+        "cache.responses" configuration section, by default None.
+    http_client_factory : Optional[Callable[[], httpx.AsyncClient]], optional
+        Builds the HTTP client, and connection pool, used to reach the API
+        from an event loop. If None, the Groq client builds its own, by
+        default None.
+    rate_limiter : Optional[RateLimiter], optional
+        The requests and tokens budget to respect, unless a
+        `rate_limit_scope` sets another one. If None, requests are not rate
+        limited, by default None.
+    """
+
+    def __init__(
+        self,
+        config_path: Path,
+        response_cache: Optional[ResponseCache] = None,
+        http_client_factory: Optional[
+            Callable[[], httpx.AsyncClient]
+        ] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        self.api_key = os.getenv("GROQ_API_KEY")
+        if not self.api_key:
+            raise ValueError("GROQ_API_KEY environment variable is missing.")
+
+        self.http_client_factory = http_client_factory
+        self.clients = LoopLocal(self.build_clients)
+        self.config = load_yaml_config(config_path)
+        # capped, per request, at the time left before its deadline
+        self.timeout = self.config["http"]["timeout"]
+        self.response_cache = response_cache or build_response_cache(
+            self.config["cache"]["responses"]
+        )
+        self.rate_limiter = rate_limiter
+
+    def build_clients(
+        self,
+    ) -> Tuple[groq.AsyncGroq, instructor.AsyncInstructor]:
+        """
+        Build the Groq client, and its instructor wrapper, of the running
+        event loop.
+
+        Returns
+        -------
+        Tuple[groq.AsyncGroq, instructor.AsyncInstructor]
+            The Groq client and its instructor wrapper.
+        """
+        http_client = (
+            self.http_client_factory()
+            if self.http_client_factory is not None
+            else None
+        )
+        groq_client = groq.AsyncGroq(
+            api_key=self.api_key, http_client=http_client
+        )
+        groq_instructor = instructor.from_groq(
+            groq_client, mode=instructor.Mode.JSON
+        )
+        return groq_client, groq_instructor
+
+    async def aclose(self) -> None:
+        """
+        Close the Groq client, and its connection pool, of the running event
+        loop. A new one is built if the client is used again.
+        """
+        clients = self.clients.pop()
+        if clients is not None:
+            await clients[0].close()
+
+    def get_cache_key(self, system_message: str, user_message: str) -> str:
+        """
+        Get the response cache key of the provided system and user messages.
+
+        Parameters
+        ----------
+        system_message : str
+            The system message sent to the API.
+        user_message : str
+            The user message sent to the API.
+
+        Returns
+        -------
+        str
+            The cache key of the response.
+        """
+        request = build_request(self.config, system_message, user_message)
+        return request_cache_key(request)
+
+    def discard_response(self, cache_key: str) -> None:
+        """
+        Remove a cached response, so that it is not returned again.
+
+        Parameters
+        ----------
+        cache_key : str
+            The cache key of the response, from `get_cache_key`.
+        """
+        if self.response_cache is not None:
+            self.response_cache.delete(cache_key)
+
+    async def generate_response(
+        self, system_message: str, user_message: str, use_cache: bool = True
+    ) -> str:
+        """
+        Generate a response from the Groq API using the provided system
+        and user messages.
+
+        Parameters
+        ----------
+        system_message : str
+            The system message to be sent to the API.
+        user_message : str
+            The user message to be sent to the API.
+        use_cache : bool, optional
+            Whether a cached response may be returned, by default True. The
+            new response is cached either way.
+
+        Returns
+        -------
+        str
+            The generated response from the API.
+        """
+        request = build_request(self.config, system_message, user_message)
+
+        if self.response_cache is not None:
+            cache_key = request_cache_key(request)
+            cached_response = (
+                self.response_cache.get(cache_key) if use_cache else None
+            )
+            if cached_response is not None:
+                return cached_response
+
+        rate_limiter = select_rate_limiter("groq", self.rate_limiter)
+        if rate_limiter is not None:
+            await rate_limiter.aacquire(estimate_request_tokens(request))
+
+        timeout = cap_timeout(self.timeout)
+        try:
+            groq_client, _ = self.clients.get()
+            response = await groq_client.chat.completions.create(
+                **request, timeout=timeout
+            )
+            content = response.choices[0].message.content
         except Exception as e:
             raise RuntimeError(f"Failed to generate response: {e}")
+
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, content)
+        return content
+
+    async def generate_structured_response(
+        self,
+        system_message: str,
+        user_message: str,
+        response_model: Type[T],
+        use_cache: bool = True,
+    ) -> T:
+        """
+        Generate a structured response from the Groq API using the provided
+        system and user messages.
+
+        Parameters
+        ----------
+        system_message : str
+            The system message to be sent to the API.
+        user_message : str
+            The user message to be sent to the API.
+        response_model : Type[T]
+            Describes the expected structure of the response. This should be a
+            Pydantic model that defines the schema of the expected response.
+        use_cache : bool, optional
+            Whether a cached response may be returned, by default True. The
+            new response is cached either way.
+
+        Returns
+        -------
+        response : Type[T]
+            The generated response from the API structured as the response
+            model.
+        """
+        request = build_request(self.config, system_message, user_message)
+
+        if self.response_cache is not None:
+            cache_key = request_cache_key(request, response_model)
+            cached_response = (
+                self.response_cache.get(cache_key) if use_cache else None
+            )
+            if cached_response is not None:
+                return response_model.model_validate_json(cached_response)
+
+        rate_limiter = select_rate_limiter("groq", self.rate_limiter)
+        if rate_limiter is not None:
+            await rate_limiter.aacquire(estimate_request_tokens(request))
+
+        timeout = cap_timeout(self.timeout)
+        try:
+            _, groq_instructor = self.clients.get()
+            response = await groq_instructor.chat.completions.create(
+                **request,
+                response_model=response_model,
+                timeout=timeout,
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate response: {e}")
+
+        if self.response_cache is not None:
+            self.response_cache.set(cache_key, response.model_dump_json())
+        return response
@@ -1,24 +1,213 @@
+import asyncio
+import json
 import os
-from typing import Dict
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
 
+import httpx
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from caches.response_cache import build_response_cache, make_cache_key
+from utils.deadline import cap_timeout, check_wait
+from utils.load_config import load_yaml_config
+from utils.loop_local import LoopLocal
+from utils.rate_limiter import RateLimiter, select_rate_limiter
 
 # take environment variables
 load_dotenv()
 
+SERPAPI_URL = "https://serpapi.com/search.json"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
 
 class SerpAPIClient:
     """
     SerpAPIClient is a client for interacting with the SerpAPI, used
-    for performing Google searches.
+    for performing Google searches. It is meant to be long-lived: requests
+    go through pooled HTTP sessions with timeouts and bounded exponential
+    backoff on rate limiting, server and connection errors, every attempt
+    going through the rate limiter, and the results are cached per
+    normalized query. The timeouts are capped at the time left before
+    the deadline of the current `deadline_scope`, if any. The asynchronous
+    HTTP client is bound to an event loop, so one is built for each loop the
+    client is used in.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file containing web search settings.
+    rate_limiter : Optional[RateLimiter], optional
+        The requests budget to respect, unless a `rate_limit_scope` sets
+        another one. If None, requests are not rate limited, by default None.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self, config_path: Path, rate_limiter: Optional[RateLimiter] = None
+    ) -> None:
         self.api_key = os.getenv("SERPAPI_KEY")
         if not self.api_key:
             raise ValueError("SERPAPI_KEY environment variable is missing.")
 
+        self.config = load_yaml_config(config_path)
+        search_config = self.config["web_search"]
+        self.max_retries = search_config["max_retries"]
+        self.backoff_factor = search_config["backoff_factor"]
+        self.timeout = (
+            search_config["connect_timeout"],
+            search_config["read_timeout"],
+        )
+
+        # the requests are retried by the client, within the rate limits
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_maxsize=search_config["pool_maxsize"]),
+        )
+        self.async_clients = LoopLocal(self.build_async_client)
+        self.search_cache = build_response_cache(search_config["cache"])
+        self.rate_limiter = rate_limiter
+
+    def build_async_client(self) -> httpx.AsyncClient:
+        """
+        Build the asynchronous HTTP client of the running event loop.
+
+        Returns
+        -------
+        httpx.AsyncClient
+            The HTTP client, with its connection pool.
+        """
+        search_config = self.config["web_search"]
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                search_config["read_timeout"],
+                connect=search_config["connect_timeout"],
+            ),
+            limits=httpx.Limits(
+                max_connections=search_config["pool_maxsize"]
+            ),
+        )
+
+    async def aclose(self) -> None:
+        """
+        Close the asynchronous HTTP client of the running event loop. A new
+        one is built if the client is used again.
+        """
+        async_client = self.async_clients.pop()
+        if async_client is not None:
+            await async_client.aclose()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """
+        Normalize a query into its cache key, so that trivially different
+        queries share their cached results. The query sent to the API is
+        left as is.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+
+        Returns
+        -------
+        str
+            The lowercased query with collapsed whitespace.
+        """
+        return " ".join(query.lower().split())
+
+    def get_params(self, query: str) -> Dict[str, str]:
+        """
+        Build the query parameters of a search request.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+
+        Returns
+        -------
+        Dict[str, str]
+            The query parameters, URL-encoded by the HTTP client.
+        """
+        return {"q": query, "hl": "en", "api_key": self.api_key}
+
+    def get_cached_results(self, query: str) -> Optional[Dict]:
+        """
+        Get the cached results of a query.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+
+        Returns
+        -------
+        Optional[Dict]
+            The cached results, or None if the query is not cached.
+        """
+        if self.search_cache is None:
+            return None
+
+        cached_results = self.search_cache.get(
+            make_cache_key({"q": self.normalize_query(query), "hl": "en"})
+        )
+        return json.loads(cached_results) if cached_results else None
+
+    def cache_results(self, query: str, results: Dict) -> None:
+        """
+        Cache the results of a query, unless the API reported an error.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+        results : Dict
+            The response from the API.
+        """
+        if self.search_cache is None or "error" in results:
+            return
+
+        self.search_cache.set(
+            make_cache_key({"q": self.normalize_query(query), "hl": "en"}),
+            json.dumps(results),
+        )
+
+    def get_retry_wait(
+        self,
+        attempt: int,
+        response: Optional[Union[requests.Response, httpx.Response]],
+    ) -> Optional[float]:
+        """
+        Get how long to wait before retrying a request, with exponential
+        backoff, or at least as long as the API asks for.
+
+        Parameters
+        ----------
+        attempt : int
+            The number of the attempt that was just made, from 0.
+        response : Optional[Union[requests.Response, httpx.Response]]
+            The response to the attempt, or None if it failed to connect or
+            timed out.
+
+        Returns
+        -------
+        Optional[float]
+            The number of seconds to wait, or None if the request must not
+            be retried.
+        """
+        if attempt == self.max_retries:
+            return None
+        if response is not None:
+            if response.status_code not in RETRY_STATUS_CODES:
+                return None
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return max(self.backoff_factor * 2**attempt, int(retry_after))
+        return self.backoff_factor * 2**attempt
+
     def search_tool(self, query: str) -> Dict:
         """
         Perform a Google search using the SerpAPI and the provided query.
@@ -33,10 +222,99 @@ class SerpAPIClient:
         Dict
             The response from the API containing search results.
         """
-        # general google search
-        url = f"https://serpapi.com/search.json?q={query}&hl=en&api_key={self.api_key}"  # noqa: E501
+        results = self.get_cached_results(query)
+        if results is not None:
+            return results
+
+        try:
+            attempt = 0
+            while True:
+                rate_limiter = select_rate_limiter(
+                    "serpapi", self.rate_limiter
+                )
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+
+                timeout = tuple(cap_timeout(t) for t in self.timeout)
+                try:
+                    response = self.session.get(
+                        SERPAPI_URL,
+                        params=self.get_params(query),
+                        timeout=timeout,
+                    )
+                except (requests.ConnectionError, requests.Timeout):
+                    if self.get_retry_wait(attempt, None) is None:
+                        raise
+                    response = None
+
+                wait = self.get_retry_wait(attempt, response)
+                if wait is None:
+                    break
+                time.sleep(check_wait(wait))
+                attempt += 1
+
+            response.raise_for_status()
+            results = response.json()
+        except requests.RequestException as e:
+            # including requests.JSONDecodeError
+            raise RuntimeError(f"Failed to search the web: {e}")
+
+        self.cache_results(query, results)
+        return results
+
+    async def asearch_tool(self, query: str) -> Dict:
+        """
+        Asynchronously perform a Google search using the SerpAPI and the
+        provided query.
+
+        Parameters
+        ----------
+        query : str
+            The search query to be sent to the API.
+
+        Returns
+        -------
+        Dict
+            The response from the API containing search results.
+        """
+        results = self.get_cached_results(query)
+        if results is not None:
+            return results
+
+        try:
+            attempt = 0
+            while True:
+                rate_limiter = select_rate_limiter(
+                    "serpapi", self.rate_limiter
+                )
+                if rate_limiter is not None:
+                    await rate_limiter.aacquire()
+
+                connect_timeout, read_timeout = self.timeout
+                try:
+                    response = await self.async_clients.get().get(
+                        SERPAPI_URL,
+                        params=self.get_params(query),
+                        timeout=httpx.Timeout(
+                            cap_timeout(read_timeout),
+                            connect=cap_timeout(connect_timeout),
+                        ),
+                    )
+                except httpx.TransportError:
+                    if self.get_retry_wait(attempt, None) is None:
+                        raise
+                    response = None
+
+                wait = self.get_retry_wait(attempt, response)
+                if wait is None:
+                    break
+                await asyncio.sleep(check_wait(wait))
+                attempt += 1
 
-        # get response
-        response = requests.get(url).json()
+            response.raise_for_status()
+            results = response.json()
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            raise RuntimeError(f"Failed to search the web: {e}")
 
-        return response
+        self.cache_results(query, results)
+        return results
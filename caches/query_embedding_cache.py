@@ -0,0 +1,88 @@
+import base64
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from caches.response_cache import ResponseCache, make_cache_key
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches the query embeddings, so that the same
+    question is only encoded once by the semantic cache, the retriever and
+    the regeneration loop. The documents embedded at ingestion are passed
+    through uncached, since each chunk is only embedded once.
+
+    Parameters
+    ----------
+    embeddings : Embeddings
+        The wrapped embedding model.
+    cache : ResponseCache
+        The cache of the query embeddings, in memory or on disk.
+    model_settings : Dict
+        The model name and the settings that change its embeddings, part of
+        the cache key so that entries of another model are never reused.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: ResponseCache,
+        model_settings: Dict,
+    ) -> None:
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_settings = model_settings
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """
+        Normalize a query, so that queries differing only in whitespace
+        share their cached embedding.
+
+        Parameters
+        ----------
+        text : str
+            The query.
+
+        Returns
+        -------
+        str
+            The query with collapsed whitespace.
+        """
+        return " ".join(text.split())
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        text = self.normalize_text(text)
+        key = make_cache_key({**self.model_settings, "text": text})
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return np.frombuffer(
+                base64.b64decode(cached), dtype=np.float32
+            ).tolist()
+
+        # the embedding is returned as stored, so that a hit and a miss
+        # give the same values
+        embedding = np.asarray(
+            self.embeddings.embed_query(text), dtype=np.float32
+        )
+        self.cache.set(
+            key, base64.b64encode(embedding.tobytes()).decode("ascii")
+        )
+        return embedding.tolist()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report the cache hits, misses and hit rate.
+
+        Returns
+        -------
+        Dict[str, float]
+            The number of hits and misses and the hit rate.
+        """
+        return self.cache.stats()
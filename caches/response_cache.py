@@ -0,0 +1,311 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# fraction of `max_size` saved between two evictions of the disk cache
+EVICTION_FRACTION = 10
+
+
+def make_cache_key(request: Dict[str, Any]) -> str:
+    """
+    Hash a request into a cache key.
+
+    Parameters
+    ----------
+    request : Dict[str, Any]
+        The full request, it must be JSON serializable.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest of the canonical JSON of the request.
+    """
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """
+    Base class for the response caches. It keeps track of the hits and
+    misses, while subclasses implement the storage backend.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        # the caches are shared by the threads answering concurrent requests
+        self.stats_lock = threading.Lock()
+
+    @abstractmethod
+    def load(self, key: str) -> Optional[str]:
+        """
+        Load the value stored under the given key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+
+        Returns
+        -------
+        Optional[str]
+            The stored value, or None if the key is not cached.
+        """
+        pass
+
+    @abstractmethod
+    def save(self, key: str, value: str) -> None:
+        """
+        Store a value under the given key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        value : str
+            The value to store.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Remove the value stored under the given key, if any.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        """
+        pass
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get the value stored under the given key, counting hits and misses.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+
+        Returns
+        -------
+        Optional[str]
+            The stored value, or None if the key is not cached.
+        """
+        value = self.load(key)
+        with self.stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a value under the given key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        value : str
+            The value to store.
+        """
+        self.save(key, value)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report the cache hits, misses and hit rate.
+
+        Returns
+        -------
+        Dict[str, float]
+            The number of hits and misses and the hit rate.
+        """
+        with self.stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+class LRUResponseCache(ResponseCache):
+    """
+    In-memory response cache that evicts the least recently used entries
+    once it holds more than `max_size` of them.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of entries kept in memory.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[str]:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def save(self, key: str, value: str) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    On-disk response cache backed by a SQLite database, so that the cached
+    responses survive restarts and are shared between processes. The
+    expired and the oldest entries beyond `max_size` are evicted once every
+    `max_size // EVICTION_FRACTION` saves rather than on every save, so
+    the cache may briefly hold that many more entries.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the SQLite database file.
+    max_size : int
+        Maximum number of entries kept on disk.
+    ttl_seconds : Optional[int], optional
+        Time to live of the entries, in seconds. If None, the entries never
+        expire, by default None.
+    """
+
+    def __init__(
+        self, path: Path, max_size: int, ttl_seconds: Optional[int] = None
+    ) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_created_at "
+            "ON responses (created_at)"
+        )
+        self.eviction_interval = max(1, max_size // EVICTION_FRACTION)
+        self.saves_since_eviction = 0
+        with self.lock:
+            self.evict()
+        self.connection.commit()
+
+    def evict(self) -> None:
+        """
+        Delete the expired entries and the oldest entries beyond
+        `max_size`. The lock must be held.
+        """
+        if self.ttl_seconds is not None:
+            self.connection.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+        (size,) = self.connection.execute(
+            "SELECT COUNT(*) FROM responses"
+        ).fetchone()
+        if size > self.max_size:
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY created_at LIMIT ?)",
+                (size - self.max_size,),
+            )
+        self.saves_since_eviction = 0
+
+    def load(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+        if row is None:
+            return None
+        value, created_at = row
+        if self.ttl_seconds is not None:
+            if time.time() - created_at > self.ttl_seconds:
+                self.delete(key)
+                return None
+        return value
+
+    def save(self, key: str, value: str) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self.saves_since_eviction += 1
+            if self.saves_since_eviction >= self.eviction_interval:
+                self.evict()
+            self.connection.commit()
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM responses WHERE key = ?", (key,)
+            )
+            self.connection.commit()
+
+
+def build_response_cache(cache_config: Dict) -> Optional[ResponseCache]:
+    """
+    Build the response cache described by a cache configuration section.
+
+    Parameters
+    ----------
+    cache_config : Dict
+        The cache configuration, with the keys "enabled", "backend"
+        ("memory" or "disk"), "max_size" and, for the disk backend, "path".
+
+    Returns
+    -------
+    Optional[ResponseCache]
+        The response cache, or None if it is disabled.
+    """
+    if not cache_config["enabled"]:
+        return None
+
+    if cache_config["backend"] == "memory":
+        return LRUResponseCache(max_size=cache_config["max_size"])
+
+    elif cache_config["backend"] == "disk":
+        return SQLiteResponseCache(
+            path=cache_config["path"],
+            max_size=cache_config["max_size"],
+            ttl_seconds=cache_config.get("ttl_seconds"),
+        )
+
+    raise ValueError(f"Unknown cache backend: {cache_config['backend']}")
@@ -0,0 +1,264 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# number of embeddings the in-memory matrix first holds, doubled when full
+INITIAL_CAPACITY = 256
+
+
+class SemanticCache:
+    """
+    SemanticCache stores the agent's answers keyed on the embedding of the
+    question, so that the same or a near-duplicate question can be answered
+    without running the agent graph again. The answers are persisted in a
+    SQLite database, so the cache survives restarts, and the embeddings of
+    the live entries are kept in memory for the similarity search, in a
+    matrix grown by doubling its capacity.
+
+    Parameters
+    ----------
+    embeddings : Embeddings
+        The embedding model used to encode the questions, usually the one
+        used by the retriever.
+    model_settings : Dict
+        The model name and the settings that change its embeddings, stored
+        with the entries so that those of another model are purged instead
+        of being compared with the new embeddings.
+    path : Path
+        Path to the SQLite database file.
+    similarity_threshold : float
+        Minimum cosine similarity between two questions for the cached answer
+        to be reused.
+    ttl_seconds : Dict[str, int]
+        Time to live of the cached answers, in seconds, for each answer
+        source ("vector_store" or "web_search").
+    index_version : Optional[str], optional
+        The hash of the manifest of the index the answers are grounded on,
+        stored with the entries so that those answered from another version
+        of the indexed documents are purged, by default None.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_settings: Dict,
+        path: Path,
+        similarity_threshold: float,
+        ttl_seconds: Dict[str, int],
+        index_version: Optional[str] = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model = json.dumps(model_settings, sort_keys=True)
+        self.index_version = index_version or ""
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        columns = [
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(answers)")
+        ]
+        if columns and not {"model", "index_version"} <= set(columns):
+            # the entries of older caches do not record their model and
+            # index version
+            self.connection.execute("DROP TABLE answers")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                model TEXT NOT NULL,
+                index_version TEXT NOT NULL,
+                dimension INTEGER NOT NULL,
+                answer TEXT NOT NULL,
+                source TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self.connection.execute(
+            "DELETE FROM answers "
+            "WHERE expires_at < ? OR model != ? OR index_version != ?",
+            (time.time(), self.model, self.index_version),
+        )
+        self.connection.commit()
+
+        self.load_entries()
+
+    def load_entries(self) -> None:
+        """
+        Load the ids, expiry times and embeddings of the stored entries.
+        """
+        rows = self.connection.execute(
+            "SELECT id, embedding, expires_at FROM answers"
+        ).fetchall()
+        self.ids = []
+        self.size = 0
+        self.matrix = None
+        self.expires_at = None
+        for entry_id, embedding, expires_at in rows:
+            embedding = np.frombuffer(embedding, dtype=np.float32)
+            self.append_entry(entry_id, embedding, expires_at)
+
+    def append_entry(
+        self, entry_id: int, embedding: np.ndarray, expires_at: float
+    ) -> None:
+        """
+        Append an entry to the in-memory matrix, doubling its capacity when
+        it is full. It must be called with the lock held, or while loading.
+
+        Parameters
+        ----------
+        entry_id : int
+            The id of the entry in the database.
+        embedding : np.ndarray
+            The normalized embedding of the question.
+        expires_at : float
+            The time at which the entry expires.
+        """
+        if self.matrix is None:
+            self.matrix = np.empty(
+                (INITIAL_CAPACITY, len(embedding)), dtype=np.float32
+            )
+            self.expires_at = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        elif self.size == len(self.matrix):
+            matrix = np.empty(
+                (2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32
+            )
+            matrix[: self.size] = self.matrix
+            self.matrix = matrix
+            self.expires_at = np.resize(self.expires_at, 2 * self.size)
+
+        self.matrix[self.size] = embedding
+        self.expires_at[self.size] = expires_at
+        self.ids.append(entry_id)
+        self.size += 1
+
+    def embed(self, question: str) -> np.ndarray:
+        """
+        Encode the question as a unit-norm vector.
+
+        Parameters
+        ----------
+        question : str
+            The question to encode.
+
+        Returns
+        -------
+        np.ndarray
+            The normalized question embedding.
+        """
+        embedding = np.asarray(
+            self.embeddings.embed_query(question), dtype=np.float32
+        )
+        return embedding / max(np.linalg.norm(embedding), 1e-12)
+
+    def check_dimension(self, embedding: np.ndarray) -> None:
+        """
+        Purge the entries whose embeddings have another dimension than the
+        question's, which the model settings do not always tell apart. It
+        must be called with the lock held.
+
+        Parameters
+        ----------
+        embedding : np.ndarray
+            The normalized embedding of the question.
+        """
+        if self.matrix is None or self.matrix.shape[1] == len(embedding):
+            return
+
+        logging.warning(
+            f"Purging the semantic cache entries of dimension "
+            f"{self.matrix.shape[1]} instead of {len(embedding)}"
+        )
+        self.connection.execute(
+            "DELETE FROM answers WHERE dimension != ?", (len(embedding),)
+        )
+        self.connection.commit()
+        self.load_entries()
+
+    def lookup(self, embedding: np.ndarray) -> Optional[str]:
+        """
+        Look up the answer to the most similar cached question.
+
+        Parameters
+        ----------
+        embedding : np.ndarray
+            The normalized embedding of the question.
+
+        Returns
+        -------
+        Optional[str]
+            The cached answer, or None if no live entry is similar enough.
+        """
+        with self.lock:
+            self.check_dimension(embedding)
+            if self.matrix is None:
+                return None
+
+            similarities = self.matrix[: self.size] @ embedding
+            similarities[self.expires_at[: self.size] < time.time()] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+
+            row = self.connection.execute(
+                "SELECT answer FROM answers WHERE id = ?", (self.ids[best],)
+            ).fetchone()
+
+        logging.info(
+            f"Semantic cache hit (similarity {similarities[best]:.3f})"
+        )
+        return row[0] if row else None
+
+    def store(
+        self, question: str, embedding: np.ndarray, answer: str, source: str
+    ) -> None:
+        """
+        Store an answer in the cache.
+
+        Parameters
+        ----------
+        question : str
+            The question that was answered.
+        embedding : np.ndarray
+            The normalized embedding of the question.
+        answer : str
+            The answer generated by the agent.
+        source : str
+            Where the answer came from, "vector_store" or "web_search". It
+            sets the time to live of the entry.
+        """
+        expires_at = time.time() + self.ttl_seconds[source]
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+        with self.lock:
+            self.check_dimension(embedding)
+            cursor = self.connection.execute(
+                "INSERT INTO answers (question, embedding, model, "
+                "index_version, dimension, answer, source, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    question,
+                    embedding.tobytes(),
+                    self.model,
+                    self.index_version,
+                    len(embedding),
+                    answer,
+                    source,
+                    expires_at,
+                ),
+            )
+            self.connection.commit()
+
+            self.append_entry(cursor.lastrowid, embedding, expires_at)
@@ -0,0 +1,36 @@
+from prompts.prompt import Prompt
+
+GENERATION_SYSTEM_PROMPT = Prompt(
+    role="system",
+    name="generation_system",
+    prompt_template=(
+        """
+        You are a grader assessing an answer to a question, given the set of
+        facts it should be based on. Assign two binary scores:
+            - "grounded": "yes" if the answer is entirely supported by the
+            facts, "no" if it contains inaccuracies, unsupported claims, or
+            missing justification.
+            - "addresses_question": "yes" if the answer effectively
+            addresses the question, "no" if it is unclear, incomplete, or
+            unhelpful.
+        Provide the scores as a JSON with the keys 'grounded' and
+        'addresses_question' and no additional explanation.
+        """
+    ),
+)
+
+GENERATION_USER_PROMPT = Prompt(
+    role="user",
+    name="generation_user",
+    prompt_template=(
+        """
+        Here are the facts:
+        {documents}
+
+        Here is the answer:
+        {generation}
+
+        Here is the question: {question}
+        """
+    ),
+)
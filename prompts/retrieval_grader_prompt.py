@@ -35,3 +35,41 @@ RETRIEVAL_USER_PROMPT = Prompt(
         """
     ),
 )
+
+RETRIEVAL_BATCH_SYSTEM_PROMPT = Prompt(
+    role="system",
+    name="retrieval_batch_system",
+    prompt_template=(
+        """
+        You are a grader assessing relevance of a numbered list of retrieved
+        documents to a user question.
+        If a document contains any information or keywords related to the
+        user question, grade it as relevant.
+        This is a very lenient test - a document does not need to fully
+        answer the question to be considered relevant.
+
+        Grade every document independently. For each one, give a binary score
+        'yes' or 'no' to indicate whether the document is relevant to the
+        question, and a brief explanation for your decision.
+
+        Return your response as a JSON with a single key 'scores': a list with
+        exactly one entry per document, in the same order as the documents.
+        Each entry is a JSON with two keys: 'score' (either 'yes' or 'no')
+        and 'explanation'.
+        """
+    ),
+)
+
+RETRIEVAL_BATCH_USER_PROMPT = Prompt(
+    role="user",
+    name="retrieval_batch_user",
+    prompt_template=(
+        """
+        Here are the {n_documents} retrieved documents:
+        {documents}
+
+        Here is the user question:
+        {question}
+        """
+    ),
+)
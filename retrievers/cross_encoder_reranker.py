@@ -0,0 +1,53 @@
+from typing import Dict, List
+
+from langchain.schema import Document
+from sentence_transformers import CrossEncoder
+
+
+class CrossEncoderReranker:
+    """
+    Reranker that scores the relevance of the retrieved documents to the
+    question with a local cross-encoder, in a single batched forward pass
+    on the CPU. The scores are deterministic, so that the documents it is
+    confident about can skip the LLM relevance grading.
+
+    Parameters
+    ----------
+    reranking_config : Dict
+        The "graph.reranking" configuration section, with the cross-encoder
+        model, the batch size and the maximum sequence length.
+    """
+
+    def __init__(self, reranking_config: Dict) -> None:
+        self.batch_size = reranking_config["batch_size"]
+        # single-label cross-encoders return sigmoid scores in [0, 1]
+        self.model = CrossEncoder(
+            reranking_config["model"],
+            max_length=reranking_config["max_length"],
+            device="cpu",
+        )
+
+    def score(self, question: str, documents: List[Document]) -> List[float]:
+        """
+        Score the relevance of each document to the question.
+
+        Parameters
+        ----------
+        question : str
+            The user's question.
+        documents : List[Document]
+            The documents to score.
+
+        Returns
+        -------
+        List[float]
+            The relevance scores, in the same order as the documents.
+        """
+        if not documents:
+            return []
+        scores = self.model.predict(
+            [(question, document.page_content) for document in documents],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+        return [float(score) for score in scores]
@@ -0,0 +1,136 @@
+from typing import Dict
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+# ONNX weights published with the sentence-transformers models, the int8
+# AVX2 build runs on any recent x86 CPU. Its weights are quantized to
+# unsigned int8 by optimum's avx2 preset, hence the "quint8" file name.
+DEFAULT_ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx_int8": "onnx/model_quint8_avx2.onnx",
+}
+
+
+def get_onnx_file(embeddings_config: Dict) -> str:
+    """
+    Get the ONNX weights file to load for an ONNX backend.
+
+    Parameters
+    ----------
+    embeddings_config : Dict
+        The "retriever.embeddings" configuration section.
+
+    Returns
+    -------
+    str
+        The path of the ONNX file in the model repository.
+    """
+    return (
+        embeddings_config["onnx_file"]
+        or DEFAULT_ONNX_FILES[embeddings_config["backend"]]
+    )
+
+
+def get_embedding_settings(embeddings_config: Dict) -> Dict:
+    """
+    Get the embedding settings that change the computed vectors, to be
+    recorded in the index manifest.
+
+    Parameters
+    ----------
+    embeddings_config : Dict
+        The "retriever.embeddings" configuration section.
+
+    Returns
+    -------
+    Dict
+        The backend, the ONNX file for ONNX backends, and whether the
+        embeddings are normalized.
+    """
+    settings = {
+        "backend": embeddings_config["backend"],
+        "normalize": embeddings_config["normalize_embeddings"],
+    }
+    if embeddings_config["backend"] != "torch":
+        settings["onnx_file"] = get_onnx_file(embeddings_config)
+    return settings
+
+
+def get_model_settings(retriever_config: Dict) -> Dict:
+    """
+    Get the embedding model name and the settings that change its vectors,
+    so that cached query embeddings and questions are never compared with
+    those of another model.
+
+    Parameters
+    ----------
+    retriever_config : Dict
+        The "retriever" configuration section.
+
+    Returns
+    -------
+    Dict
+        The model name and its embedding settings.
+    """
+    return {
+        "model": retriever_config["model"],
+        **get_embedding_settings(retriever_config["embeddings"]),
+    }
+
+
+def build_embeddings(
+    model_name: str, embeddings_config: Dict
+) -> HuggingFaceEmbeddings:
+    """
+    Build the sentence-transformers embeddings with the configured runtime:
+    PyTorch, ONNX Runtime, or ONNX Runtime with int8-quantized weights, the
+    encoding batch size, normalization and number of CPU threads.
+
+    Parameters
+    ----------
+    model_name : str
+        The name of the sentence-transformers model.
+    embeddings_config : Dict
+        The "retriever.embeddings" configuration section.
+
+    Returns
+    -------
+    HuggingFaceEmbeddings
+        The embeddings.
+    """
+    backend = embeddings_config["backend"]
+    num_threads = embeddings_config["num_threads"]
+    if backend not in ("torch", *DEFAULT_ONNX_FILES):
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    model_kwargs = {}
+    if backend == "torch":
+        if num_threads:
+            import torch
+
+            # process-wide, PyTorch has no per-model thread setting
+            torch.set_num_threads(num_threads)
+    else:
+        # ONNX Runtime and optimum are optional, only needed here
+        import onnxruntime
+
+        onnx_kwargs = {
+            "file_name": get_onnx_file(embeddings_config),
+            "provider": "CPUExecutionProvider",
+        }
+        if num_threads:
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = num_threads
+            onnx_kwargs["session_options"] = session_options
+        model_kwargs = {"backend": "onnx", "model_kwargs": onnx_kwargs}
+
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs=model_kwargs,
+        encode_kwargs={
+            "batch_size": embeddings_config["batch_size"],
+            "normalize_embeddings": embeddings_config[
+                "normalize_embeddings"
+            ],
+        },
+    )
@@ -0,0 +1,116 @@
+from typing import Any, Dict, List
+
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]], weights: List[float], rrf_k: int
+) -> List[Document]:
+    """
+    Fuse several rankings of documents with weighted reciprocal rank
+    fusion: each document scores the sum of `weight / (rrf_k + rank)` over
+    the rankings it appears in. Only the ranks matter, so that BM25 and
+    vector similarity scores never have to be made comparable.
+
+    Parameters
+    ----------
+    rankings : List[List[Document]]
+        The rankings to fuse, the best document first. The documents are
+        identified by their id.
+    weights : List[float]
+        The weight of each ranking.
+    rrf_k : int
+        The rank offset, larger values flatten the contribution of the top
+        ranks.
+
+    Returns
+    -------
+    List[Document]
+        The fused ranking, the best document first.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.id] = scores.get(document.id, 0.0) + weight / (
+                rrf_k + rank
+            )
+            documents.setdefault(document.id, document)
+
+    return [
+        documents[doc_id]
+        for doc_id in sorted(scores, key=scores.get, reverse=True)
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that combines the dense FAISS search with a BM25 keyword
+    search over the full-text index of the SQLite docstore, so that exact
+    names and keywords are found even when their embeddings are not close
+    to the question's. The two rankings are fused with reciprocal rank
+    fusion.
+
+    Parameters
+    ----------
+    vectorstore : FAISS
+        The vector store, whose docstore keeps the full-text index.
+    search_type : str
+        The type of the dense search, "similarity", "mmr" or
+        "similarity_score_threshold".
+    search_kwargs : Dict[str, Any]
+        The arguments of the dense search, as for `VectorStoreRetriever`.
+        Its "k" is the number of documents returned after fusion, and its
+        "filter" also applies to the keyword search.
+    candidates : int
+        The number of documents retrieved by each search before fusion.
+    rrf_k : int
+        The rank offset of the reciprocal rank fusion.
+    dense_weight : float
+        The weight of the dense ranking in the fusion.
+    sparse_weight : float
+        The weight of the BM25 ranking in the fusion.
+    """
+
+    vectorstore: FAISS
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = {}
+    candidates: int = 20
+    rrf_k: int = 60
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = self.search_kwargs.get("k", 4)
+        dense_documents = self.vectorstore.search(
+            query,
+            self.search_type,
+            **{
+                **self.search_kwargs,
+                "k": self.candidates,
+                "fetch_k": max(
+                    self.search_kwargs.get("fetch_k", 20), self.candidates
+                ),
+            },
+        )
+
+        metadata_filter = self.search_kwargs.get("filter")
+        sparse_documents = [
+            document
+            for document, _ in self.vectorstore.docstore.keyword_search(
+                query, self.candidates
+            )
+            if metadata_filter is None or metadata_filter(document.metadata)
+        ]
+
+        fused_documents = reciprocal_rank_fusion(
+            [dense_documents, sparse_documents],
+            [self.dense_weight, self.sparse_weight],
+            self.rrf_k,
+        )
+        return fused_documents[:k]
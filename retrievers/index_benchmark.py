@@ -0,0 +1,136 @@
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from retrievers.vector_retriever import build_faiss_index
+from utils.load_config import load_yaml_config
+
+
+def benchmark_index(
+    index: faiss.Index,
+    queries: np.ndarray,
+    ground_truth: np.ndarray,
+    k: int,
+) -> Dict[str, float]:
+    """
+    Measure the recall@k and the single-query search latency of an index.
+
+    Parameters
+    ----------
+    index : faiss.Index
+        The index to benchmark, holding the same vectors as the exact index.
+    queries : np.ndarray
+        The query vectors, of shape (n_queries, dimension).
+    ground_truth : np.ndarray
+        The ids of the exact k nearest neighbors of each query.
+    k : int
+        The number of neighbors retrieved per query.
+
+    Returns
+    -------
+    Dict[str, float]
+        The recall@k, the mean and 95th percentile latencies in milliseconds
+        and the serialized size of the index in megabytes.
+    """
+    latencies = []
+    hits = 0
+    for query, expected_ids in zip(queries, ground_truth):
+        start_time = time.perf_counter()
+        _, ids = index.search(query[np.newaxis], k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        hits += len(set(ids[0]) & set(expected_ids))
+
+    return {
+        f"recall@{k}": hits / (len(queries) * k),
+        "mean_latency_ms": float(np.mean(latencies)),
+        "p95_latency_ms": float(np.percentile(latencies, 95)),
+        "size_mb": faiss.serialize_index(index).nbytes / 2**20,
+    }
+
+
+def index_recall_report(
+    config_path: Path,
+    candidates: Optional[List[Dict]] = None,
+    k: int = 4,
+    n_queries: int = 200,
+    queries: Optional[np.ndarray] = None,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Compare approximate index settings against the exact flat index, to pick
+    the "retriever.index" settings with data. The vectors are read back from
+    the flat index at "retriever.index_path", so it must have been built with
+    the "flat" index type.
+
+    Parameters
+    ----------
+    config_path : Path
+        Path to the YAML configuration file containing retriever settings.
+    candidates : Optional[List[Dict]], optional
+        The index settings to compare, each one overriding the configured
+        "retriever.index" section. If None, every index type is compared with
+        the configured parameters, by default None.
+    k : int, optional
+        The number of neighbors retrieved per query, by default 4.
+    n_queries : int, optional
+        The number of indexed vectors sampled as queries, when no queries are
+        given, by default 200.
+    queries : Optional[np.ndarray], optional
+        Embedded questions to use as queries, by default None.
+    seed : int, optional
+        The seed used to sample the queries, by default 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per index settings, with the recall@k, latencies and size.
+    """
+    config = load_yaml_config(config_path)
+    index_config = config["retriever"]["index"]
+    index_path = Path(config["retriever"]["index_path"]) / "index.faiss"
+
+    flat_index = faiss.read_index(str(index_path))
+    if not isinstance(flat_index, faiss.IndexFlat):
+        raise ValueError(f"{index_path} is not an exact flat index.")
+
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(
+            len(vectors), size=min(n_queries, len(vectors)), replace=False
+        )
+        queries = vectors[sample]
+    queries = np.asarray(queries, dtype=np.float32)
+    _, ground_truth = flat_index.search(queries, k)
+
+    if candidates is None:
+        candidates = [
+            {"type": index_type}
+            for index_type in ("ivf_flat", "ivf_pq", "hnsw", "sq8")
+        ]
+
+    rows = [
+        {
+            "index": "flat",
+            **benchmark_index(flat_index, queries, ground_truth, k),
+        }
+    ]
+    for candidate in candidates:
+        candidate_config = {**index_config, **candidate}
+        train_vectors = vectors[: candidate_config["train_size"]]
+        index = build_faiss_index(train_vectors, candidate_config)
+        index.add(vectors)
+        rows.append(
+            {
+                "index": ", ".join(
+                    f"{key}={value}" for key, value in candidate.items()
+                ),
+                **benchmark_index(index, queries, ground_truth, k),
+            }
+        )
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,302 @@
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+MMAP_SIZE = 1 << 30
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore that keeps the chunk texts and metadata in a SQLite database
+    instead of a pickled in-memory dictionary. Chunks are only read when
+    they are searched, and several processes can read the same database
+    through the OS page cache.
+
+    Changes are made in a transaction, which is only committed by `commit`,
+    so that the docstore on disk stays consistent with the saved index.
+
+    With `full_text`, the chunk texts are also indexed in an FTS5 table for
+    BM25 keyword search. The full-text index reads the texts from the
+    documents table instead of copying them, and triggers keep it in sync
+    as documents are added and deleted, so it is built in the same pass as
+    the docstore.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the SQLite database file.
+    read_only : bool, optional
+        Whether to open the database in read-only mode, by default False.
+    full_text : bool, optional
+        Whether to keep the full-text index of the chunks, by default False.
+        It is created, and filled from the stored chunks, when missing, and
+        dropped when False. Ignored in read-only mode.
+    """
+
+    def __init__(
+        self, path: Path, read_only: bool = False, full_text: bool = False
+    ) -> None:
+        self.path = Path(path)
+        self.lock = threading.Lock()
+
+        if read_only:
+            self.connection = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+            # read the database through a memory map, shared between
+            # processes by the OS page cache
+            self.connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(
+                self.path, check_same_thread=False
+            )
+            # let readers in other processes keep reading while the index
+            # is updated
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    page_content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS index_mapping (
+                    position INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL
+                )
+                """
+            )
+            if full_text:
+                self.create_full_text_index()
+            else:
+                self.drop_full_text_index()
+            self.connection.commit()
+
+    def create_full_text_index(self) -> None:
+        """
+        Create the full-text index of the chunks and the triggers that keep
+        it in sync, filling it from the stored chunks if it is new.
+        """
+        exists = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'"
+        ).fetchone()
+        if exists:
+            return
+
+        # the documents table is never vacuumed, so that its implicit rowids
+        # stay stable for the external-content index
+        self.connection.executescript(
+            """
+            CREATE VIRTUAL TABLE documents_fts USING fts5(
+                page_content,
+                content = 'documents',
+                content_rowid = 'rowid',
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER documents_fts_insert AFTER INSERT ON documents
+            BEGIN
+                INSERT INTO documents_fts (rowid, page_content)
+                VALUES (new.rowid, new.page_content);
+            END;
+            CREATE TRIGGER documents_fts_delete AFTER DELETE ON documents
+            BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, page_content)
+                VALUES ('delete', old.rowid, old.page_content);
+            END;
+            INSERT INTO documents_fts (documents_fts) VALUES ('rebuild');
+            """
+        )
+
+    def drop_full_text_index(self) -> None:
+        """
+        Drop the full-text index of the chunks and its triggers.
+        """
+        self.connection.executescript(
+            """
+            DROP TRIGGER IF EXISTS documents_fts_insert;
+            DROP TRIGGER IF EXISTS documents_fts_delete;
+            DROP TABLE IF EXISTS documents_fts;
+            """
+        )
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """
+        Add documents to the docstore.
+
+        Parameters
+        ----------
+        texts : Dict[str, Document]
+            The documents to add, by id.
+        """
+        rows = [
+            (doc_id, document.page_content, json.dumps(document.metadata))
+            for doc_id, document in texts.items()
+        ]
+        with self.lock:
+            try:
+                self.connection.executemany(
+                    "INSERT INTO documents (id, page_content, metadata) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"Tried to add ids that already exist: {e}")
+
+    def delete(self, ids: List[str]) -> None:
+        """
+        Delete documents from the docstore.
+
+        Parameters
+        ----------
+        ids : List[str]
+            The ids of the documents to delete.
+        """
+        with self.lock:
+            self.connection.executemany(
+                "DELETE FROM documents WHERE id = ?",
+                [(doc_id,) for doc_id in ids],
+            )
+
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        Get a document by id.
+
+        Parameters
+        ----------
+        search : str
+            The id of the document.
+
+        Returns
+        -------
+        Union[str, Document]
+            The document, or a message if it is not found.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT page_content, metadata FROM documents WHERE id = ?",
+                (search,),
+            ).fetchone()
+
+        if row is None:
+            return f"ID {search} not found."
+        return Document(
+            id=search, page_content=row[0], metadata=json.loads(row[1])
+        )
+
+    def keyword_search(
+        self, query: str, k: int
+    ) -> List[Tuple[Document, float]]:
+        """
+        Search the chunks by keywords, ranked by BM25. Any of the words of
+        the query may match.
+
+        Parameters
+        ----------
+        query : str
+            The search query.
+        k : int
+            The maximum number of chunks to return.
+
+        Returns
+        -------
+        List[Tuple[Document, float]]
+            The matching chunks with their BM25 score, the best first.
+        """
+        # quote the words, so that the query is never parsed as FTS5 syntax
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " OR ".join(f'"{word}"' for word in words)
+
+        with self.lock:
+            rows = self.connection.execute(
+                """
+                SELECT documents.id, documents.page_content,
+                    documents.metadata, bm25(documents_fts) AS rank
+                FROM documents_fts
+                JOIN documents ON documents.rowid = documents_fts.rowid
+                WHERE documents_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, k),
+            ).fetchall()
+
+        # FTS5 ranks with negated BM25 scores, the best first
+        return [
+            (
+                Document(
+                    id=doc_id,
+                    page_content=page_content,
+                    metadata=json.loads(metadata),
+                ),
+                -rank,
+            )
+            for doc_id, page_content, metadata, rank in rows
+        ]
+
+    def clear(self) -> None:
+        """
+        Delete every document and the index mapping, to rebuild the index.
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM documents")
+            self.connection.execute("DELETE FROM index_mapping")
+
+    def load_index_mapping(self) -> Dict[int, str]:
+        """
+        Load the mapping from the FAISS index positions to document ids.
+
+        Returns
+        -------
+        Dict[int, str]
+            The document id of each index position.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT position, id FROM index_mapping"
+            ).fetchall()
+        return dict(rows)
+
+    def save_index_mapping(self, index_to_docstore_id: Dict[int, str]) -> None:
+        """
+        Save the mapping from the FAISS index positions to document ids.
+
+        Parameters
+        ----------
+        index_to_docstore_id : Dict[int, str]
+            The document id of each index position.
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM index_mapping")
+            self.connection.executemany(
+                "INSERT INTO index_mapping (position, id) VALUES (?, ?)",
+                index_to_docstore_id.items(),
+            )
+
+    def commit(self) -> None:
+        """
+        Commit the pending changes to disk.
+        """
+        with self.lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        """
+        Close the database, discarding the uncommitted changes.
+        """
+        with self.lock:
+            self.connection.close()
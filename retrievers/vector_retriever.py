@@ -1,13 +1,30 @@
+import hashlib
+import json
 import logging
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import faiss
+import numpy as np
+from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores import FAISS
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_core.vectorstores.base import VectorStoreRetriever
+from langchain_core.retrievers import BaseRetriever
 from tqdm import tqdm
 
+from caches.query_embedding_cache import CachedQueryEmbeddings
+from caches.response_cache import build_response_cache
+from retrievers.embeddings import (
+    build_embeddings,
+    get_embedding_settings,
+    get_model_settings,
+)
+from retrievers.hybrid_retriever import HybridRetriever
+from retrievers.sqlite_docstore import SQLiteDocstore
 from utils.load_config import load_yaml_config
 
 logging.basicConfig(
@@ -16,13 +33,392 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+PICKLE_DOCSTORE_FILE = "index.pkl"
+SQLITE_DOCSTORE_FILE = "docstore.sqlite"
+# index types that must be trained on a sample of vectors before use
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq", "sq8")
+# index types that compact the positions of the remaining vectors when
+# vectors are removed, as LangChain's FAISS.delete expects. IVF indexes keep
+# the ids of the remaining vectors and HNSW indexes cannot remove vectors,
+# so their stale chunks are removed by rebuilding the index.
+COMPACTING_INDEX_TYPES = ("flat", "sq8")
+# build parameters of each index type, changing them requires a rebuild
+INDEX_PARAMETERS = {
+    "flat": (),
+    "ivf_flat": ("nlist",),
+    "ivf_pq": ("nlist", "pq_m", "pq_nbits"),
+    "hnsw": ("hnsw_m",),
+    "sq8": (),
+}
+# seed of the sample of chunks a trained index is trained on, so that the
+# same corpus always gives the same index
+TRAINING_SEED = 0
+
+
+def file_sha256(path: Path) -> str:
+    """
+    Compute the SHA-256 hash of a file's content.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the file.
+
+    Returns
+    -------
+    str
+        The hex digest of the file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_and_split_pdf(
+    pdf_path: Path,
+    file_name: str,
+    file_hash: str,
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Tuple[int, List[Document], List[str]]:
+    """
+    Load and split a PDF into chunks, with ids derived from the PDF's
+    content hash and file name, so that copies of a PDF under other names
+    get their own ids. It runs in the ingestion worker processes.
+
+    Parameters
+    ----------
+    pdf_path : Path
+        Path to the PDF file.
+    file_name : str
+        The name of the PDF file, relative to the data directory.
+    file_hash : str
+        The content hash of the PDF file.
+    chunk_size : int
+        The maximum size of the chunks, in characters.
+    chunk_overlap : int
+        The overlap between consecutive chunks, in characters.
+
+    Returns
+    -------
+    Tuple[int, List[Document], List[str]]
+        The number of pages of the PDF, its chunks and their ids.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    pages = PyPDFLoader(pdf_path).load()
+    texts = text_splitter.split_documents(pages)
+    chunk_ids = [
+        f"{file_hash[:16]}-{file_name}-{i}" for i in range(len(texts))
+    ]
+    return len(pages), texts, chunk_ids
+
+
+def get_index_factory(index_config: Dict, n_train: int) -> str:
+    """
+    Get the FAISS index factory string of an index configuration.
+
+    Parameters
+    ----------
+    index_config : Dict
+        The "retriever.index" configuration section.
+    n_train : int
+        The number of vectors available to train the index. The number of
+        IVF lists is capped so that each list gets enough training vectors.
+
+    Returns
+    -------
+    str
+        The index factory string.
+    """
+    index_type = index_config["type"]
+    nlist = min(index_config["nlist"], max(1, n_train // 39))
+
+    if index_type == "flat":
+        return "Flat"
+    elif index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    elif index_type == "ivf_pq":
+        if n_train < 2 ** index_config["pq_nbits"]:
+            logging.warning(
+                "Not enough vectors to train a product quantizer, "
+                "using an IVF-Flat index instead."
+            )
+            return f"IVF{nlist},Flat"
+        return (
+            f"IVF{nlist},PQ{index_config['pq_m']}x{index_config['pq_nbits']}"
+        )
+    elif index_type == "hnsw":
+        return f"HNSW{index_config['hnsw_m']}"
+    elif index_type == "sq8":
+        return "SQ8"
+
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+class StagedChunks:
+    """
+    Embedded chunks waiting for a trained index to be created. As the chunks
+    arrive, they are written to the docstore, their vectors are spilled to a
+    temporary file, and a uniform reservoir sample of the vectors is kept to
+    train the index on. Memory stays bounded by the training sample however
+    many chunks are staged, and the sample does not favour the first PDFs.
+
+    Parameters
+    ----------
+    docstore : SQLiteDocstore
+        The empty docstore of the index to create.
+    directory : Path
+        The directory of the temporary vector file.
+    train_size : int
+        The maximum number of vectors to train the index on.
+    """
+
+    def __init__(
+        self, docstore: SQLiteDocstore, directory: Path, train_size: int
+    ) -> None:
+        self.docstore = docstore
+        self.vector_file = tempfile.TemporaryFile(dir=directory)
+        self.train_size = train_size
+        self.chunk_ids = []
+        self.sample = None
+        self.rng = np.random.default_rng(TRAINING_SEED)
+
+    def add(
+        self, texts: List[Document], chunk_ids: List[str], vectors: np.ndarray
+    ) -> None:
+        """
+        Stage a batch of embedded chunks.
+
+        Parameters
+        ----------
+        texts : List[Document]
+            The chunks to stage.
+        chunk_ids : List[str]
+            The ids of the chunks.
+        vectors : np.ndarray
+            The embeddings of the chunks.
+        """
+        self.docstore.add(
+            {
+                chunk_id: Document(
+                    id=chunk_id,
+                    page_content=text.page_content,
+                    metadata=text.metadata,
+                )
+                for chunk_id, text in zip(chunk_ids, texts)
+            }
+        )
+        vectors.tofile(self.vector_file)
+
+        if self.sample is None:
+            self.sample = np.empty(
+                (self.train_size, vectors.shape[1]), dtype=np.float32
+            )
+        # algorithm R: the i-th vector replaces a random slot of the full
+        # sample with probability train_size / (i + 1)
+        positions = np.arange(
+            len(self.chunk_ids), len(self.chunk_ids) + len(vectors)
+        )
+        slots = np.where(
+            positions < self.train_size,
+            positions,
+            self.rng.integers(0, positions + 1),
+        )
+        kept = slots < self.train_size
+        self.sample[slots[kept]] = vectors[kept]
+        self.chunk_ids.extend(chunk_ids)
+
+    def training_sample(self) -> np.ndarray:
+        """
+        Get the sample of the staged vectors to train the index on.
+
+        Returns
+        -------
+        np.ndarray
+            Up to `train_size` vectors sampled uniformly from the staged
+            vectors.
+        """
+        return self.sample[: min(len(self.chunk_ids), self.train_size)]
+
+    def iter_batches(
+        self, batch_size: int
+    ) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Read the staged vectors back in batches, in the order they were
+        staged.
+
+        Parameters
+        ----------
+        batch_size : int
+            The number of vectors per batch.
+
+        Yields
+        ------
+        Tuple[List[str], np.ndarray]
+            The ids and the embeddings of a batch of chunks.
+        """
+        dimension = self.sample.shape[1]
+        self.vector_file.seek(0)
+        for start in range(0, len(self.chunk_ids), batch_size):
+            chunk_ids = self.chunk_ids[start : start + batch_size]
+            vectors = np.fromfile(
+                self.vector_file,
+                dtype=np.float32,
+                count=len(chunk_ids) * dimension,
+            )
+            yield chunk_ids, vectors.reshape(len(chunk_ids), dimension)
+
+    def close(self) -> None:
+        """
+        Delete the temporary vector file.
+        """
+        self.vector_file.close()
+
+
+def set_search_parameters(index: faiss.Index, index_config: Dict) -> None:
+    """
+    Set the search-time parameters of an approximate index: the number of
+    IVF lists probed and the HNSW search depth. They are chosen by the type
+    of the index, which differs from the configured type when a saved index
+    is loaded before being rebuilt.
+
+    Parameters
+    ----------
+    index : faiss.Index
+        The index to tune.
+    index_config : Dict
+        The "retriever.index" configuration section.
+    """
+    parameter_space = faiss.ParameterSpace()
+    typed_index = faiss.downcast_index(index)
+    if isinstance(typed_index, faiss.IndexIVF):
+        parameter_space.set_index_parameter(
+            index, "nprobe", index_config["nprobe"]
+        )
+    elif isinstance(typed_index, faiss.IndexHNSW):
+        parameter_space.set_index_parameter(
+            index, "efSearch", index_config["ef_search"]
+        )
+
+
+def build_faiss_index(vectors: np.ndarray, index_config: Dict) -> faiss.Index:
+    """
+    Build an empty FAISS index of the configured type, trained on the given
+    vectors if the index type needs training.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        The training sample, of shape (n_vectors, dimension).
+    index_config : Dict
+        The "retriever.index" configuration section.
+
+    Returns
+    -------
+    faiss.Index
+        The trained, empty index.
+    """
+    index = faiss.index_factory(
+        vectors.shape[1], get_index_factory(index_config, len(vectors))
+    )
+    if not index.is_trained:
+        index.train(vectors)
+    set_search_parameters(index, index_config)
+    return index
+
+
+def build_metadata_filter(
+    filters_config: Dict,
+) -> Optional[Callable[[Dict], bool]]:
+    """
+    Build the metadata filter of the configured source PDFs and page range.
+
+    Parameters
+    ----------
+    filters_config : Dict
+        The "retriever.search.filters" configuration section, with the
+        names of the source PDFs to search, all of them if empty, and the
+        first and last pages to search, numbered from 1, or None.
+
+    Returns
+    -------
+    Optional[Callable[[Dict], bool]]
+        Whether a chunk, given its metadata, passes the filters, or None
+        if nothing is filtered.
+    """
+    sources = set(filters_config["sources"] or [])
+    pages = filters_config["pages"]
+    if not sources and not pages:
+        return None
+
+    def metadata_filter(metadata: Dict) -> bool:
+        if sources and Path(metadata.get("source", "")).name not in sources:
+            return False
+        if pages:
+            # PyPDFLoader numbers the pages from 0
+            page = metadata.get("page", -1) + 1
+            if not pages[0] <= page <= pages[1]:
+                return False
+        return True
+
+    return metadata_filter
+
+
+def get_search_kwargs(search_config: Dict) -> Dict[str, Any]:
+    """
+    Get the vector store search arguments of a search configuration.
+
+    Parameters
+    ----------
+    search_config : Dict
+        The "retriever.search" configuration section.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The number of chunks to return, the number of candidates fetched
+        before filtering or MMR, the MMR diversity or the relevance score
+        threshold, depending on the search type, and the metadata filter.
+    """
+    search_kwargs = {
+        "k": search_config["k"],
+        "fetch_k": search_config["fetch_k"],
+    }
+    if search_config["search_type"] == "mmr":
+        search_kwargs["lambda_mult"] = search_config["lambda_mult"]
+    elif search_config["search_type"] == "similarity_score_threshold":
+        search_kwargs["score_threshold"] = search_config["score_threshold"]
+
+    metadata_filter = build_metadata_filter(search_config["filters"])
+    if metadata_filter is not None:
+        search_kwargs["filter"] = metadata_filter
+    return search_kwargs
+
 
 class VectorRetriever:
     """
     The VectorRetriever class is responsible for loading and managing
     the vector store for document retrieval. It uses the FAISS library
     for efficient similarity search and the HuggingFace embeddings
-    for document representation.
+    for document representation. The FAISS index type (exact, IVF, HNSW or
+    quantized) is chosen in the configuration.
+
+    The vector store is updated incrementally: a manifest stored next to the
+    index records the content hash and chunk ids of every indexed PDF, so
+    that only new or changed PDFs are embedded and the chunks of removed
+    PDFs are deleted.
+
+    Only the vectors are kept in memory: the chunk texts and metadata are
+    stored in a SQLite docstore and read by id for the retrieved chunks
+    only, with no pickle involved. The index can also be memory-mapped
+    read-only, so that worker processes share its pages through the OS page
+    cache and start without reading it into memory.
 
     Parameters
     ----------
@@ -35,57 +431,747 @@ class VectorRetriever:
     def __init__(self, path_to_data: Path, config_path: Path) -> None:
         self.path_to_data = path_to_data
         self.config = load_yaml_config(config_path)
+        self.index_path = Path(self.config["retriever"]["index_path"])
+        self.storage_config = self.config["retriever"]["storage"]
+        self.hybrid_config = self.config["retriever"]["hybrid"]
+        self.embeddings = build_embeddings(
+            self.config["retriever"]["model"],
+            self.config["retriever"]["embeddings"],
+        )
+        query_cache = build_response_cache(
+            self.config["cache"]["query_embeddings"]
+        )
+        if query_cache is not None:
+            self.embeddings = CachedQueryEmbeddings(
+                self.embeddings,
+                query_cache,
+                get_model_settings(self.config["retriever"]),
+            )
 
-    def load_data(self) -> VectorStoreRetriever:
+    def get_index_settings(self) -> Dict:
         """
-        Load the data from the specified path and create a vector store
-        for document retrieval. If the vector store already exists,
-        it will be loaded from the local directory.
+        Get the settings that shape the indexed vectors. If any of them
+        changes, the whole index must be rebuilt.
 
         Returns
         -------
-        VectorStoreRetriever
-            The retriever object for querying the vector store.
+        Dict
+            The embedding model and runtime, chunking and index settings.
         """
-        data_path = Path(self.path_to_data)
-        entries = [p.name for p in data_path.iterdir()]
-        pdf_files = list(data_path.glob("*.pdf"))
+        index_config = self.config["retriever"]["index"]
+        index_type = index_config["type"]
+        return {
+            "model": self.config["retriever"]["model"],
+            "embeddings": get_embedding_settings(
+                self.config["retriever"]["embeddings"]
+            ),
+            "chunk_size": self.config["retriever"]["chunk_size"],
+            "chunk_overlap": self.config["retriever"]["chunk_overlap"],
+            "index": {
+                "type": index_type,
+                **{
+                    parameter: index_config[parameter]
+                    for parameter in INDEX_PARAMETERS[index_type]
+                },
+            },
+        }
 
-        if "faiss_index" not in entries:
-            progress_bar = tqdm(total=len(pdf_files), desc="Loading files...")
-            documents = []
+    def load_manifest(self) -> Optional[Dict]:
+        """
+        Load the manifest of the indexed PDFs.
 
-            for data_path in pdf_files:
-                loader = PyPDFLoader(data_path)
-                documents.extend(loader.load())
+        Returns
+        -------
+        Optional[Dict]
+            The manifest, or None if there is none.
+        """
+        manifest_path = self.index_path / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
 
-                progress_bar.update(1)
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+
+    def save_manifest(self, manifest: Dict) -> None:
+        """
+        Save the manifest of the indexed PDFs next to the index.
 
-            progress_bar.close()
+        Parameters
+        ----------
+        manifest : Dict
+            The manifest to save.
+        """
+        with open(self.index_path / MANIFEST_FILE, "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    def adopt_legacy_index(
+        self, vector_store: FAISS, pdf_hashes: Dict[str, str]
+    ) -> Dict:
+        """
+        Build the manifest of an index saved without one, attributing its
+        chunks to PDFs through their "source" metadata. The PDFs are assumed
+        to be unchanged since the index was built.
 
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=self.config["retriever"]["chunk_size"],
-                chunk_overlap=self.config["retriever"]["chunk_overlap"],
+        Parameters
+        ----------
+        vector_store : FAISS
+            The vector store loaded from the legacy index.
+        pdf_hashes : Dict[str, str]
+            The content hash of each PDF in the data directory.
+
+        Returns
+        -------
+        Dict
+            The manifest of the legacy index.
+        """
+        logging.info("Building the manifest of the local vector store...")
+        files = {}
+        for chunk_id in vector_store.index_to_docstore_id.values():
+            document = vector_store.docstore.search(chunk_id)
+            file_name = Path(document.metadata["source"]).name
+            entry = files.setdefault(
+                file_name,
+                {"sha256": pdf_hashes.get(file_name), "chunk_ids": []},
             )
-            texts = text_splitter.split_documents(documents)
+            entry["chunk_ids"].append(chunk_id)
+
+        # legacy indexes were always built as exact flat indexes, with the
+        # default PyTorch embeddings
+        settings = {
+            **self.get_index_settings(),
+            "embeddings": {"backend": "torch", "normalize": False},
+            "index": {"type": "flat"},
+        }
+        return {"settings": settings, "files": files}
+
+    def create_vector_store(
+        self,
+        training_vectors: np.ndarray,
+        docstore: Optional[SQLiteDocstore] = None,
+    ) -> FAISS:
+        """
+        Create an empty vector store with an index of the configured type,
+        trained on the given vectors if the index type needs training.
+
+        Parameters
+        ----------
+        training_vectors : np.ndarray
+            The vectors to train the index on.
+        docstore : Optional[SQLiteDocstore], optional
+            The docstore of the vector store. If None, a new empty docstore
+            is created, by default None.
+
+        Returns
+        -------
+        FAISS
+            The empty vector store.
+        """
+        index = build_faiss_index(
+            training_vectors, self.config["retriever"]["index"]
+        )
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore or self.new_docstore(),
+            index_to_docstore_id={},
+        )
+
+    def create_trained_vector_store(
+        self, staged: StagedChunks, manifest: Dict
+    ) -> FAISS:
+        """
+        Create the vector store with a trained index, trained on the sample
+        of the staged chunks, and add the staged chunks to it.
 
-            embeddings = HuggingFaceEmbeddings(
-                model_name=self.config["retriever"]["model"],
+        Parameters
+        ----------
+        staged : StagedChunks
+            The staged chunks, already in the docstore.
+        manifest : Dict
+            The manifest of the index, which records the size of the
+            training sample and the index it gave, updated in place.
+
+        Returns
+        -------
+        FAISS
+            The vector store with the staged chunks.
+        """
+        index_config = self.config["retriever"]["index"]
+        sample = staged.training_sample()
+        vector_store = self.create_vector_store(sample, staged.docstore)
+        manifest["training"] = {
+            "vectors": len(sample),
+            "index_factory": get_index_factory(index_config, len(sample)),
+        }
+
+        batch_size = self.config["retriever"]["ingestion"][
+            "embedding_batch_size"
+        ]
+        for chunk_ids, vectors in staged.iter_batches(batch_size):
+            start = vector_store.index.ntotal
+            vector_store.index.add(vectors)
+            vector_store.index_to_docstore_id.update(
+                {start + i: chunk_id for i, chunk_id in enumerate(chunk_ids)}
             )
+        return vector_store
+
+    def outgrows_index(self, manifest: Dict, n_vectors: int) -> bool:
+        """
+        Check whether a trained index should be rebuilt because the corpus
+        outgrew the sample it was trained on. The number of IVF lists is
+        capped by the size of the training sample, so an index first built
+        on a small corpus keeps few, overfull lists as the corpus grows.
+        The index is rebuilt once the training sample can at least double
+        and gives a different index, so that rebuilds stay rare.
+
+        Parameters
+        ----------
+        manifest : Dict
+            The manifest of the index.
+        n_vectors : int
+            The number of vectors in the index.
+
+        Returns
+        -------
+        bool
+            Whether the index should be rebuilt.
+        """
+        index_config = self.config["retriever"]["index"]
+        if index_config["type"] not in TRAINED_INDEX_TYPES:
+            return False
+
+        # indexes saved before the training sample was recorded are
+        # rebuilt on their next update
+        training = manifest.get(
+            "training", {"vectors": 0, "index_factory": None}
+        )
+        n_train = min(n_vectors, index_config["train_size"])
+        return (
+            n_train >= 2 * training["vectors"]
+            and get_index_factory(index_config, n_train)
+            != training["index_factory"]
+        )
+
+    @staticmethod
+    def add_embedded_chunks(
+        vector_store: FAISS,
+        texts: List[Document],
+        chunk_ids: List[str],
+        vectors: np.ndarray,
+    ) -> None:
+        """
+        Add embedded chunks to the vector store.
+
+        Parameters
+        ----------
+        vector_store : FAISS
+            The vector store.
+        texts : List[Document]
+            The chunks to add.
+        chunk_ids : List[str]
+            The ids of the chunks.
+        vectors : np.ndarray
+            The embeddings of the chunks.
+        """
+        vector_store.add_embeddings(
+            zip([text.page_content for text in texts], vectors),
+            metadatas=[text.metadata for text in texts],
+            ids=chunk_ids,
+        )
+
+    def add_chunks(
+        self,
+        vector_store: Optional[FAISS],
+        texts: List[Document],
+        chunk_ids: List[str],
+        staged: Optional[StagedChunks],
+    ) -> Optional[FAISS]:
+        """
+        Embed a batch of chunks and add them to the vector store, creating
+        it if needed. While a trained index waits for its training sample,
+        the embedded chunks are staged instead.
+
+        Parameters
+        ----------
+        vector_store : Optional[FAISS]
+            The vector store, or None if it does not exist yet.
+        texts : List[Document]
+            The chunks to add.
+        chunk_ids : List[str]
+            The ids of the chunks.
+        staged : Optional[StagedChunks]
+            The chunks staged for a trained index, or None if the chunks
+            are added to the vector store.
+
+        Returns
+        -------
+        Optional[FAISS]
+            The vector store with the added chunks, or None if the chunks
+            were staged.
+        """
+        vectors = np.asarray(
+            self.embeddings.embed_documents(
+                [text.page_content for text in texts]
+            ),
+            dtype=np.float32,
+        )
+
+        if staged is not None:
+            staged.add(texts, chunk_ids, vectors)
+            return vector_store
+
+        if vector_store is None:
+            vector_store = self.create_vector_store(vectors)
+        self.add_embedded_chunks(vector_store, texts, chunk_ids, vectors)
+        return vector_store
+
+    def ingest_pdfs(
+        self,
+        vector_store: Optional[FAISS],
+        pdf_paths: Dict[str, Path],
+        pdf_hashes: Dict[str, str],
+        manifest: Dict,
+    ) -> Optional[FAISS]:
+        """
+        Stream PDFs into the vector store. A process pool parses and splits
+        the PDFs in parallel, and their chunks are embedded and added to the
+        vector store in fixed-size batches as they arrive, so that memory
+        stays bounded regardless of the corpus size. A new trained index is
+        created once every chunk is staged, trained on a uniform sample of
+        them.
+
+        Parameters
+        ----------
+        vector_store : Optional[FAISS]
+            The vector store, or None if it does not exist yet.
+        pdf_paths : Dict[str, Path]
+            The paths of the PDFs to ingest, by file name.
+        pdf_hashes : Dict[str, str]
+            The content hash of each PDF, by file name.
+        manifest : Dict
+            The manifest of the index, updated in place.
+
+        Returns
+        -------
+        Optional[FAISS]
+            The vector store with the ingested chunks, or None if there was
+            nothing to index.
+        """
+        ingestion_config = self.config["retriever"]["ingestion"]
+        batch_size = ingestion_config["embedding_batch_size"]
+        max_in_flight = 2 * ingestion_config["workers"]
+
+        indexed_files = manifest["files"]
+        index_config = self.config["retriever"]["index"]
+        staged = None
+        trained = index_config["type"] in TRAINED_INDEX_TYPES
+        if vector_store is None and trained:
+            self.index_path.mkdir(parents=True, exist_ok=True)
+            staged = StagedChunks(
+                self.new_docstore(),
+                self.index_path,
+                index_config["train_size"],
+            )
+
+        batch_texts, batch_ids = [], []
+        n_pages, n_chunks = 0, 0
+        start_time = time.perf_counter()
+        progress_bar = tqdm(total=len(pdf_paths), desc="Loading files...")
+        pending_files = list(pdf_paths)
+        running = {}
+
+        with ProcessPoolExecutor(
+            max_workers=ingestion_config["workers"]
+        ) as executor:
+            while pending_files or running:
+                # keep a bounded number of parsed PDFs waiting in memory
+                while pending_files and len(running) < max_in_flight:
+                    name = pending_files.pop(0)
+                    future = executor.submit(
+                        load_and_split_pdf,
+                        pdf_paths[name],
+                        name,
+                        pdf_hashes[name],
+                        self.config["retriever"]["chunk_size"],
+                        self.config["retriever"]["chunk_overlap"],
+                    )
+                    running[future] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    file_pages, texts, chunk_ids = future.result()
+                    n_pages += file_pages
+                    n_chunks += len(texts)
+                    batch_texts.extend(texts)
+                    batch_ids.extend(chunk_ids)
+                    indexed_files[name] = {
+                        "sha256": pdf_hashes[name],
+                        "chunk_ids": chunk_ids,
+                    }
+
+                    while len(batch_texts) >= batch_size:
+                        vector_store = self.add_chunks(
+                            vector_store,
+                            batch_texts[:batch_size],
+                            batch_ids[:batch_size],
+                            staged,
+                        )
+                        batch_texts = batch_texts[batch_size:]
+                        batch_ids = batch_ids[batch_size:]
+
+                    elapsed = max(time.perf_counter() - start_time, 1e-9)
+                    progress_bar.set_postfix(
+                        pages_per_s=f"{n_pages / elapsed:.1f}",
+                        chunks_per_s=f"{n_chunks / elapsed:.1f}",
+                    )
+                    progress_bar.update(1)
+
+        if batch_texts:
+            vector_store = self.add_chunks(
+                vector_store, batch_texts, batch_ids, staged
+            )
+        if staged is not None:
+            if staged.chunk_ids:
+                vector_store = self.create_trained_vector_store(
+                    staged, manifest
+                )
+            staged.close()
+
+        progress_bar.close()
+        return vector_store
+
+    def get_saved_storage(self) -> Optional[str]:
+        """
+        Get the docstore format of the saved index.
+
+        Returns
+        -------
+        Optional[str]
+            "sqlite" or "pickle", or None if there is no saved index.
+        """
+        if not (self.index_path / INDEX_FILE).exists():
+            return None
+        if (self.index_path / SQLITE_DOCSTORE_FILE).exists():
+            return "sqlite"
+        if (self.index_path / PICKLE_DOCSTORE_FILE).exists():
+            return "pickle"
+        return None
+
+    def new_docstore(self) -> SQLiteDocstore:
+        """
+        Create an empty docstore next to the index. The chunks are written
+        to disk as they are added, instead of being held in memory.
+
+        Returns
+        -------
+        SQLiteDocstore
+            The empty docstore.
+        """
+        docstore = SQLiteDocstore(
+            self.index_path / SQLITE_DOCSTORE_FILE,
+            full_text=self.hybrid_config["enabled"],
+        )
+        docstore.clear()
+        return docstore
+
+    def convert_docstore(self, vector_store: FAISS) -> None:
+        """
+        Move the chunks of a vector store loaded from a legacy pickled index
+        to a SQLite docstore.
+
+        Parameters
+        ----------
+        vector_store : FAISS
+            The vector store, updated in place.
+        """
+        logging.info("Converting the docstore...")
+        documents = {
+            doc_id: vector_store.docstore.search(doc_id)
+            for doc_id in vector_store.index_to_docstore_id.values()
+        }
+        vector_store.docstore = self.new_docstore()
+        vector_store.docstore.add(documents)
 
-            vector_store = FAISS.from_documents(texts, embeddings)
-            vector_store.save_local("faiss_index")
+    def load_vector_store(self, storage: str, mmap: bool = False) -> FAISS:
+        """
+        Load the saved vector store.
+
+        Parameters
+        ----------
+        storage : str
+            The docstore format of the saved index, "sqlite" or "pickle".
+        mmap : bool, optional
+            Whether to memory-map the index read-only instead of reading it
+            into memory, by default False.
 
+        Returns
+        -------
+        FAISS
+            The loaded vector store.
+        """
+        if storage == "pickle":
+            if not self.storage_config["allow_pickle_migration"]:
+                raise ValueError(
+                    f"{self.index_path} holds a legacy pickled docstore. "
+                    "Set retriever.storage.allow_pickle_migration to convert "
+                    "it once, if you trust its origin, or delete the index "
+                    "to rebuild it."
+                )
+            logging.info("Migrating the legacy pickled docstore...")
+            vector_store = FAISS.load_local(
+                self.index_path,
+                self.embeddings,
+                allow_dangerous_deserialization=True,
+            )
         else:
+            # IO_FLAG_MMAP_IFC maps the index file read-only, with the
+            # vectors of every index type, whereas older faiss versions
+            # read flat and quantized vectors into memory anyway
+            if mmap and not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+                raise ValueError(
+                    f"faiss {faiss.__version__} cannot memory-map the index "
+                    "vectors, install the faiss-cpu version pinned in "
+                    "requirements.txt or unset retriever.storage.mmap."
+                )
+            index = faiss.read_index(
+                str(self.index_path / INDEX_FILE),
+                (
+                    faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+                    if mmap
+                    else 0
+                ),
+            )
+            docstore_path = self.index_path / SQLITE_DOCSTORE_FILE
+            if mmap and self.hybrid_config["enabled"]:
+                # build the missing full-text index before opening the
+                # docstore read-only
+                SQLiteDocstore(docstore_path, full_text=True).close()
+            docstore = SQLiteDocstore(
+                docstore_path,
+                read_only=mmap,
+                full_text=self.hybrid_config["enabled"],
+            )
+            vector_store = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=docstore.load_index_mapping(),
+            )
+
+        set_search_parameters(
+            vector_store.index, self.config["retriever"]["index"]
+        )
+        return vector_store
+
+    def save_vector_store(self, vector_store: FAISS) -> None:
+        """
+        Save the vector store: the FAISS index, and the index mapping and
+        chunks of its SQLite docstore.
+
+        Parameters
+        ----------
+        vector_store : FAISS
+            The vector store to save.
+        """
+        self.index_path.mkdir(parents=True, exist_ok=True)
+
+        faiss.write_index(
+            vector_store.index, str(self.index_path / INDEX_FILE)
+        )
+        vector_store.docstore.save_index_mapping(
+            vector_store.index_to_docstore_id
+        )
+        vector_store.docstore.commit()
+        (self.index_path / PICKLE_DOCSTORE_FILE).unlink(missing_ok=True)
+
+    @staticmethod
+    def find_changes(
+        manifest: Dict, pdf_hashes: Dict[str, str]
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Compare the indexed PDFs with the PDFs in the data directory.
+
+        Parameters
+        ----------
+        manifest : Dict
+            The manifest of the indexed PDFs.
+        pdf_hashes : Dict[str, str]
+            The content hash of each PDF in the data directory.
+
+        Returns
+        -------
+        Tuple[List[str], List[str]]
+            The indexed PDFs that were removed or changed, and the PDFs that
+            must be indexed, new or changed.
+        """
+        indexed_files = manifest["files"]
+        stale_files = [
+            name
+            for name, entry in indexed_files.items()
+            if name not in pdf_hashes or pdf_hashes[name] != entry["sha256"]
+        ]
+        new_files = [
+            name
+            for name in pdf_hashes
+            if name in stale_files or name not in indexed_files
+        ]
+        return stale_files, new_files
+
+    def update_vector_store(
+        self,
+        saved_storage: Optional[str],
+        pdf_files: Dict[str, Path],
+        pdf_hashes: Dict[str, str],
+    ) -> FAISS:
+        """
+        Bring the saved vector store up to date with the PDFs in the data
+        directory, building it if needed, and save it.
+
+        Parameters
+        ----------
+        saved_storage : Optional[str]
+            The docstore format of the saved index, or None if there is no
+            saved index.
+        pdf_files : Dict[str, Path]
+            The path of each PDF in the data directory, by file name.
+        pdf_hashes : Dict[str, str]
+            The content hash of each PDF in the data directory.
+
+        Returns
+        -------
+        FAISS
+            The updated vector store.
+        """
+        vector_store = None
+        manifest = None
+        if saved_storage is not None:
             logging.info("Loading local vector store...")
-            embeddings = HuggingFaceEmbeddings(
-                model_name=self.config["retriever"]["model"],
+            vector_store = self.load_vector_store(saved_storage)
+            manifest = self.load_manifest() or self.adopt_legacy_index(
+                vector_store, pdf_hashes
             )
 
-            vector_store = FAISS.load_local(
-                "faiss_index", embeddings, allow_dangerous_deserialization=True
+            if manifest["settings"] != self.get_index_settings():
+                logging.info("Index settings changed, rebuilding index...")
+                vector_store = None
+                manifest = None
+            elif saved_storage == "pickle":
+                self.convert_docstore(vector_store)
+
+        if manifest is None:
+            manifest = {"settings": self.get_index_settings(), "files": {}}
+
+        indexed_files = manifest["files"]
+        stale_files, new_files = self.find_changes(manifest, pdf_hashes)
+
+        index_type = self.config["retriever"]["index"]["type"]
+        if stale_files and index_type not in COMPACTING_INDEX_TYPES:
+            logging.info(
+                f"Stale files in a {index_type} index, rebuilding index..."
             )
+            vector_store = None
+            indexed_files.clear()
+            manifest.pop("training", None)
+            new_files = list(pdf_hashes)
 
-        retriever = vector_store.as_retriever()
+        elif stale_files:
+            logging.info(f"Removing {len(stale_files)} stale files...")
+            stale_ids = [
+                chunk_id
+                for name in stale_files
+                for chunk_id in indexed_files.pop(name)["chunk_ids"]
+            ]
+            if stale_ids:
+                vector_store.delete(stale_ids)
+
+        if new_files:
+            vector_store = self.ingest_pdfs(
+                vector_store,
+                {name: pdf_files[name] for name in new_files},
+                pdf_hashes,
+                manifest,
+            )
+
+        if vector_store is not None and self.outgrows_index(
+            manifest, vector_store.index.ntotal
+        ):
+            logging.info("The corpus outgrew the index, rebuilding index...")
+            # discard the uncommitted changes before clearing the docstore
+            vector_store.docstore.close()
+            indexed_files.clear()
+            manifest.pop("training", None)
+            vector_store = self.ingest_pdfs(
+                None, pdf_files, pdf_hashes, manifest
+            )
+
+        if vector_store is None:
+            raise ValueError(
+                f"No PDF content to index in {self.path_to_data}."
+            )
+
+        self.save_vector_store(vector_store)
+        self.save_manifest(manifest)
+        return vector_store
+
+    def load_data(self) -> BaseRetriever:
+        """
+        Load the data from the specified path and create or update the
+        vector store for document retrieval. If the vector store already
+        exists, it will be loaded from the local directory, and only the
+        PDFs added, changed or removed since it was saved will be updated.
+
+        Returns
+        -------
+        BaseRetriever
+            The retriever object for querying the vector store, combined
+            with a BM25 keyword search in hybrid mode.
+        """
+        data_path = Path(self.path_to_data)
+        pdf_files = {p.name: p for p in sorted(data_path.glob("*.pdf"))}
+        pdf_hashes = {name: file_sha256(p) for name, p in pdf_files.items()}
+
+        saved_storage = self.get_saved_storage()
+        manifest = self.load_manifest() if saved_storage else None
+        up_to_date = (
+            manifest is not None
+            and saved_storage == "sqlite"
+            and manifest["settings"] == self.get_index_settings()
+            and self.find_changes(manifest, pdf_hashes) == ([], [])
+        )
+
+        if up_to_date:
+            logging.info("Loading local vector store...")
+            vector_store = self.load_vector_store(
+                saved_storage, mmap=self.storage_config["mmap"]
+            )
+        else:
+            vector_store = self.update_vector_store(
+                saved_storage, pdf_files, pdf_hashes
+            )
+            if self.storage_config["mmap"]:
+                vector_store = self.load_vector_store("sqlite", mmap=True)
+
+        search_config = self.config["retriever"]["search"]
+        search_kwargs = get_search_kwargs(search_config)
+        if self.config["graph"]["reranking"]["enabled"]:
+            # the cross-encoder keeps the best of the candidates
+            search_kwargs["k"] = search_config["fetch_k"]
+
+        if self.hybrid_config["enabled"]:
+            retriever = HybridRetriever(
+                vectorstore=vector_store,
+                search_type=search_config["search_type"],
+                search_kwargs=search_kwargs,
+                candidates=self.hybrid_config["candidates"],
+                rrf_k=self.hybrid_config["rrf_k"],
+                dense_weight=self.hybrid_config["dense_weight"],
+                sparse_weight=self.hybrid_config["sparse_weight"],
+            )
+        else:
+            retriever = vector_store.as_retriever(
+                search_type=search_config["search_type"],
+                search_kwargs=search_kwargs,
+            )
 
         return retriever
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+import yaml
+
+pytest.importorskip("langgraph")
+pytest.importorskip("groq")
+pytest.importorskip("instructor")
+pytest.importorskip("sentence_transformers")
+
+from agents.agent import RunAgent  # noqa: E402
+from api_clients.client_registry import get_rate_limiter  # noqa: E402
+from utils.load_config import load_yaml_config  # noqa: E402
+from utils.rate_limiter import select_rate_limiter  # noqa: E402
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("SERPAPI_KEY", "test")
+    # the caches are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+    config = load_yaml_config(CONFIG_PATH)
+    config["cache"]["semantic"]["enabled"] = False
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(yaml.safe_dump(config))
+    return config_path
+
+
+class RecordingCache:
+    """
+    Stand-in for SemanticCache, recording the threads it is used from.
+    """
+
+    def __init__(self, answer=None):
+        self.answer = answer
+        self.threads = []
+        self.stored = []
+
+    def embed(self, question):
+        self.threads.append(threading.current_thread())
+        return [1.0]
+
+    def lookup(self, embedding):
+        self.threads.append(threading.current_thread())
+        return self.answer
+
+    def store(self, question, embedding, answer, source):
+        self.threads.append(threading.current_thread())
+        self.stored.append((question, answer, source))
+
+
+class AnsweringGraph:
+    """
+    Stand-in for the compiled asynchronous graph, giving a useful answer.
+    """
+
+    async def astream(self, inputs):
+        yield {"retrieve": {"documents": []}}
+        yield {
+            "grade_generation": {
+                "generation": f"answer to {inputs['question']}",
+                "generation_grade": "useful",
+            }
+        }
+
+
+class StreamingGraph:
+    """
+    Stand-in for the compiled graph, streaming a rejected draft and then a
+    useful answer.
+    """
+
+    def stream(self, inputs, stream_mode):
+        assert inputs["stream"]
+        yield "custom", {"type": "token", "content": "draft"}
+        yield "custom", {"type": "retract", "reason": "not supported"}
+        yield "updates", {"grade_generation": None}
+        yield "custom", {"type": "token", "content": "answer"}
+        yield "updates", {
+            "grade_generation": {
+                "generation": "answer",
+                "generation_grade": "useful",
+            }
+        }
+
+
+def test_build_agent_graph_from_retriever_and_config(config_path):
+    graph = RunAgent.build_agent_graph(retriever=None, config_path=config_path)
+    async_graph = RunAgent.build_agent_graph(
+        None, config_path, asynchronous=True
+    )
+
+    assert "generate" in graph.get_graph().nodes
+    assert "generate" in async_graph.get_graph().nodes
+
+
+def test_arun_agent_uses_semantic_cache_off_the_loop(config_path):
+    agent = RunAgent(retriever=None, config_path=config_path)
+    agent.semantic_cache = RecordingCache()
+    agent.compiled_async_graph = AnsweringGraph()
+
+    answer = asyncio.run(agent.arun_agent("question"))
+
+    assert answer == "answer to question"
+    assert agent.semantic_cache.stored == [
+        ("question", "answer to question", "vector_store")
+    ]
+    assert len(agent.semantic_cache.threads) == 3
+    assert threading.main_thread() not in agent.semantic_cache.threads
+
+
+def test_arun_agent_returns_cached_answer(config_path):
+    agent = RunAgent(retriever=None, config_path=config_path)
+    agent.semantic_cache = RecordingCache(answer="cached answer")
+    agent.compiled_async_graph = None
+
+    assert asyncio.run(agent.arun_agent("question")) == "cached answer"
+
+
+def test_batches_get_their_own_rate_limiters(config_path):
+    agent = RunAgent(retriever=None, config_path=config_path)
+    shared_limiter = get_rate_limiter(config_path, "groq")
+
+    def run_agent(question):
+        rate_limiter = select_rate_limiter("groq", shared_limiter)
+        return str(rate_limiter.requests_per_minute)
+
+    async def arun_agent(question):
+        return run_agent(question)
+
+    agent.run_agent = run_agent
+    agent.arun_agent = arun_agent
+    rate_limit = {"groq": {"requests_per_minute": 30}}
+    questions = ["first", "second"]
+
+    results = agent.run_batch(questions, rate_limit=rate_limit)
+    assert [result.answer for result in results] == ["30", "30"]
+    results = asyncio.run(agent.arun_batch(questions, rate_limit=rate_limit))
+    assert [result.answer for result in results] == ["30", "30"]
+    # the process-wide limiter is left untouched
+    assert shared_limiter.requests_per_minute is None
+    assert run_agent("third") == "None"
+
+
+@pytest.mark.parametrize(
+    "rate_limit",
+    [
+        {"groq": {"requests_per_minute": 0}},
+        {"openai": {"requests_per_minute": 10}},
+    ],
+)
+def test_batch_rate_limits_are_validated(config_path, rate_limit):
+    agent = RunAgent(retriever=None, config_path=config_path)
+
+    with pytest.raises(ValueError):
+        agent.run_batch(["question"], rate_limit=rate_limit)
+
+
+def test_stream_answer_forwards_events_and_caches_answer(config_path):
+    agent = RunAgent(retriever=None, config_path=config_path)
+    agent.semantic_cache = RecordingCache()
+    agent.compiled_graph = StreamingGraph()
+
+    events = list(agent.stream_answer("question"))
+
+    assert events == [
+        {"type": "token", "content": "draft"},
+        {"type": "retract", "reason": "not supported"},
+        {"type": "node", "node": "grade_generation"},
+        {"type": "token", "content": "answer"},
+        {"type": "node", "node": "grade_generation"},
+        {"type": "final", "answer": "answer"},
+    ]
+    assert agent.semantic_cache.stored == [
+        ("question", "answer", "vector_store")
+    ]
+
+
+def test_stream_answer_returns_cached_answer(config_path):
+    agent = RunAgent(retriever=None, config_path=config_path)
+    agent.semantic_cache = RecordingCache(answer="cached answer")
+    agent.compiled_graph = None
+
+    assert list(agent.stream_answer("question")) == [
+        {"type": "token", "content": "cached answer"},
+        {"type": "final", "answer": "cached answer"},
+    ]
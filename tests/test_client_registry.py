@@ -0,0 +1,56 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import yaml
+
+pytest.importorskip("groq")
+
+from api_clients import client_registry  # noqa: E402
+from utils.load_config import load_yaml_config  # noqa: E402
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    # the caches are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    # the clients are registered by configuration path
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(yaml.safe_dump(load_yaml_config(CONFIG_PATH)))
+    return config_path
+
+
+def test_agents_share_one_chat_client(config_path):
+    chat_client = client_registry.get_chat_client(config_path)
+
+    assert client_registry.get_chat_client(config_path) is chat_client
+    assert client_registry.get_chat_client(
+        config_path.parent / "." / config_path.name
+    ) is chat_client
+
+
+def test_sync_and_async_clients_share_limits_and_cache(config_path):
+    chat_client = client_registry.get_chat_client(config_path)
+    async_chat_client = client_registry.get_async_chat_client(config_path)
+
+    assert async_chat_client.rate_limiter is chat_client.rate_limiter
+    assert async_chat_client.rate_limiter is (
+        client_registry.get_rate_limiter(config_path, "groq")
+    )
+    assert async_chat_client.response_cache is chat_client.response_cache
+
+
+def test_async_groq_client_is_built_per_event_loop(config_path):
+    async_chat_client = client_registry.get_async_chat_client(config_path)
+
+    async def get_groq_client():
+        groq_client, _ = async_chat_client.clients.get()
+        return groq_client
+
+    first = asyncio.run(get_groq_client())
+    second = asyncio.run(get_groq_client())
+
+    assert first is not second
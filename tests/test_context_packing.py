@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.schema import Document  # noqa: E402
+
+from utils.context_packing import pack_context, remove_overlaps  # noqa: E402
+
+
+def chunk(text, page=0):
+    return Document(
+        page_content=text, metadata={"source": "data/report.pdf", "page": page}
+    )
+
+
+def test_chunks_are_numbered_and_labelled():
+    context = pack_context(
+        [chunk("first\n  chunk"), chunk("second chunk", page=4)],
+        max_tokens=100,
+    )
+
+    assert context == (
+        "[1] (report.pdf p.1) first chunk\n\n[2] (report.pdf p.5) second chunk"
+    )
+
+
+def test_single_chunk_and_text_are_not_numbered():
+    assert pack_context(Document(page_content="only  chunk"), 100) == (
+        "only chunk"
+    )
+    assert pack_context("web results", 100) == "web results"
+
+
+def test_overlapping_chunks_are_trimmed():
+    overlap = "the overlap between consecutive chunks"
+    texts = [
+        f"start of the document, {overlap}",
+        f"{overlap} and the rest of it",
+        "start of the document",
+        "unrelated text",
+    ]
+
+    assert remove_overlaps(texts, min_overlap=20) == [
+        (0, texts[0]),
+        (1, "and the rest of it"),
+        (3, "unrelated text"),
+    ]
+
+
+def test_context_stays_within_token_budget():
+    documents = [chunk(f"chunk {i} " + "word " * 50, page=i) for i in range(5)]
+
+    context = pack_context(documents, max_tokens=100)
+
+    assert len(context) <= 4 * 100 + len("[1] \n\n") * 5
+    assert context.endswith(" ...")
+    assert "chunk 4" not in context
+
+
+def test_keep_all_splits_budget_between_documents():
+    documents = [chunk(f"chunk {i} " + "word " * 50, page=i) for i in range(5)]
+
+    context = pack_context(documents, max_tokens=100, keep_all=True)
+
+    entries = context.split("\n\n")
+    assert [entry.split()[0] for entry in entries] == [
+        f"[{i}]" for i in range(1, 6)
+    ]
+    assert all(entry.endswith(" ...") for entry in entries)
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.deadline import (
+    DeadlineExceeded,
+    bind_context,
+    cap_timeout,
+    check_wait,
+    deadline_scope,
+)
+from utils.rate_limiter import RateLimiter
+
+
+def test_timeouts_are_kept_without_deadline():
+    assert cap_timeout(60) == 60
+    assert cap_timeout(None) is None
+    assert check_wait(3600) == 3600
+
+
+def test_timeouts_are_capped_at_time_left():
+    with deadline_scope(time.monotonic() + 5):
+        assert 4 < cap_timeout(60) <= 5
+        assert 4 < cap_timeout(None) <= 5
+        assert cap_timeout(1) == 1
+    assert cap_timeout(60) == 60
+
+
+def test_passed_deadline_refuses_requests_and_waits():
+    with deadline_scope(time.monotonic() - 1):
+        with pytest.raises(DeadlineExceeded):
+            cap_timeout(60)
+    with deadline_scope(time.monotonic() + 5):
+        assert check_wait(1) == 1
+        with pytest.raises(DeadlineExceeded):
+            check_wait(10)
+
+
+def test_worker_threads_keep_bound_deadline():
+    with deadline_scope(time.monotonic() + 5):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(cap_timeout, 60).result() == 60
+            bound = executor.submit(bind_context(cap_timeout), 60)
+            assert bound.result() <= 5
+
+
+def test_rate_limit_wait_past_deadline_fails_at_once():
+    rate_limiter = RateLimiter(requests_per_minute=1)
+    rate_limiter.acquire()
+
+    start = time.monotonic()
+    with deadline_scope(start + 5):
+        with pytest.raises(DeadlineExceeded):
+            rate_limiter.acquire()
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(rate_limiter.aacquire())
+    assert time.monotonic() - start < 1
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("langchain_huggingface")
+
+from retrievers.embeddings import (  # noqa: E402
+    build_embeddings,
+    get_embedding_settings,
+    get_model_settings,
+)
+
+
+def embeddings_config(**overrides):
+    return {
+        "backend": "torch",
+        "onnx_file": None,
+        "batch_size": 32,
+        "normalize_embeddings": False,
+        "num_threads": None,
+        **overrides,
+    }
+
+
+def test_torch_settings_have_no_onnx_file():
+    assert get_embedding_settings(embeddings_config()) == {
+        "backend": "torch",
+        "normalize": False,
+    }
+
+
+@pytest.mark.parametrize(
+    "onnx_file, expected",
+    [
+        (None, "onnx/model_quint8_avx2.onnx"),
+        ("onnx/model_qint8_arm64.onnx", "onnx/model_qint8_arm64.onnx"),
+    ],
+)
+def test_onnx_settings_record_the_weights_file(onnx_file, expected):
+    settings = get_embedding_settings(
+        embeddings_config(backend="onnx_int8", onnx_file=onnx_file)
+    )
+
+    assert settings["onnx_file"] == expected
+
+
+def test_model_settings_tell_models_and_backends_apart():
+    retriever_config = {"model": "model", "embeddings": embeddings_config()}
+    normalized_config = {
+        "model": "model",
+        "embeddings": embeddings_config(normalize_embeddings=True),
+    }
+    other_model_config = {**retriever_config, "model": "other model"}
+
+    settings = get_model_settings(retriever_config)
+    assert settings["model"] == "model"
+    assert settings != get_model_settings(normalized_config)
+    assert settings != get_model_settings(other_model_config)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        build_embeddings("model", embeddings_config(backend="tensorrt"))
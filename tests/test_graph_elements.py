@@ -0,0 +1,611 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import yaml
+
+pytest.importorskip("langgraph")
+pytest.importorskip("groq")
+pytest.importorskip("instructor")
+pytest.importorskip("sentence_transformers")
+
+from langchain.schema import Document  # noqa: E402
+from langgraph.graph import END, START, StateGraph  # noqa: E402
+
+from agents.graph_elements import GraphElements, GraphState  # noqa: E402
+from agents.retrieval_grader import GraderResponse  # noqa: E402
+from agents.router import RouterResponse  # noqa: E402
+from utils.deadline import DeadlineExceeded, cap_timeout  # noqa: E402
+from utils.load_config import load_yaml_config  # noqa: E402
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+
+
+@pytest.fixture
+def make_graph_elements(tmp_path, monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    monkeypatch.setenv("SERPAPI_KEY", "test")
+    # the caches are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+    def make_graph_elements(update=None):
+        config = load_yaml_config(CONFIG_PATH)
+        if update is not None:
+            update(config)
+        config_path = tmp_path / "config.yml"
+        config_path.write_text(yaml.safe_dump(config))
+        return GraphElements(retriever=None, config_path=config_path)
+
+    return make_graph_elements
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_build_default_graph(make_graph_elements, asynchronous):
+    graph = make_graph_elements().build_graph(asynchronous=asynchronous)
+
+    nodes = set(graph.get_graph().nodes)
+    assert {"route_question", "retrieve", "judge_context"} <= nodes
+    assert {"search_in_web", "generate", "grade_generation"} <= nodes
+    assert "return_best_answer" in nodes
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_build_speculative_graph(make_graph_elements, asynchronous):
+    def enable_speculation(config):
+        config["graph"]["speculative"]["enabled"] = True
+
+    graph = make_graph_elements(enable_speculation).build_graph(
+        asynchronous=asynchronous
+    )
+
+    nodes = set(graph.get_graph().nodes)
+    assert "route_and_retrieve" in nodes
+    assert "route_question" not in nodes
+
+
+def deadline_state(seconds_left: float) -> dict:
+    return {
+        "question": "question",
+        "generation": "last answer",
+        "best_generation": "best answer",
+        "best_grade": "not useful",
+        "deadline": time.monotonic() + seconds_left,
+    }
+
+
+@pytest.mark.parametrize(
+    "error, seconds_left",
+    [(DeadlineExceeded("refused"), 60), (RuntimeError("timed out"), -1)],
+)
+def test_node_failing_on_deadline_returns_best_answer(
+    make_graph_elements, error, seconds_left
+):
+    graph_elements = make_graph_elements()
+
+    def node(state):
+        raise error
+
+    async def anode(state):
+        raise error
+
+    state = deadline_state(seconds_left)
+    for update in (
+        graph_elements.run_within_budgets(node)(state),
+        asyncio.run(
+            graph_elements.run_within_budgets(anode, asynchronous=True)(state)
+        ),
+    ):
+        assert update["generation"] == "best answer"
+        assert update["generation_grade"] == "exhausted"
+
+
+def test_node_failing_before_deadline_raises(make_graph_elements):
+    graph_elements = make_graph_elements()
+
+    def node(state):
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError, match="failed"):
+        graph_elements.run_within_budgets(node)(deadline_state(60))
+
+
+def test_node_requests_time_out_by_deadline(make_graph_elements):
+    graph_elements = make_graph_elements()
+
+    def node(state):
+        return {"generation": str(cap_timeout(3600))}
+
+    update = graph_elements.run_within_budgets(node)(deadline_state(10))
+    assert float(update["generation"]) <= 10
+
+
+def test_spent_deadline_routes_to_best_answer(make_graph_elements):
+    graph_elements = make_graph_elements()
+
+    assert graph_elements.check_budgets(deadline_state(60)) == "continue"
+    assert graph_elements.check_budgets(deadline_state(-1)) == "exhausted"
+    state = {**deadline_state(-1), "web_search": "Yes"}
+    assert graph_elements.decide_to_generate(state) == "exhausted"
+
+
+class RecordingRAG:
+    """
+    Stand-in for the RAG pipeline, recording the discarded answers.
+    """
+
+    def __init__(self):
+        self.discarded = []
+
+    def discard_response(self, cache_key):
+        self.discarded.append(cache_key)
+
+
+def test_generation_records_its_cache_key(make_graph_elements):
+    graph_elements = make_graph_elements()
+    documents = [Document(page_content="text")]
+    state = {"question": "question", "documents": documents}
+
+    update = graph_elements.build_generation_state(state, documents, "answer")
+
+    assert update["generation_key"] == (
+        graph_elements.rag_pipeline.get_cache_key("question", documents)
+    )
+    assert graph_elements.use_web_result(
+        {**state, **update, "web_result": "web answer"}
+    )["generation_key"] is None
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_unsupported_generation_is_discarded_by_key(
+    make_graph_elements, asynchronous
+):
+    graph_elements = make_graph_elements()
+    graph_elements.rag_pipeline = RecordingRAG()
+    grades = iter(["not supported", "useful"])
+
+    def judge_generation(state):
+        return next(grades), 1
+
+    async def ajudge_generation(state):
+        return next(grades), 1
+
+    graph_elements.judge_generation = judge_generation
+    graph_elements.ajudge_generation = ajudge_generation
+    state = {
+        "question": "question",
+        "documents": [],
+        "generation": "answer",
+        "generation_key": "key",
+        "deadline": time.monotonic() + 60,
+    }
+    for _ in range(2):
+        if asynchronous:
+            asyncio.run(graph_elements.agrade_generation(state))
+        else:
+            graph_elements.grade_generation(state)
+
+    assert graph_elements.rag_pipeline.discarded == ["key"]
+
+
+class FakeAgent:
+    """
+    Stand-in for an LLM agent, answering with the given function and
+    counting its requests.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = 0
+
+    def generate_response(self, **kwargs):
+        self.calls += 1
+        return self.respond(**kwargs)
+
+    async def agenerate_response(self, **kwargs):
+        return self.generate_response(**kwargs)
+
+
+def score(value):
+    return lambda **kwargs: GraderResponse(score=value, explanation="")
+
+
+def fail(**kwargs):
+    raise RuntimeError("invalid response")
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize(
+    "mode, grounded, expected",
+    [
+        ("sequential", "no", ("not supported", 1)),
+        ("sequential", "yes", ("useful", 2)),
+        ("concurrent", "no", ("not supported", 2)),
+        ("concurrent", "yes", ("useful", 2)),
+        ("combined", "no", ("not supported", 3)),
+        ("combined", "yes", ("useful", 3)),
+    ],
+)
+def test_generation_grading_counts_every_request(
+    make_graph_elements, asynchronous, mode, grounded, expected
+):
+    def set_mode(config):
+        config["graph"]["generation_grading"]["mode"] = mode
+
+    graph_elements = make_graph_elements(set_mode)
+    graph_elements.hallucination_grader = FakeAgent(score(grounded))
+    graph_elements.answer_grader = FakeAgent(score("yes"))
+    # the combined grading fails and falls back to concurrent grading
+    graph_elements.generation_grader = FakeAgent(fail)
+    state = {"question": "question", "documents": [], "generation": "answer"}
+
+    if asynchronous:
+        result = asyncio.run(graph_elements.ajudge_generation(state))
+    else:
+        result = graph_elements.judge_generation(state)
+
+    assert result == expected
+    requests = sum(
+        agent.calls
+        for agent in (
+            graph_elements.hallucination_grader,
+            graph_elements.answer_grader,
+            graph_elements.generation_grader,
+        )
+    )
+    # the dropped answer grade of the async graph may be cancelled before
+    # its request is sent
+    assert requests <= result[1]
+
+
+def test_generation_grading_is_sequential_by_default():
+    config = load_yaml_config(CONFIG_PATH)
+
+    assert config["graph"]["generation_grading"]["mode"] == "sequential"
+
+
+class SlowGrader:
+    """
+    Stand-in for the retrieval grader, answering later documents faster and
+    recording the peak number of requests in flight.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def start(self, document):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return 0.05 / (1 + int(document.page_content))
+
+    def finish(self, document):
+        with self.lock:
+            self.in_flight -= 1
+        return GraderResponse(score=document.page_content, explanation="")
+
+    def generate_response(self, question, document):
+        time.sleep(self.start(document))
+        return self.finish(document)
+
+    async def agenerate_response(self, question, document):
+        await asyncio.sleep(self.start(document))
+        return self.finish(document)
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize(
+    "mode, max_concurrency, expected_peak",
+    [("serial", 4, 1), ("concurrent", 2, 2), ("concurrent", 4, 4)],
+)
+def test_document_grading_keeps_order_within_concurrency(
+    make_graph_elements, asynchronous, mode, max_concurrency, expected_peak
+):
+    def set_mode(config):
+        config["graph"]["retrieval_grading"]["mode"] = mode
+        config["graph"]["retrieval_grading"][
+            "max_concurrency"
+        ] = max_concurrency
+
+    graph_elements = make_graph_elements(set_mode)
+    graph_elements.retrieval_grader = SlowGrader()
+    documents = [Document(page_content=str(i)) for i in range(6)]
+
+    if asynchronous:
+        responses, n_calls = asyncio.run(
+            graph_elements.agrade_retrieved_documents("question", documents)
+        )
+    else:
+        responses, n_calls = graph_elements.grade_retrieved_documents(
+            "question", documents
+        )
+
+    assert [response.score for response in responses] == [
+        document.page_content for document in documents
+    ]
+    assert n_calls == len(documents)
+    assert graph_elements.retrieval_grader.peak == expected_peak
+
+
+class FakeBatchGrader(FakeAgent):
+    """
+    Stand-in for the retrieval grader, answering batched requests with the
+    given function.
+    """
+
+    def __init__(self, respond, respond_batch):
+        super().__init__(respond)
+        self.respond_batch = respond_batch
+
+    def generate_batch_response(self, **kwargs):
+        self.calls += 1
+        return self.respond_batch(**kwargs)
+
+    async def agenerate_batch_response(self, **kwargs):
+        return self.generate_batch_response(**kwargs)
+
+
+def test_filter_documents_ignores_score_whitespace():
+    documents = [Document(page_content="a"), Document(page_content="b")]
+
+    state = GraphElements.filter_documents(
+        "question", documents, [score(" Yes\n")(), score("no ")()]
+    )
+
+    assert state["documents"] == [documents[0]]
+    assert state["web_search"] == "No"
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize(
+    "respond_batch, expected_calls",
+    [
+        (lambda documents, **kwargs: [score("yes")()] * len(documents), 1),
+        (fail, 4),
+    ],
+)
+def test_document_grading_counts_fallback_requests(
+    make_graph_elements, asynchronous, respond_batch, expected_calls
+):
+    def set_batch_mode(config):
+        config["graph"]["retrieval_grading"]["mode"] = "batch"
+
+    graph_elements = make_graph_elements(set_batch_mode)
+    graph_elements.retrieval_grader = FakeBatchGrader(
+        score("yes"), respond_batch
+    )
+    documents = [Document(page_content=str(i)) for i in range(3)]
+
+    if asynchronous:
+        responses, n_calls = asyncio.run(
+            graph_elements.agrade_retrieved_documents("question", documents)
+        )
+    else:
+        responses, n_calls = graph_elements.grade_retrieved_documents(
+            "question", documents
+        )
+
+    assert [response.score for response in responses] == ["yes"] * 3
+    assert n_calls == graph_elements.retrieval_grader.calls == expected_calls
+
+
+class StreamingRAG:
+    """
+    Stand-in for the RAG pipeline, streaming a fixed answer.
+    """
+
+    def stream_response(self, question, context, use_cache=True):
+        yield from ["an ", "answer"]
+
+    def get_cache_key(self, question, context):
+        return "key"
+
+
+def test_generation_streams_tokens_and_retractions(make_graph_elements):
+    graph_elements = make_graph_elements()
+    graph_elements.rag_pipeline = StreamingRAG()
+
+    def generate(state):
+        update = graph_elements.generate(state)
+        graph_elements.emit_generation_grade(state, "not supported")
+        return update
+
+    workflow = StateGraph(GraphState)
+    workflow.add_node("generate", generate)
+    workflow.add_edge(START, "generate")
+    workflow.add_edge("generate", END)
+    graph = workflow.compile()
+
+    chunks = list(
+        graph.stream(
+            {"question": "question", "documents": [], "stream": True},
+            stream_mode=["updates", "custom"],
+        )
+    )
+
+    assert [chunk for mode, chunk in chunks if mode == "custom"] == [
+        {"type": "token", "content": "an "},
+        {"type": "token", "content": "answer"},
+        {"type": "grade", "stage": "generation", "verdict": "not supported"},
+        {"type": "retract", "reason": "not supported"},
+    ]
+    mode, update = chunks[-1]
+    assert mode == "updates"
+    assert update["generate"]["generation"] == "an answer"
+
+
+class FakeReranker:
+    """
+    Stand-in for the cross-encoder, scoring each document by its text.
+    """
+
+    def score(self, question, documents):
+        return [float(document.page_content) for document in documents]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_reranker_accepts_confident_documents_without_llm(
+    make_graph_elements, asynchronous
+):
+    graph_elements = make_graph_elements()
+    graph_elements.reranker = FakeReranker()
+    graph_elements.retrieval_grader = FakeAgent(score("no"))
+    state = {
+        "question": "question",
+        "documents": [
+            Document(page_content=text)
+            for text in ("0.9", "0.01", "0.5", "0.95", "0.3")
+        ],
+    }
+
+    if asynchronous:
+        state.update(asyncio.run(graph_elements.arerank(state)))
+        state.update(asyncio.run(graph_elements.agrade_documents(state)))
+    else:
+        state.update(graph_elements.rerank(state))
+        state.update(graph_elements.grade_documents(state))
+
+    # the top 4 are kept, the two above the accept threshold skip the LLM
+    assert state["rerank_scores"] == [0.95, 0.9, 0.5, 0.3]
+    assert [document.page_content for document in state["documents"]] == [
+        "0.95",
+        "0.9",
+    ]
+    assert graph_elements.retrieval_grader.calls == 2
+    assert state["llm_calls"] == 2
+
+
+class FixedRouter:
+    """
+    Stand-in for the local router, giving the same answer to every
+    question.
+    """
+
+    def __init__(self, datasource):
+        self.datasource = datasource
+
+    def route(self, question):
+        if self.datasource is None:
+            return None
+        return RouterResponse(datasource=self.datasource)
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize(
+    "local_datasource, expected",
+    [
+        ("web_search", ("search_in_web", 0)),
+        ("vector_store", ("vector_store", 0)),
+        (None, ("vector_store", 1)),
+    ],
+)
+def test_local_routing_skips_llm_when_conclusive(
+    make_graph_elements, asynchronous, local_datasource, expected
+):
+    graph_elements = make_graph_elements()
+    graph_elements.local_router = FixedRouter(local_datasource)
+    graph_elements.router = FakeAgent(
+        lambda **kwargs: RouterResponse(datasource="vector_store")
+    )
+    state = {"question": "question"}
+
+    if asynchronous:
+        update = asyncio.run(graph_elements.aroute_question(state))
+    else:
+        update = graph_elements.route_question(state)
+
+    assert (update["route"], update["llm_calls"]) == expected
+    assert graph_elements.router.calls == expected[1]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize("route", ["vector_store", "search_in_web"])
+def test_speculative_retrieval_is_kept_for_vector_store_route(
+    make_graph_elements, asynchronous, route
+):
+    graph_elements = make_graph_elements()
+    documents = [Document(page_content="text")]
+
+    def route_question(state):
+        return {"route": route, "llm_calls": 1}
+
+    def retrieve(state):
+        return {"documents": documents, "question": state["question"]}
+
+    async def aroute_question(state):
+        return route_question(state)
+
+    async def aretrieve(state):
+        return retrieve(state)
+
+    graph_elements.route_question = route_question
+    graph_elements.aroute_question = aroute_question
+    graph_elements.retrieve = retrieve
+    graph_elements.aretrieve = aretrieve
+    state = {"question": "question"}
+
+    if asynchronous:
+        update = asyncio.run(graph_elements.aroute_and_retrieve(state))
+    else:
+        update = graph_elements.route_and_retrieve(state)
+
+    assert update["route"] == route
+    assert update["llm_calls"] == 1
+    if route == "vector_store":
+        assert update["documents"] == documents
+    else:
+        assert "documents" not in update
+
+
+class FakeSearch:
+    """
+    Stand-in for the SerpAPI client, counting the searches.
+    """
+
+    def __init__(self):
+        self.searches = 0
+
+    def search_tool(self, query):
+        self.searches += 1
+        return {"answer": query}
+
+    async def asearch_tool(self, query):
+        return self.search_tool(query)
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize("relevant", [False, True])
+def test_web_search_is_prefetched_while_grading(
+    make_graph_elements, asynchronous, relevant
+):
+    def enable_prefetch(config):
+        config["graph"]["speculative"]["prefetch_web_search"] = True
+
+    graph_elements = make_graph_elements(enable_prefetch)
+    graph_elements.serp_api_client = FakeSearch()
+    graph_elements.retrieval_grader = FakeAgent(
+        score("yes" if relevant else "no")
+    )
+    state = {"question": "question", "documents": [Document(page_content="")]}
+
+    async def agrade_and_search():
+        update = await graph_elements.agrade_documents(state)
+        prefetch = update["web_prefetch"]
+        return update, None if prefetch is None else await prefetch
+
+    if asynchronous:
+        update, results = asyncio.run(agrade_and_search())
+    else:
+        update = graph_elements.grade_documents(state)
+        prefetch = update["web_prefetch"]
+        results = None if prefetch is None else prefetch.result()
+
+    if relevant:
+        assert update["web_prefetch"] is None
+    else:
+        assert update["web_search"] == "Yes"
+        assert results == {"answer": "question"}
+        assert graph_elements.serp_api_client.searches == 1
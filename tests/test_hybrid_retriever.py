@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from langchain.schema import Document  # noqa: E402
+
+from retrievers.hybrid_retriever import reciprocal_rank_fusion  # noqa: E402
+
+
+def ranking(*doc_ids):
+    return [Document(id=doc_id, page_content=doc_id) for doc_id in doc_ids]
+
+
+def ids(documents):
+    return [document.id for document in documents]
+
+
+def test_documents_in_both_rankings_come_first():
+    fused = reciprocal_rank_fusion(
+        [ranking("a", "b", "c"), ranking("d", "c", "e")], [1.0, 1.0], 60
+    )
+
+    assert ids(fused)[0] == "c"
+    assert sorted(ids(fused)) == ["a", "b", "c", "d", "e"]
+
+
+def test_weights_favour_a_ranking():
+    rankings = [ranking("dense"), ranking("sparse")]
+
+    assert ids(reciprocal_rank_fusion(rankings, [2.0, 1.0], 60)) == [
+        "dense",
+        "sparse",
+    ]
+    assert ids(reciprocal_rank_fusion(rankings, [1.0, 2.0], 60)) == [
+        "sparse",
+        "dense",
+    ]
+
+
+def test_rank_offset_flattens_top_ranks():
+    # "a" tops one ranking, "b" is fourth in both
+    rankings = [ranking("a", "d", "e", "b"), ranking("c", "f", "g", "b")]
+
+    assert ids(reciprocal_rank_fusion(rankings, [1.0, 1.0], 1))[0] == "a"
+    assert ids(reciprocal_rank_fusion(rankings, [1.0, 1.0], 60))[0] == "b"
@@ -0,0 +1,45 @@
+import pytest
+
+pytest.importorskip("groq")
+pytest.importorskip("instructor")
+
+from agents.local_router import LocalRouter  # noqa: E402
+
+ROUTING_CONFIG = {"vector_store_threshold": 0.6, "web_search_threshold": 0.3}
+
+
+class ScoredVectorStore:
+    """
+    Stand-in for the FAISS vector store, whose most similar chunk has the
+    given relevance.
+    """
+
+    def __init__(self, relevance=None):
+        self.relevance = relevance
+
+    def similarity_search_with_relevance_scores(self, question, k):
+        if self.relevance is None:
+            return []
+        return [(None, self.relevance)][:k]
+
+
+@pytest.mark.parametrize(
+    "relevance, expected",
+    [
+        (0.9, "vector_store"),
+        (0.6, "vector_store"),
+        (0.1, "web_search"),
+        (None, "web_search"),
+    ],
+)
+def test_conclusive_relevance_routes_locally(relevance, expected):
+    router = LocalRouter(ScoredVectorStore(relevance), ROUTING_CONFIG)
+
+    assert router.route("question").datasource == expected
+
+
+@pytest.mark.parametrize("relevance", [0.3, 0.45])
+def test_borderline_relevance_is_left_to_llm(relevance):
+    router = LocalRouter(ScoredVectorStore(relevance), ROUTING_CONFIG)
+
+    assert router.route("question") is None
@@ -0,0 +1,44 @@
+import asyncio
+import gc
+
+from utils.loop_local import LoopLocal
+
+
+def test_one_object_per_event_loop():
+    loop_local = LoopLocal(object)
+
+    async def get_twice():
+        return loop_local.get(), loop_local.get()
+
+    first, same = asyncio.run(get_twice())
+    second, _ = asyncio.run(get_twice())
+
+    assert first is same
+    assert first is not second
+
+
+def test_objects_of_closed_loops_are_dropped():
+    loop_local = LoopLocal(object)
+
+    async def get():
+        return loop_local.get()
+
+    for _ in range(3):
+        asyncio.run(get())
+    gc.collect()
+
+    assert len(loop_local.objects) <= 1
+
+
+def test_pop_removes_the_object_of_the_running_loop():
+    loop_local = LoopLocal(object)
+
+    async def get_pop_get():
+        built = loop_local.get()
+        assert loop_local.pop() is built
+        assert loop_local.pop() is None
+        return built, loop_local.get()
+
+    built, rebuilt = asyncio.run(get_pop_get())
+
+    assert built is not rebuilt
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+from caches.query_embedding_cache import CachedQueryEmbeddings  # noqa: E402
+from caches.response_cache import LRUResponseCache  # noqa: E402
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Stand-in for an embedding model, counting the encoded queries.
+    """
+
+    def __init__(self):
+        self.queries = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        # not exactly representable in float32
+        return [0.1, 1 / 3, float(len(text))]
+
+
+def test_query_embedding_is_the_same_on_hit_and_miss():
+    embeddings = CountingEmbeddings()
+    cached = CachedQueryEmbeddings(
+        embeddings, LRUResponseCache(max_size=10), {"model": "test"}
+    )
+
+    miss = cached.embed_query("what  is RAG?")
+    hit = cached.embed_query("what is RAG?")
+
+    assert miss == hit
+    assert embeddings.queries == 1
+    assert cached.stats()["hits"] == 1
+
+
+def test_query_embedding_cache_is_keyed_by_model():
+    embeddings = CountingEmbeddings()
+    cache = LRUResponseCache(max_size=10)
+
+    CachedQueryEmbeddings(embeddings, cache, {"model": "a"}).embed_query("q")
+    CachedQueryEmbeddings(embeddings, cache, {"model": "b"}).embed_query("q")
+
+    assert embeddings.queries == 2
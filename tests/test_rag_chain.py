@@ -0,0 +1,98 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("groq")
+pytest.importorskip("instructor")
+
+from langchain.schema import Document  # noqa: E402
+
+from agents.rag_chain import (  # noqa: E402
+    NO_CONTEXT_MESSAGE,
+    RetrievalAugmentedGenerator,
+)
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+
+
+class CountingRetriever:
+    """
+    Stand-in for the retriever, counting the queries.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = 0
+
+    def invoke(self, question):
+        self.queries += 1
+        return self.documents
+
+    async def ainvoke(self, question):
+        return self.invoke(question)
+
+
+class RecordingChatClient:
+    """
+    Stand-in for the chat clients, recording the messages they are sent.
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def generate_response(self, system_message, user_message, use_cache):
+        self.requests.append((system_message, user_message))
+        return "answer"
+
+    def stream_response(self, system_message, user_message, use_cache):
+        self.requests.append((system_message, user_message))
+        yield "answer"
+
+
+class AsyncRecordingChatClient(RecordingChatClient):
+    async def generate_response(self, system_message, user_message, use_cache):
+        self.requests.append((system_message, user_message))
+        return "answer"
+
+
+@pytest.fixture
+def rag(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+    retriever = CountingRetriever([Document(page_content="retrieved text")])
+    rag = RetrievalAugmentedGenerator(retriever, CONFIG_PATH)
+    rag.chat_client = RecordingChatClient()
+    rag.async_chat_client = AsyncRecordingChatClient()
+    return rag
+
+
+def test_all_paths_send_the_same_messages(rag):
+    context = [Document(page_content="graded text")]
+
+    rag.generate_response("question", context)
+    list(rag.stream_response("question", context))
+    asyncio.run(rag.agenerate_response("question", context))
+
+    requests = rag.chat_client.requests + rag.async_chat_client.requests
+    assert len(requests) == 3
+    assert requests[0] == requests[1] == requests[2]
+    assert requests == [rag.build_messages("question", context)] * 3
+    assert "graded text" in requests[0][1]["content"]
+    assert rag.retriever.queries == 0
+
+
+def test_re_retrieve_queries_the_retriever_once(rag):
+    rag.generate_response("question", [], re_retrieve=True)
+    asyncio.run(rag.agenerate_response("question", [], re_retrieve=True))
+
+    assert rag.retriever.queries == 2
+    for _, user_message in (
+        rag.chat_client.requests + rag.async_chat_client.requests
+    ):
+        assert "retrieved text" in user_message["content"]
+
+
+def test_empty_context_uses_placeholder(rag):
+    _, user_message = rag.build_messages("question", [])
+
+    assert NO_CONTEXT_MESSAGE in user_message["content"]
@@ -0,0 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.deadline import bind_context
+from utils.rate_limiter import (
+    RateLimiter,
+    estimate_tokens,
+    rate_limit_scope,
+    select_rate_limiter,
+)
+
+
+@pytest.mark.parametrize(
+    "limits",
+    [
+        {"requests_per_minute": 0},
+        {"tokens_per_minute": -1},
+    ],
+)
+def test_limits_must_be_positive(limits):
+    with pytest.raises(ValueError, match="must be positive"):
+        RateLimiter(**limits)
+
+
+def test_requests_over_the_budget_wait():
+    rate_limiter = RateLimiter(requests_per_minute=2)
+
+    assert rate_limiter.reserve() == 0
+    assert rate_limiter.reserve() == 0
+    assert 59 < rate_limiter.reserve() <= 60
+
+
+def test_tokens_over_the_budget_wait():
+    rate_limiter = RateLimiter(tokens_per_minute=100)
+
+    # a request larger than the budget goes through on an empty window
+    assert rate_limiter.reserve(tokens=150) == 0
+    assert rate_limiter.reserve(tokens=1) > 0
+
+
+def test_token_estimate_counts_prompt_and_completion():
+    assert estimate_tokens("x" * 400, max_tokens=50) == 150
+
+
+def test_scope_overrides_client_limiter():
+    client_limiter = RateLimiter()
+    batch_limiter = RateLimiter(requests_per_minute=1)
+
+    assert select_rate_limiter("groq", client_limiter) is client_limiter
+    with rate_limit_scope({"groq": batch_limiter}):
+        assert select_rate_limiter("groq", client_limiter) is batch_limiter
+        assert select_rate_limiter("serpapi", client_limiter) is (
+            client_limiter
+        )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            unbound = executor.submit(select_rate_limiter, "groq", None)
+            bound = executor.submit(
+                bind_context(select_rate_limiter), "groq", None
+            )
+        assert unbound.result() is None
+        assert bound.result() is batch_limiter
+
+        async def select():
+            return select_rate_limiter("groq", None)
+
+        assert asyncio.run(select()) is batch_limiter
+    assert select_rate_limiter("groq", client_limiter) is client_limiter
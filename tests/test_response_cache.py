@@ -0,0 +1,76 @@
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from caches import response_cache
+from caches.response_cache import (
+    LRUResponseCache,
+    SQLiteResponseCache,
+    make_cache_key,
+)
+
+
+def test_cache_key_ignores_key_order():
+    assert make_cache_key({"a": 1, "b": 2}) == make_cache_key({"b": 2, "a": 1})
+    assert make_cache_key({"a": 1}) != make_cache_key({"a": 2})
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUResponseCache(max_size=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    cache.delete("a")
+    assert cache.get("a") is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+
+
+def test_concurrent_lookups_are_all_counted():
+    cache = LRUResponseCache(max_size=10)
+    cache.set("hit", "value")
+
+    def look_up(i):
+        cache.get("hit" if i % 2 else "miss")
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(look_up, range(4000)))
+
+    assert cache.stats()["hits"] == 2000
+    assert cache.stats()["misses"] == 2000
+
+
+def test_disk_cache_evicts_oldest_in_batches(tmp_path):
+    path = tmp_path / "responses.sqlite"
+    cache = SQLiteResponseCache(path, max_size=20)
+    for i in range(100):
+        cache.set(str(i), str(i))
+
+    connection = sqlite3.connect(path)
+    (size,) = connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+    assert 20 <= size < 20 + cache.eviction_interval
+    assert cache.get("99") == "99"
+    assert cache.get("0") is None
+    plan = connection.execute(
+        "EXPLAIN QUERY PLAN SELECT key FROM responses ORDER BY created_at"
+    ).fetchall()
+    assert "responses_created_at" in str(plan)
+
+
+def test_disk_cache_purges_expired_entries(tmp_path, monkeypatch):
+    path = tmp_path / "responses.sqlite"
+    cache = SQLiteResponseCache(path, max_size=100, ttl_seconds=60)
+    cache.set("old", "value")
+    cache.set("older", "value")
+
+    now = time.time()
+    monkeypatch.setattr(response_cache.time, "time", lambda: now + 120)
+    assert cache.get("old") is None
+    # reopening the cache purges the other expired entries
+    SQLiteResponseCache(path, max_size=100, ttl_seconds=60)
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("SELECT key FROM responses").fetchall() == []
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("groq")
+pytest.importorskip("instructor")
+
+from langchain_core.documents.base import Document  # noqa: E402
+
+from agents.retrieval_grader import (  # noqa: E402
+    BatchGraderResponse,
+    GraderResponse,
+    RetrievalGrader,
+)
+
+DOCUMENTS = [Document(page_content="a"), Document(page_content="b")]
+
+
+def batch_response(*scores):
+    return BatchGraderResponse(
+        scores=[
+            GraderResponse(score=score, explanation="") for score in scores
+        ]
+    )
+
+
+def test_batch_response_with_one_score_per_document_is_kept():
+    response = batch_response(" Yes", "no\n")
+
+    assert RetrievalGrader.validate_batch_response(
+        response, DOCUMENTS
+    ) == response.scores
+
+
+@pytest.mark.parametrize(
+    "response, message",
+    [
+        (batch_response("yes"), "Expected 2 scores, got 1"),
+        (batch_response("yes", "no", "yes"), "Expected 2 scores, got 3"),
+        (batch_response("yes", "maybe"), "invalid score"),
+    ],
+)
+def test_malformed_batch_response_is_rejected(response, message):
+    with pytest.raises(ValueError, match=message):
+        RetrievalGrader.validate_batch_response(response, DOCUMENTS)
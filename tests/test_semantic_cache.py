@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from caches import semantic_cache  # noqa: E402
+from caches.semantic_cache import SemanticCache  # noqa: E402
+from utils.load_config import load_yaml_config  # noqa: E402
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+TTL_SECONDS = {"vector_store": 3600, "web_search": 60}
+
+
+class OneHotEmbeddings:
+    """
+    Stand-in for the embedding model, encoding "question <i>" on axis i.
+    """
+
+    def embed_query(self, text):
+        embedding = np.zeros(16)
+        embedding[int(text.split()[-1])] = 1.0
+        return embedding.tolist()
+
+
+def make_cache(path, index_version="v1"):
+    return SemanticCache(
+        embeddings=OneHotEmbeddings(),
+        model_settings={"model": "one-hot"},
+        path=path,
+        similarity_threshold=0.95,
+        ttl_seconds=TTL_SECONDS,
+        index_version=index_version,
+    )
+
+
+def test_semantic_cache_is_disabled_by_default():
+    config = load_yaml_config(CONFIG_PATH)
+
+    assert config["cache"]["semantic"]["enabled"] is False
+
+
+def test_matrix_grows_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "INITIAL_CAPACITY", 4)
+    cache = make_cache(tmp_path / "cache.sqlite")
+
+    for i in range(10):
+        question = f"question {i}"
+        embedding = cache.embed(question)
+        cache.store(question, embedding, f"answer {i}", "web_search")
+
+    assert cache.size == 10
+    assert len(cache.matrix) == 16
+    for i in range(10):
+        question = f"question {i}"
+        assert cache.lookup(cache.embed(question)) == f"answer {i}"
+    assert cache.lookup(cache.embed("question 12")) is None
+
+    reopened = make_cache(tmp_path / "cache.sqlite")
+    assert reopened.size == 10
+    assert reopened.lookup(cache.embed("question 9")) == "answer 9"
+
+
+def test_entries_of_another_index_version_are_purged(tmp_path):
+    cache = make_cache(tmp_path / "cache.sqlite", index_version="v1")
+    embedding = cache.embed("question 1")
+    cache.store("question 1", embedding, "old answer", "vector_store")
+
+    assert make_cache(tmp_path / "cache.sqlite", "v1").lookup(embedding)
+    reindexed = make_cache(tmp_path / "cache.sqlite", index_version="v2")
+    assert reindexed.lookup(embedding) is None
+    assert reindexed.size == 0
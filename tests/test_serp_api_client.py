@@ -0,0 +1,126 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+import requests
+
+from api_clients.serp_api_client import SerpAPIClient
+from utils.loop_local import LoopLocal
+from utils.rate_limiter import RateLimiter
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+
+
+class CountingRateLimiter(RateLimiter):
+    """
+    Rate limiter counting the requests it lets through.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.acquired = 0
+
+    def acquire(self, tokens=0):
+        self.acquired += 1
+
+    async def aacquire(self, tokens=0):
+        self.acquired += 1
+
+
+def make_response(status_code, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.url = "https://serpapi.com/search.json"
+    return response
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("SERPAPI_KEY", "test")
+    # the search cache is created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    client = SerpAPIClient(CONFIG_PATH, rate_limiter=CountingRateLimiter())
+    client.backoff_factor = 0
+    return client
+
+
+def test_query_is_sent_as_is_and_cached_normalized(client, monkeypatch):
+    sent_queries = []
+
+    def get(url, params, timeout):
+        sent_queries.append(params["q"])
+        return make_response(200, b'{"answer": "42"}')
+
+    monkeypatch.setattr(client.session, "get", get)
+
+    assert client.search_tool("Harry  Potter's OWL") == {"answer": "42"}
+    assert client.search_tool("harry potter's owl") == {"answer": "42"}
+    assert sent_queries == ["Harry  Potter's OWL"]
+
+
+def test_sync_retries_go_through_rate_limiter(client, monkeypatch):
+    responses = iter(
+        [
+            requests.ConnectionError("reset"),
+            make_response(503, b""),
+            make_response(200, b'{"answer": "42"}'),
+        ]
+    )
+
+    def get(url, params, timeout):
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(client.session, "get", get)
+
+    assert client.search_tool("question") == {"answer": "42"}
+    assert client.rate_limiter.acquired == 3
+
+
+def test_sync_invalid_json_fails_cleanly(client, monkeypatch):
+    monkeypatch.setattr(
+        client.session,
+        "get",
+        lambda url, params, timeout: make_response(200, b"<html>"),
+    )
+
+    with pytest.raises(RuntimeError, match="Failed to search the web"):
+        client.search_tool("question")
+
+
+def use_transport(client, handler):
+    client.async_clients = LoopLocal(
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+
+def test_async_retries_go_through_rate_limiter(client):
+    statuses = iter([429, 502, 200])
+
+    def handler(request):
+        assert request.url.params["q"] == "Question"
+        return httpx.Response(next(statuses), json={"answer": "42"})
+
+    use_transport(client, handler)
+
+    assert asyncio.run(client.asearch_tool("Question")) == {"answer": "42"}
+    assert client.rate_limiter.acquired == 3
+
+
+def test_async_gives_up_after_max_retries(client):
+    use_transport(client, lambda request: httpx.Response(503))
+
+    with pytest.raises(RuntimeError, match="503"):
+        asyncio.run(client.asearch_tool("question"))
+    assert client.rate_limiter.acquired == client.max_retries + 1
+
+
+def test_async_invalid_json_fails_cleanly(client):
+    use_transport(client, lambda request: httpx.Response(200, text="<html>"))
+
+    with pytest.raises(RuntimeError, match="Failed to search the web"):
+        asyncio.run(client.asearch_tool("question"))
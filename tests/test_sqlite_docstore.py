@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from langchain.schema import Document  # noqa: E402
+
+from retrievers.sqlite_docstore import SQLiteDocstore  # noqa: E402
+
+
+def test_documents_round_trip_with_metadata(tmp_path):
+    docstore = SQLiteDocstore(tmp_path / "docstore.sqlite")
+    docstore.add(
+        {"a": Document(page_content="text", metadata={"page": 3})}
+    )
+
+    document = docstore.search("a")
+    assert document.id == "a"
+    assert document.page_content == "text"
+    assert document.metadata == {"page": 3}
+    assert docstore.search("b") == "ID b not found."
+
+    with pytest.raises(ValueError, match="already exist"):
+        docstore.add({"a": Document(page_content="other")})
+    docstore.delete(["a"])
+    assert docstore.search("a") == "ID a not found."
+
+
+def test_only_committed_changes_are_kept(tmp_path):
+    path = tmp_path / "docstore.sqlite"
+    docstore = SQLiteDocstore(path)
+    docstore.add({"a": Document(page_content="saved")})
+    docstore.save_index_mapping({0: "a"})
+    docstore.commit()
+    docstore.add({"b": Document(page_content="discarded")})
+    docstore.close()
+
+    reopened = SQLiteDocstore(path, read_only=True)
+    assert reopened.load_index_mapping() == {0: "a"}
+    assert reopened.search("a").page_content == "saved"
+    assert reopened.search("b") == "ID b not found."
+
+
+
+def test_keyword_search_ranks_by_bm25(tmp_path):
+    docstore = SQLiteDocstore(tmp_path / "docstore.sqlite", full_text=True)
+    docstore.add(
+        {
+            "faiss": Document(page_content="FAISS indexes dense vectors"),
+            "bm25": Document(page_content="BM25 ranks keyword matches"),
+            "both": Document(page_content="keyword search beside FAISS"),
+        }
+    )
+
+    results = docstore.keyword_search('FAISS "keyword" OR', k=3)
+    assert {document.id for document, _ in results} == {
+        "faiss",
+        "bm25",
+        "both",
+    }
+    assert results[0][0].id == "both"
+    assert results[0][1] >= results[-1][1]
+    assert docstore.keyword_search("!!", k=3) == []
+
+    docstore.delete(["both"])
+    assert "both" not in {
+        document.id for document, _ in docstore.keyword_search("FAISS", k=3)
+    }
@@ -0,0 +1,364 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+import yaml
+
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain_huggingface")
+
+from langchain.schema import Document  # noqa: E402
+from langchain_community.vectorstores import FAISS  # noqa: E402
+from langchain_core.embeddings import (  # noqa: E402
+    DeterministicFakeEmbedding,
+    Embeddings,
+)
+
+import retrievers.vector_retriever as vector_retriever  # noqa: E402
+from retrievers.sqlite_docstore import SQLiteDocstore  # noqa: E402
+from utils.load_config import load_yaml_config  # noqa: E402
+
+CONFIG_PATH = Path(__file__).parent.parent / "config" / "config.yml"
+N_PAGES = 40
+
+
+class TextLoader:
+    """
+    Stand-in for PyPDFLoader, reading one page per line of a text file.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def load(self):
+        lines = Path(self.path).read_text().splitlines()
+        return [
+            Document(
+                page_content=line,
+                metadata={"source": str(self.path), "page": page},
+            )
+            for page, line in enumerate(lines)
+        ]
+
+
+@pytest.fixture
+def make_retriever(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_retriever, "PyPDFLoader", TextLoader)
+    # load the files in threads, which see the patched loader
+    monkeypatch.setattr(
+        vector_retriever, "ProcessPoolExecutor", ThreadPoolExecutor
+    )
+    monkeypatch.setattr(
+        vector_retriever,
+        "build_embeddings",
+        lambda model_name, config: DeterministicFakeEmbedding(size=32),
+    )
+
+    config = load_yaml_config(CONFIG_PATH)
+    config["retriever"]["index_path"] = str(tmp_path / "index")
+    config["retriever"]["index"].update(
+        {"type": "ivf_flat", "nlist": 4, "nprobe": 4, "train_size": 1}
+    )
+    config["retriever"]["hybrid"]["enabled"] = False
+    config["cache"]["query_embeddings"]["enabled"] = False
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(yaml.safe_dump(config))
+
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+
+    def make_retriever():
+        return vector_retriever.VectorRetriever(data_path, config_path)
+
+    return data_path, make_retriever
+
+
+def write_pdf(data_path: Path, name: str, text: str) -> None:
+    (data_path / name).write_text(
+        "\n".join(f"{text} page {page}" for page in range(N_PAGES))
+    )
+
+
+def test_remove_file_from_middle_of_ivf_index(make_retriever):
+    data_path, make_retriever = make_retriever
+    # index the files one at a time, so that b.pdf is in the middle
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        write_pdf(data_path, name, f"file {name}")
+        make_retriever().load_data()
+
+    (data_path / "b.pdf").unlink()
+    retriever = make_retriever()
+    vector_store = retriever.load_data().vectorstore
+
+    chunk_ids = list(vector_store.index_to_docstore_id.values())
+    assert len(chunk_ids) == 2 * N_PAGES
+    assert vector_store.index.ntotal == 2 * N_PAGES
+    for chunk_id in chunk_ids:
+        document = vector_store.docstore.search(chunk_id)
+        embedding = retriever.embeddings.embed_query(document.page_content)
+        (found,) = vector_store.similarity_search_by_vector(embedding, k=1)
+        assert found.id == chunk_id
+        assert found.page_content == document.page_content
+
+
+def test_identical_files_under_different_names(make_retriever):
+    data_path, make_retriever = make_retriever
+    write_pdf(data_path, "a.pdf", "same content")
+    write_pdf(data_path, "copy of a.pdf", "same content")
+
+    vector_store = make_retriever().load_data().vectorstore
+
+    assert vector_store.index.ntotal == 2 * N_PAGES
+    assert len(set(vector_store.index_to_docstore_id.values())) == 2 * N_PAGES
+
+
+def test_staged_chunks_sample_the_whole_stream(tmp_path):
+    docstore = SQLiteDocstore(tmp_path / "docstore.sqlite")
+    staged = vector_retriever.StagedChunks(docstore, tmp_path, train_size=50)
+    for start in range(0, 1000, 100):
+        vectors = np.arange(start, start + 100, dtype=np.float32)
+        staged.add(
+            [Document(page_content=str(i)) for i in range(start, start + 100)],
+            [str(i) for i in range(start, start + 100)],
+            np.repeat(vectors[:, None], 4, axis=1),
+        )
+
+    sample = staged.training_sample()[:, 0]
+    assert len(sample) == 50 and len(set(sample)) == 50
+    # the sample is not the first chunks of the stream
+    assert sample.max() >= 500
+
+    batches = list(staged.iter_batches(300))
+    staged.close()
+    assert [len(chunk_ids) for chunk_ids, _ in batches] == [300, 300, 300, 100]
+    chunk_ids, vectors = batches[-1]
+    assert chunk_ids[0] == "900" and vectors[0, 0] == 900
+    assert docstore.search("999").page_content == "999"
+
+
+def test_ivf_index_is_rebuilt_when_corpus_outgrows_it(make_retriever):
+    data_path, make_retriever = make_retriever
+    retriever = make_retriever()
+    retriever.config["retriever"]["index"].update(
+        {"nlist": 8, "train_size": 1000}
+    )
+
+    write_pdf(data_path, "a.pdf", "file a")
+    vector_store = retriever.load_data().vectorstore
+    manifest = retriever.load_manifest()
+    assert manifest["training"] == {
+        "vectors": N_PAGES,
+        "index_factory": "IVF1,Flat",
+    }
+    assert faiss.extract_index_ivf(vector_store.index).nlist == 1
+
+    for name in ("b.pdf", "c.pdf", "d.pdf", "e.pdf", "f.pdf", "g.pdf"):
+        write_pdf(data_path, name, f"file {name}")
+    vector_store = retriever.load_data().vectorstore
+    manifest = retriever.load_manifest()
+
+    assert manifest["training"] == {
+        "vectors": 7 * N_PAGES,
+        "index_factory": "IVF7,Flat",
+    }
+    assert faiss.extract_index_ivf(vector_store.index).nlist == 7
+    assert vector_store.index.ntotal == 7 * N_PAGES
+    assert len(set(vector_store.index_to_docstore_id.values())) == 7 * N_PAGES
+
+
+class BatchRecordingEmbeddings(Embeddings):
+    """
+    Stand-in for the embedding model, recording the size of each batch of
+    embedded documents.
+    """
+
+    def __init__(self):
+        self.embeddings = DeterministicFakeEmbedding(size=32)
+        self.batch_sizes = []
+
+    def embed_documents(self, texts):
+        self.batch_sizes.append(len(texts))
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def test_chunks_are_embedded_in_fixed_size_batches(make_retriever):
+    data_path, make_retriever = make_retriever
+    names = [f"{name}.pdf" for name in "abcde"]
+    for name in names:
+        write_pdf(data_path, name, f"file {name}")
+    retriever = make_retriever()
+    retriever.config["retriever"]["index"]["type"] = "flat"
+    retriever.config["retriever"]["ingestion"].update(
+        {"workers": 2, "embedding_batch_size": 30}
+    )
+    retriever.embeddings = BatchRecordingEmbeddings()
+
+    vector_store = retriever.load_data().vectorstore
+
+    batch_sizes = retriever.embeddings.batch_sizes
+    assert sum(batch_sizes) == 5 * N_PAGES
+    assert set(batch_sizes[:-1]) == {30}
+    assert vector_store.index.ntotal == 5 * N_PAGES
+    manifest = retriever.load_manifest()
+    assert sorted(manifest["files"]) == names
+    for name in names:
+        chunk_ids = manifest["files"][name]["chunk_ids"]
+        assert len(chunk_ids) == N_PAGES
+        document = vector_store.docstore.search(chunk_ids[0])
+        assert document.metadata["source"].endswith(name)
+
+
+def test_memory_mapped_index_answers_like_loaded_one(make_retriever):
+    data_path, make_retriever = make_retriever
+    for name in ("a.pdf", "b.pdf"):
+        write_pdf(data_path, name, f"file {name}")
+    retriever = make_retriever()
+    vector_store = retriever.load_data().vectorstore
+    retriever.storage_config["mmap"] = True
+
+    mapped_store = retriever.load_data().vectorstore
+
+    assert mapped_store.index.ntotal == vector_store.index.ntotal
+    assert mapped_store.docstore.search("missing") == "ID missing not found."
+    query = "file b.pdf page 7"
+    assert [
+        document.id
+        for document in mapped_store.similarity_search(query, k=3)
+    ] == [
+        document.id for document in vector_store.similarity_search(query, k=3)
+    ]
+    # the docstore of a memory-mapped index is opened read-only
+    with pytest.raises(sqlite3.OperationalError):
+        mapped_store.docstore.add({"id": Document(page_content="text")})
+
+
+def save_pickled_index(retriever, data_path: Path) -> None:
+    documents = [
+        Document(
+            page_content=f"legacy page {page}",
+            metadata={"source": str(data_path / "a.pdf"), "page": page},
+        )
+        for page in range(N_PAGES)
+    ]
+    FAISS.from_documents(documents, retriever.embeddings).save_local(
+        retriever.index_path
+    )
+
+
+def test_pickled_docstore_is_only_migrated_when_allowed(make_retriever):
+    data_path, make_retriever = make_retriever
+    write_pdf(data_path, "a.pdf", "file a.pdf")
+    retriever = make_retriever()
+    save_pickled_index(retriever, data_path)
+
+    with pytest.raises(ValueError, match="allow_pickle_migration"):
+        retriever.load_data()
+
+    retriever.storage_config["allow_pickle_migration"] = True
+    vector_store = retriever.load_data().vectorstore
+
+    assert isinstance(vector_store.docstore, SQLiteDocstore)
+    assert vector_store.index.ntotal == N_PAGES
+    assert not (retriever.index_path / "index.pkl").exists()
+    assert (retriever.index_path / "docstore.sqlite").exists()
+
+
+def test_index_is_rebuilt_when_embeddings_change(make_retriever):
+    data_path, make_retriever = make_retriever
+    write_pdf(data_path, "a.pdf", "file a.pdf")
+    make_retriever().load_data()
+
+    retriever = make_retriever()
+    retriever.config["retriever"]["embeddings"]["normalize_embeddings"] = True
+    retriever.embeddings = BatchRecordingEmbeddings()
+    retriever.load_data()
+
+    assert sum(retriever.embeddings.batch_sizes) == N_PAGES
+    assert retriever.load_manifest()["settings"]["embeddings"] == {
+        "backend": "torch",
+        "normalize": True,
+    }
+
+
+def test_hybrid_search_finds_exact_keywords(make_retriever):
+    data_path, make_retriever = make_retriever
+    write_pdf(data_path, "a.pdf", "file a.pdf")
+    (data_path / "b.pdf").write_text("the Zeppelin NT airship\nother text")
+    retriever = make_retriever()
+    retriever.hybrid_config["enabled"] = True
+
+    hybrid_retriever = retriever.load_data()
+
+    assert isinstance(hybrid_retriever, vector_retriever.HybridRetriever)
+    documents = hybrid_retriever.invoke("zeppelin")
+    assert len(documents) == retriever.config["retriever"]["search"]["k"]
+    # the embeddings are random, only the keyword search finds it
+    assert "the Zeppelin NT airship" in [
+        document.page_content for document in documents
+    ]
+
+
+def search_config(search_type="similarity", sources=None, pages=None):
+    return {
+        "search_type": search_type,
+        "k": 4,
+        "fetch_k": 20,
+        "lambda_mult": 0.5,
+        "score_threshold": 0.5,
+        "filters": {"sources": sources, "pages": pages},
+    }
+
+
+@pytest.mark.parametrize(
+    "search_type, expected",
+    [
+        ("similarity", {"k": 4, "fetch_k": 20}),
+        ("mmr", {"k": 4, "fetch_k": 20, "lambda_mult": 0.5}),
+        (
+            "similarity_score_threshold",
+            {"k": 4, "fetch_k": 20, "score_threshold": 0.5},
+        ),
+    ],
+)
+def test_search_kwargs_of_each_search_type(search_type, expected):
+    assert vector_retriever.get_search_kwargs(
+        search_config(search_type)
+    ) == expected
+
+
+def test_metadata_filter_by_source_and_pages():
+    search_kwargs = vector_retriever.get_search_kwargs(
+        search_config(sources=["a.pdf"], pages=[2, 3])
+    )
+    metadata_filter = search_kwargs["filter"]
+
+    # the pages of PyPDFLoader are numbered from 0
+    assert metadata_filter({"source": "data/a.pdf", "page": 1})
+    assert metadata_filter({"source": "data/a.pdf", "page": 2})
+    assert not metadata_filter({"source": "data/a.pdf", "page": 0})
+    assert not metadata_filter({"source": "data/a.pdf", "page": 3})
+    assert not metadata_filter({"source": "data/b.pdf", "page": 1})
+
+
+def test_filtered_search_only_returns_matching_chunks(make_retriever):
+    data_path, make_retriever = make_retriever
+    for name in ("a.pdf", "b.pdf"):
+        write_pdf(data_path, name, f"file {name}")
+    retriever = make_retriever()
+    search = retriever.config["retriever"]["search"]
+    # the filter applies to the fetched candidates, here all the chunks
+    search["fetch_k"] = 2 * N_PAGES
+    search["filters"].update({"sources": ["b.pdf"], "pages": [1, 5]})
+
+    documents = retriever.load_data().invoke("file a.pdf page 2")
+
+    assert len(documents) == 4
+    for document in documents:
+        assert document.metadata["source"].endswith("b.pdf")
+        assert document.metadata["page"] < 5
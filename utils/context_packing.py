@@ -0,0 +1,204 @@
+from pathlib import Path
+from typing import List, Tuple, Union
+
+from langchain.schema import Document
+
+# characters per token, the same estimate as the rate limiter's
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARK = " ..."
+
+
+def compact_text(text: str) -> str:
+    """
+    Collapse the whitespace of a text, such as the line breaks and the
+    indentation of PDF pages.
+
+    Parameters
+    ----------
+    text : str
+        The text to compact.
+
+    Returns
+    -------
+    str
+        The text with single spaces between words.
+    """
+    return " ".join(text.split())
+
+
+def overlap_length(previous: str, text: str, min_overlap: int) -> int:
+    """
+    Find the longest end of a text that starts another one, as left by the
+    overlap between consecutive chunks of a document.
+
+    Parameters
+    ----------
+    previous : str
+        The text whose end may overlap.
+    text : str
+        The text whose start may overlap.
+    min_overlap : int
+        The minimum number of characters of an overlap, so that common
+        short words are not taken for one.
+
+    Returns
+    -------
+    int
+        The number of overlapping characters, or 0 if there is no overlap.
+    """
+    if min_overlap <= 0 or len(text) < min_overlap:
+        return 0
+
+    start = previous.find(text[:min_overlap])
+    while start != -1:
+        if text.startswith(previous[start:]):
+            return len(previous) - start
+        start = previous.find(text[:min_overlap], start + 1)
+    return 0
+
+
+def remove_overlaps(
+    texts: List[str], min_overlap: int
+) -> List[Tuple[int, str]]:
+    """
+    Remove the text chunks contained in earlier ones, and trim the parts of
+    the others that overlap an earlier chunk, at its start or at its end.
+
+    Parameters
+    ----------
+    texts : List[str]
+        The text chunks, the most relevant first.
+    min_overlap : int
+        The minimum number of characters of an overlap.
+
+    Returns
+    -------
+    List[Tuple[int, str]]
+        The index and trimmed text of the remaining chunks, in order.
+    """
+    kept = []
+    for i, text in enumerate(texts):
+        if any(text in kept_text for _, kept_text in kept):
+            continue
+        for _, kept_text in kept:
+            text = text[overlap_length(kept_text, text, min_overlap) :]
+            end_overlap = overlap_length(text, kept_text, min_overlap)
+            if end_overlap:
+                text = text[:-end_overlap]
+        if text.strip():
+            kept.append((i, text.strip()))
+    return kept
+
+
+def get_label(document: Document) -> str:
+    """
+    Get the short source label of a chunk, from its metadata.
+
+    Parameters
+    ----------
+    document : Document
+        The chunk.
+
+    Returns
+    -------
+    str
+        The file name and page number of the chunk, or an empty string if
+        it has no source.
+    """
+    source = document.metadata.get("source")
+    if source is None:
+        return ""
+    label = Path(source).name
+    if "page" in document.metadata:
+        # PyPDFLoader numbers the pages from 0
+        label += f" p.{document.metadata['page'] + 1}"
+    return f"({label}) "
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """
+    Truncate a text to a number of characters, marking the cut.
+
+    Parameters
+    ----------
+    text : str
+        The text to truncate.
+    max_chars : int
+        The maximum number of characters.
+
+    Returns
+    -------
+    str
+        The text, truncated if it is longer than `max_chars`.
+    """
+    if len(text) <= max_chars:
+        return text
+    return text[: max(max_chars - len(TRUNCATION_MARK), 0)] + TRUNCATION_MARK
+
+
+def pack_context(
+    documents: Union[str, Document, List[Document]],
+    max_tokens: int,
+    min_overlap: int = 20,
+    keep_all: bool = False,
+) -> str:
+    """
+    Render documents as compact text for a prompt: the chunk texts with
+    collapsed whitespace, each prefixed with its number, when there are
+    several, and its source, instead of the representation of the Document
+    objects.
+
+    By default, the chunks repeated by the overlap between consecutive
+    chunks are removed, and the chunks are added in order until the token
+    budget is spent. With `keep_all`, every document keeps its numbered
+    entry, so that answers about each of them can be matched to it, and
+    the budget is split evenly between them.
+
+    Parameters
+    ----------
+    documents : Union[str, Document, List[Document]]
+        The documents, the most relevant first. A string is returned as is.
+    max_tokens : int
+        The token budget of the context.
+    min_overlap : int, optional
+        The minimum number of characters of an overlap between chunks, by
+        default 20.
+    keep_all : bool, optional
+        Whether to keep an entry for every document, by default False.
+
+    Returns
+    -------
+    str
+        The packed context.
+    """
+    if isinstance(documents, str):
+        return documents
+    if isinstance(documents, Document):
+        documents = [documents]
+
+    numbered = len(documents) > 1
+    labels = [get_label(document) for document in documents]
+    texts = [compact_text(document.page_content) for document in documents]
+    max_chars = CHARS_PER_TOKEN * max_tokens
+
+    if keep_all:
+        entry_chars = max_chars // max(len(documents), 1)
+        entries = [
+            truncate(label + text, entry_chars)
+            for label, text in zip(labels, texts)
+        ]
+    else:
+        entries = []
+        used_chars = 0
+        for i, text in remove_overlaps(texts, min_overlap):
+            remaining_chars = max_chars - used_chars
+            if remaining_chars <= len(TRUNCATION_MARK):
+                break
+            entries.append(truncate(labels[i] + text, remaining_chars))
+            used_chars += len(entries[-1])
+
+    if numbered:
+        entries = [
+            f"[{i}] {entry}" for i, entry in enumerate(entries, start=1)
+        ]
+    return "\n\n".join(entries)
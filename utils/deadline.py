@@ -0,0 +1,120 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# monotonic time by which the request being answered must be done
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when the deadline of the request has passed, or would pass
+    before a wait ends.
+    """
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """
+    Bound the timeouts of the requests sent from the block, and from the
+    tasks and threads started with a copy of its context, by a deadline.
+
+    Parameters
+    ----------
+    deadline : Optional[float]
+        The monotonic time by which the requests must be done, or None for
+        no deadline.
+    """
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def cap_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    Cap the timeout of a request at the time left before the deadline of
+    the current scope.
+
+    Parameters
+    ----------
+    timeout : Optional[float]
+        The timeout of the request in seconds, or None for no timeout.
+
+    Returns
+    -------
+    Optional[float]
+        The capped timeout, or the timeout if there is no deadline.
+
+    Raises
+    ------
+    DeadlineExceeded
+        If the deadline has passed.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("The deadline of the request has passed.")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def check_wait(wait: float) -> float:
+    """
+    Check that a wait, such as for a rate limit, ends before the deadline
+    of the current scope.
+
+    Parameters
+    ----------
+    wait : float
+        The time to wait in seconds.
+
+    Returns
+    -------
+    float
+        The time to wait.
+
+    Raises
+    ------
+    DeadlineExceeded
+        If the deadline passes before the wait ends.
+    """
+    deadline = _deadline.get()
+    if deadline is not None and time.monotonic() + wait >= deadline:
+        raise DeadlineExceeded(
+            f"The deadline of the request passes within the {wait:.1f}s wait."
+        )
+    return wait
+
+
+def bind_context(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Bind a function to the context of the current scope, its deadline and
+    rate limiters, so that it keeps them when run in a worker thread, which
+    does not inherit the context.
+
+    Parameters
+    ----------
+    func : Callable[..., T]
+        The function to run in another thread.
+
+    Returns
+    -------
+    Callable[..., T]
+        The function, run within a copy of the current context.
+    """
+    context = copy_context()
+
+    @wraps(func)
+    def run(*args: Any, **kwargs: Any) -> T:
+        # a context cannot be entered by two threads at once
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+from weakref import WeakKeyDictionary
+
+T = TypeVar("T")
+
+
+class LoopLocal(Generic[T]):
+    """
+    Holds one object per event loop, built lazily in the running loop. Async
+    HTTP clients are bound to the loop they are first used in, so a client
+    shared across `asyncio.run` calls must be rebuilt for each new loop. The
+    objects of a loop are dropped once it is closed or garbage collected.
+
+    Parameters
+    ----------
+    factory : Callable[[], T]
+        Builds the object of a loop, called from the running loop.
+    """
+
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self.factory = factory
+        self.objects: WeakKeyDictionary = WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def get(self) -> T:
+        """
+        Get the object of the running event loop, building it on first use.
+
+        Returns
+        -------
+        T
+            The object of the running loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self.objects:
+                # the objects may keep their closed loop alive
+                for closed_loop in [
+                    other for other in self.objects if other.is_closed()
+                ]:
+                    del self.objects[closed_loop]
+                self.objects[loop] = self.factory()
+            return self.objects[loop]
+
+    def pop(self) -> Optional[T]:
+        """
+        Remove the object of the running event loop, if it was built.
+
+        Returns
+        -------
+        Optional[T]
+            The object of the running loop, or None if it was never built.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            return self.objects.pop(loop, None)
@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from utils.deadline import check_wait
+
+WINDOW_SECONDS = 60.0
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget over a sliding one
+    minute window. It is thread-safe and can be awaited, so a single limiter
+    can be shared by every synchronous and asynchronous client of a service.
+
+    Parameters
+    ----------
+    requests_per_minute : Optional[int], optional
+        Maximum number of requests per minute. If None, requests are not
+        limited, by default None.
+    tokens_per_minute : Optional[int], optional
+        Maximum number of tokens per minute. If None, tokens are not limited,
+        by default None.
+
+    Raises
+    ------
+    ValueError
+        If a limit is not positive.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ) -> None:
+        for name, limit in (
+            ("requests_per_minute", requests_per_minute),
+            ("tokens_per_minute", tokens_per_minute),
+        ):
+            if limit is not None and limit <= 0:
+                raise ValueError(f"{name} must be positive, got {limit}.")
+
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.events = deque()
+        self.used_tokens = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Try to reserve one request and the given number of tokens from the
+        budget.
+
+        Parameters
+        ----------
+        tokens : int, optional
+            The number of tokens the request is expected to use, by default 0.
+
+        Returns
+        -------
+        float
+            0 if the reservation was made, otherwise the number of seconds to
+            wait before trying again.
+        """
+        with self.lock:
+            now = time.monotonic()
+            while self.events and now - self.events[0][0] >= WINDOW_SECONDS:
+                _, expired_tokens = self.events.popleft()
+                self.used_tokens -= expired_tokens
+
+            over_requests = (
+                self.requests_per_minute is not None
+                and len(self.events) >= self.requests_per_minute
+            )
+            # a single request larger than the budget goes through on an
+            # empty window, otherwise it would wait forever
+            over_tokens = (
+                self.tokens_per_minute is not None
+                and self.events
+                and self.used_tokens + tokens > self.tokens_per_minute
+            )
+            if over_requests or over_tokens:
+                return WINDOW_SECONDS - (now - self.events[0][0])
+
+            self.events.append((now, tokens))
+            self.used_tokens += tokens
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        Block until one request and the given number of tokens fit in the
+        budget, giving up at once if the wait outlasts the deadline of the
+        request.
+
+        Parameters
+        ----------
+        tokens : int, optional
+            The number of tokens the request is expected to use, by default 0.
+        """
+        while (wait := self.reserve(tokens)) > 0:
+            time.sleep(check_wait(wait))
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        """
+        Wait, without blocking the event loop, until one request and the
+        given number of tokens fit in the budget, giving up at once if the
+        wait outlasts the deadline of the request.
+
+        Parameters
+        ----------
+        tokens : int, optional
+            The number of tokens the request is expected to use, by default 0.
+        """
+        while (wait := self.reserve(tokens)) > 0:
+            await asyncio.sleep(check_wait(wait))
+
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """
+    Roughly estimate the tokens used by a request, counting about four
+    characters per prompt token plus the completion budget.
+
+    Parameters
+    ----------
+    text : str
+        The text of the prompt.
+    max_tokens : int, optional
+        The maximum number of completion tokens, by default 0.
+
+    Returns
+    -------
+    int
+        The estimated number of tokens.
+    """
+    return len(text) // 4 + max_tokens
+
+
+# rate limiters used instead of the process-wide ones, by service, for the
+# requests sent from the current scope
+_scoped_rate_limiters: ContextVar[Dict[str, RateLimiter]] = ContextVar(
+    "rate_limiters", default={}
+)
+
+
+@contextmanager
+def rate_limit_scope(rate_limiters: Dict[str, RateLimiter]) -> Iterator[None]:
+    """
+    Rate limit the requests sent from the block, and from the tasks and
+    threads started with a copy of its context, with the given limiters
+    instead of the process-wide ones of their services.
+
+    Parameters
+    ----------
+    rate_limiters : Dict[str, RateLimiter]
+        The rate limiter of each service ("groq" or "serpapi").
+    """
+    token = _scoped_rate_limiters.set(
+        {**_scoped_rate_limiters.get(), **rate_limiters}
+    )
+    try:
+        yield
+    finally:
+        _scoped_rate_limiters.reset(token)
+
+
+def select_rate_limiter(
+    service: str, rate_limiter: Optional[RateLimiter]
+) -> Optional[RateLimiter]:
+    """
+    Select the rate limiter of a request: the one of the current scope for
+    the service, if any, or else the client's.
+
+    Parameters
+    ----------
+    service : str
+        The service of the request, "groq" or "serpapi".
+    rate_limiter : Optional[RateLimiter]
+        The rate limiter of the client.
+
+    Returns
+    -------
+    Optional[RateLimiter]
+        The rate limiter to acquire before sending the request.
+    """
+    return _scoped_rate_limiters.get().get(service, rate_limiter)